@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Backfill: compress existing riff.conversation_content in batches.
+
+Rows whose content is at least CONTENT_COMPRESSION_MIN_BYTES are rewritten
+into conversation_content_z with the codec recorded in metadata, one batch
+per transaction. Safe to interrupt and re-run, and safe to run alongside
+the webhook service (rows locked by another writer are skipped; re-run to
+pick them up).
+
+Usage:
+    DATABASE_URL=postgres://... python backfill_content_compression.py [--batch-size N]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from psycopg2.extras import execute_batch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from database import get_connection
+from content_codec import CONTENT_COMPRESSION_MIN_BYTES, compress_content
+
+
+def compress_batch(batch_size: int) -> tuple[int, int, int]:
+    """Compress one batch; returns (rows, raw_bytes, stored_bytes)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, conversation_content
+                FROM riff
+                WHERE conversation_content IS NOT NULL
+                AND conversation_content_z IS NULL
+                AND octet_length(conversation_content) >= %s
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (CONTENT_COMPRESSION_MIN_BYTES, batch_size))
+            rows = cur.fetchall()
+
+            updates = []
+            raw_bytes = stored_bytes = 0
+            for row in rows:
+                _, blob, codec_metadata = compress_content(row['conversation_content'])
+                updates.append((blob, json.dumps(codec_metadata), row['id']))
+                raw_bytes += codec_metadata['content_bytes']
+                stored_bytes += codec_metadata['content_stored_bytes']
+
+            execute_batch(cur, """
+                UPDATE riff
+                SET conversation_content = NULL,
+                    conversation_content_z = %s,
+                    metadata = COALESCE(metadata, '{}'::jsonb) || %s::jsonb
+                WHERE id = %s
+            """, updates)
+        conn.commit()
+    return (len(rows), raw_bytes, stored_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200, help="rows per transaction (default: 200)")
+    args = parser.parse_args()
+
+    total_rows = total_raw = total_stored = 0
+    while True:
+        rows, raw_bytes, stored_bytes = compress_batch(args.batch_size)
+        if not rows:
+            break
+        total_rows += rows
+        total_raw += raw_bytes
+        total_stored += stored_bytes
+        print(f"Compressed {total_rows} rows so far ({total_raw / 1024:,.0f} KB -> {total_stored / 1024:,.0f} KB)")
+
+    if total_rows:
+        print(f"✅ Done: {total_rows} rows, {total_raw / max(total_stored, 1):.1f}x smaller")
+    else:
+        print("Nothing to compress")
+
+
+if __name__ == "__main__":
+    main()
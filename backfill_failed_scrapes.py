@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Backfill: move legacy failed scrapes out of conversation_content.
+
+Before scrape failures had their own statuses, an error string was stored
+as the conversation content with status 'scraped'. This turns those rows
+into dead-lettered jobs (status 'failed', error kept in last_error) and
+re-queues '[Placeholder]' rows at backfill priority, one batch per
+transaction. Safe to interrupt and re-run.
+
+Usage:
+    DATABASE_URL=postgres://... python backfill_failed_scrapes.py [--batch-size N]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from database import get_connection
+from schema import PRIORITY_BACKFILL
+
+
+def backfill_batch(batch_size: int) -> tuple[int, int]:
+    """Convert one batch; returns (dead_lettered, requeued)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE riff
+                SET status = 'failed',
+                    last_error = conversation_content,
+                    failed_at = COALESCE(scraped_at, NOW()),
+                    conversation_content = NULL,
+                    digest = NULL
+                WHERE id IN (
+                    SELECT id
+                    FROM riff
+                    WHERE status = 'scraped'
+                    AND conversation_content LIKE '[Error]%%'
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (batch_size,))
+            dead_lettered = cur.rowcount
+
+            cur.execute("""
+                UPDATE riff
+                SET status = 'pending',
+                    attempts = 0,
+                    next_run_at = NOW(),
+                    priority = %s,
+                    conversation_content = NULL,
+                    digest = NULL
+                WHERE id IN (
+                    SELECT id
+                    FROM riff
+                    WHERE status = 'scraped'
+                    AND conversation_content LIKE '[Placeholder]%%'
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, (PRIORITY_BACKFILL, batch_size))
+            requeued = cur.rowcount
+        conn.commit()
+    return (dead_lettered, requeued)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per transaction (default: 500)")
+    args = parser.parse_args()
+
+    total_failed = total_requeued = 0
+    while True:
+        dead_lettered, requeued = backfill_batch(args.batch_size)
+        if not dead_lettered and not requeued:
+            break
+        total_failed += dead_lettered
+        total_requeued += requeued
+        print(f"Dead-lettered {total_failed}, requeued {total_requeued} rows so far")
+
+    print(f"✅ Done: {total_failed} rows dead-lettered, {total_requeued} rows requeued")
+
+
+if __name__ == "__main__":
+    main()
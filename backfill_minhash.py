@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Backfill: MinHash signatures and LSH buckets for already-scraped conversations.
+
+New scrapes are indexed as they are stored; this indexes rows scraped before
+near-duplicate detection existed, so later forks of them are recognised.
+Existing digests and near_duplicate_of links are left alone. Rows too short
+to compare get an empty signature so they aren't revisited. Safe to
+interrupt and re-run, one batch per transaction.
+
+Usage:
+    DATABASE_URL=postgres://... python backfill_minhash.py [--batch-size N]
+"""
+
+import argparse
+import os
+import sys
+
+from psycopg2.extras import execute_batch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from database import get_connection
+from content_codec import decompress_content
+from near_duplicates import minhash_signature, pack_signature, lsh_buckets
+
+
+def index_batch(batch_size: int) -> tuple[int, int]:
+    """Index one batch; returns (rows, rows with a signature)"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, conversation_content, conversation_content_z,
+                       metadata->>'content_codec' AS content_codec
+                FROM riff
+                WHERE status = 'scraped'
+                AND minhash IS NULL
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            rows = cur.fetchall()
+
+            signatures = []
+            buckets = []
+            for row in rows:
+                content = decompress_content(row['conversation_content'], row['conversation_content_z'], row['content_codec'])
+                signature = minhash_signature(content or "")
+                signatures.append((pack_signature(signature) if signature else b"", row['id']))
+                if signature:
+                    buckets.extend((band, bucket, row['id']) for band, bucket in lsh_buckets(signature))
+
+            execute_batch(cur, "UPDATE riff SET minhash = %s WHERE id = %s", signatures)
+            execute_batch(cur, """
+                INSERT INTO riff_lsh_bucket (band, bucket, riff_id)
+                VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, buckets)
+        conn.commit()
+    return (len(rows), sum(1 for blob, _ in signatures if blob))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200, help="rows per transaction (default: 200)")
+    args = parser.parse_args()
+
+    total_rows = total_indexed = 0
+    while True:
+        rows, indexed = index_batch(args.batch_size)
+        if not rows:
+            break
+        total_rows += rows
+        total_indexed += indexed
+        print(f"Processed {total_rows} rows so far ({total_indexed} indexed)")
+
+    if total_rows:
+        print(f"✅ Done: {total_indexed} of {total_rows} conversations indexed for near-duplicate lookups")
+    else:
+        print("Nothing to index")
+
+
+if __name__ == "__main__":
+    main()
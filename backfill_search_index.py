@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Backfill: full-text search vectors for already-scraped conversations.
+
+riff.search_vector is written whenever a scrape is stored; this fills it in
+for rows scraped before search existed. Content may be compressed, so each
+row is decompressed here and the plaintext handed to riff_search_vector().
+Safe to interrupt and re-run, one batch per transaction.
+
+Usage:
+    DATABASE_URL=postgres://... python backfill_search_index.py [--batch-size N]
+"""
+
+import argparse
+import os
+import sys
+
+from psycopg2.extras import execute_batch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from database import get_connection
+from content_codec import decompress_content
+from schema import SEARCH_CONTENT_MAX_CHARS
+
+
+def index_batch(batch_size: int) -> int:
+    """Index one batch; returns the number of rows"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, digest, conversation_content, conversation_content_z,
+                       metadata->>'content_codec' AS content_codec
+                FROM riff
+                WHERE status = 'scraped'
+                AND search_vector IS NULL
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            rows = cur.fetchall()
+
+            updates = []
+            for row in rows:
+                content = decompress_content(row['conversation_content'], row['conversation_content_z'], row['content_codec'])
+                updates.append((row['digest'], content[:SEARCH_CONTENT_MAX_CHARS] if content else None, row['id']))
+
+            execute_batch(cur, """
+                UPDATE riff
+                SET search_vector = riff_search_vector(%s, %s)
+                WHERE id = %s
+            """, updates)
+        conn.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200, help="rows per transaction (default: 200)")
+    args = parser.parse_args()
+
+    total_rows = 0
+    while True:
+        rows = index_batch(args.batch_size)
+        if not rows:
+            break
+        total_rows += rows
+        print(f"Indexed {total_rows} rows so far")
+
+    if total_rows:
+        print(f"✅ Done: {total_rows} conversations indexed for search")
+    else:
+        print("Nothing to index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes transferred and peak RSS for one digest tick.
+
+Seeds a scratch schema with a day's worth of scraped conversations (large
+markdown content each), then runs the digest-tick query in a fresh
+subprocess per variant so peak RSS is measured in isolation:
+
+    full        - the old query, which also selected conversation_content
+    projection  - the current get_conversations_by_date projection
+
+Usage:
+    DATABASE_URL=postgres://... python bench_digest_tick.py [rows] [content_kb]
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from schema import SCHEMA_STATEMENTS
+
+load_dotenv()
+
+SCRATCH_SCHEMA = "riff_bench_digest_tick"
+
+VARIANTS = {
+    "full": """
+        SELECT chatgpt_url, user_name, digest, conversation_content, created_at, shared_to_group_at
+        FROM riff
+        WHERE status = 'scraped'
+        AND created_at >= CURRENT_DATE
+        AND created_at < CURRENT_DATE + 1
+        ORDER BY created_at DESC
+    """,
+    "projection": """
+        SELECT chatgpt_url, user_name, digest, created_at, shared_to_group_at
+        FROM riff
+        WHERE status = 'scraped'
+        AND created_at >= CURRENT_DATE
+        AND created_at < CURRENT_DATE + 1
+        ORDER BY created_at DESC
+    """,
+}
+
+
+def run_variant(name):
+    """Run one tick's query in this (fresh) process and report payload size and peak RSS"""
+    conn = psycopg2.connect(os.environ["DATABASE_URL"], cursor_factory=RealDictCursor)
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(f"SET search_path TO {SCRATCH_SCHEMA}")
+        cur.execute(VARIANTS[name])
+        rows = cur.fetchall()
+    elapsed = time.perf_counter() - start
+    payload = sum(len(str(value).encode()) for row in rows for value in row.values() if value is not None)
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.close()
+    print(json.dumps({
+        "rows": len(rows),
+        "payload_bytes": payload,
+        "peak_rss_kb": peak_rss_kb,
+        "rss_growth_kb": peak_rss_kb - baseline_rss_kb,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    content_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCRATCH_SCHEMA}")
+            cur.execute(f"SET search_path TO {SCRATCH_SCHEMA}, public")
+            for statement in SCHEMA_STATEMENTS:
+                cur.execute(statement)
+
+            print(f"Seeding {rows} scraped conversations of ~{content_kb} KB each...")
+            # md5 chains keep the content incompressible, like real markdown after TOAST
+            cur.execute("""
+                INSERT INTO riff (chatgpt_url, user_name, digest, conversation_content, status, created_at)
+                SELECT
+                    'https://chatgpt.com/share/bench-' || g,
+                    'user_' || (g %% 10),
+                    repeat('digest text ', 60),
+                    (SELECT string_agg(md5(g::text || '-' || i::text), '')
+                     FROM generate_series(1, %(chunks)s) AS i),
+                    'scraped',
+                    date_trunc('day', NOW()) + (g * INTERVAL '1 second')
+                FROM generate_series(1, %(rows)s) AS g
+            """, {"rows": rows, "chunks": content_kb * 1024 // 32})
+            cur.execute("ANALYZE riff")
+        conn.commit()
+
+        results = {}
+        for name in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", name],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+
+        print(f"\n{'variant':<12} {'rows':>6} {'payload':>14} {'peak RSS':>12} {'RSS growth':>12} {'time':>10}")
+        for name, r in results.items():
+            print(
+                f"{name:<12} {r['rows']:>6} {r['payload_bytes'] / 1024:>11,.0f} KB "
+                f"{r['peak_rss_kb'] / 1024:>9,.1f} MB {r['rss_growth_kb'] / 1024:>9,.1f} MB "
+                f"{r['elapsed_ms']:>7,.1f} ms"
+            )
+
+        full, projection = results["full"], results["projection"]
+        print(f"\nProjection transfers {full['payload_bytes'] / max(projection['payload_bytes'], 1):,.0f}x fewer bytes per tick")
+
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--run":
+        run_variant(sys.argv[2])
+    else:
+        main()
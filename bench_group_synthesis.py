@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LLM input tokens (and, with --live, latency) per group synthesis tick.
+
+Simulates a day in which new conversations arrive every tick and compares:
+
+    full         - every tick re-sends all of today's digests
+    incremental  - every tick sends the new digests plus the running summary
+                   (two calls: the group hook and the summary update)
+
+Offline, prompts are built from the real templates and the running summary
+is assumed to be at its RUNNING_SUMMARY_MAX_WORDS cap, so incremental numbers
+are an upper bound. With --live (needs OPENROUTER_API_KEY) every tick makes
+the real OpenRouter calls and reports provider token counts and latency.
+
+Usage:
+    python bench_group_synthesis.py [--ticks 24] [--per-tick 3] [--users 12] [--live]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+import group_synthesis
+from group_synthesis import (
+    RUNNING_SUMMARY_MAX_WORDS,
+    estimate_tokens,
+    format_raw_summaries,
+    _synthesis_call
+)
+from http_client import http
+from prompts import (
+    GROUP_SYNTHESIS_SYSTEM_PROMPT,
+    SYNTHESIS_INPUT_TEMPLATE,
+    INCREMENTAL_SYNTHESIS_INPUT_TEMPLATE,
+    RUNNING_SUMMARY_SYSTEM_PROMPT,
+    RUNNING_SUMMARY_INPUT_TEMPLATE,
+    NO_RUNNING_SUMMARY
+)
+
+WORDS = (
+    "agents curiosity hyperreality taste graphs review inflation coordination sleep "
+    "proof markets latency memory compilers gardening grief startups robotics tea "
+    "cities language models attention"
+).split()
+
+
+def synthetic_conversation(i, users, digest_words):
+    rng = random.Random(i)
+    digest = " ".join(rng.choice(WORDS) for _ in range(digest_words))
+    return {"chatgpt_url": f"https://chatgpt.com/share/bench-{i}", "user_name": f"user{i % users}", "digest": digest}
+
+
+def full_inputs(conversations):
+    return [(GROUP_SYNTHESIS_SYSTEM_PROMPT, SYNTHESIS_INPUT_TEMPLATE.format(raw_summaries=format_raw_summaries(conversations)))]
+
+
+def incremental_inputs(running_summary, new_conversations):
+    new_summaries = format_raw_summaries(new_conversations)
+    return [
+        (GROUP_SYNTHESIS_SYSTEM_PROMPT, INCREMENTAL_SYNTHESIS_INPUT_TEMPLATE.format(
+            running_summary=running_summary, new_summaries=new_summaries)),
+        (RUNNING_SUMMARY_SYSTEM_PROMPT.format(max_words=RUNNING_SUMMARY_MAX_WORDS), RUNNING_SUMMARY_INPUT_TEMPLATE.format(
+            running_summary=running_summary, new_summaries=new_summaries)),
+    ]
+
+
+async def run_live(calls):
+    """Run one tick's calls concurrently; returns (input_tokens, seconds, outputs)"""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_synthesis_call(system, user) for system, user in calls))
+    return (sum(tokens for _, tokens in results), time.perf_counter() - start, [content for content, _ in results])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=24)
+    parser.add_argument("--per-tick", type=int, default=3, help="new conversations per tick")
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--digest-words", type=int, default=120)
+    parser.add_argument("--live", action="store_true", help="call OpenRouter for real token counts and latency")
+    args = parser.parse_args()
+
+    if args.live and not group_synthesis.OPENROUTER_API_KEY:
+        sys.exit("--live needs OPENROUTER_API_KEY")
+
+    capped_summary = " ".join(WORDS[i % len(WORDS)] for i in range(RUNNING_SUMMARY_MAX_WORDS))
+    running_summary = NO_RUNNING_SUMMARY
+    conversations = []
+    totals = {"full": [0, 0.0], "incremental": [0, 0.0]}
+
+    print(f"{'tick':>4} {'convs':>5} {'full tok':>9} {'incr tok':>9}" + (f" {'full s':>7} {'incr s':>7}" if args.live else ""))
+    for tick in range(1, args.ticks + 1):
+        new = [synthetic_conversation(len(conversations) + i, args.users, args.digest_words) for i in range(args.per_tick)]
+        conversations.extend(new)
+
+        full_calls = full_inputs(conversations)
+        incremental_calls = incremental_inputs(running_summary, new)
+
+        if args.live:
+            full_tokens, full_seconds, _ = await run_live(full_calls)
+            incremental_tokens, incremental_seconds, outputs = await run_live(incremental_calls)
+            running_summary = outputs[1]
+        else:
+            full_tokens = sum(estimate_tokens(*call) for call in full_calls)
+            incremental_tokens = sum(estimate_tokens(*call) for call in incremental_calls)
+            full_seconds = incremental_seconds = 0.0
+            running_summary = capped_summary
+
+        totals["full"][0] += full_tokens
+        totals["full"][1] += full_seconds
+        totals["incremental"][0] += incremental_tokens
+        totals["incremental"][1] += incremental_seconds
+
+        line = f"{tick:>4} {len(conversations):>5} {full_tokens:>9} {incremental_tokens:>9}"
+        if args.live:
+            line += f" {full_seconds:>7.2f} {incremental_seconds:>7.2f}"
+        print(line)
+
+    print()
+    for mode, (tokens, seconds) in totals.items():
+        line = f"{mode:<12} {tokens:>8} input tokens/day, {tokens / args.ticks:>7.0f} per tick"
+        if args.live:
+            line += f", {seconds / args.ticks:.2f}s per tick"
+        print(line)
+    print(f"incremental uses {totals['incremental'][0] / max(totals['full'][0], 1):.0%} of full's input tokens")
+    if not args.live:
+        print("(estimated tokens; run with --live for provider counts and latency)")
+
+    await http.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
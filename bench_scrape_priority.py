@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark: how long fresh links wait for a scrape worker while a backfill drains.
+
+Runs the real claim_scrape_jobs() against a scratch schema with simulated
+workers (each "scrape" just sleeps) while interactive links from a few users
+arrive at a steady rate. Workers that come back empty go through the
+webhook's own wait path (LISTEN/NOTIFY wakeup or the poll interval), so a
+claim that misses due jobs shows up as lost backfill throughput. Reports the interactive links' wait from
+submission to claim under three scenarios:
+
+    idle        - no backfill running
+    same_level  - the backlog at interactive priority, one user's jobs
+                  (only per-user fairness stands between it and new links)
+    priority    - the backlog at backfill priority (what requeues do now)
+
+Usage:
+    DATABASE_URL=postgres://... python bench_scrape_priority.py [--backfill 5000] [--workers 4]
+        [--scrape-ms 50] [--links 40] [--interval-ms 100]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCRATCH_SCHEMA = "riff_bench_scrape_priority"
+
+# asyncpg passes unknown DSN query parameters through as server settings
+DATABASE_URL = os.environ["DATABASE_URL"]
+_dsn = urlsplit(DATABASE_URL)
+os.environ["DATABASE_URL"] = urlunsplit(_dsn._replace(
+    query="&".join(filter(None, [_dsn.query, f"search_path={SCRATCH_SCHEMA}"]))
+))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+import async_database
+import webhook
+from async_database import claim_scrape_jobs, insert_link, update_conversation_content
+from fair_scheduler import WeightedRoundRobin, SCRAPE_WEIGHT_INTERACTIVE, SCRAPE_WEIGHT_RETRY, SCRAPE_WEIGHT_BACKFILL
+from schema import SCHEMA_STATEMENTS, PRIORITY_INTERACTIVE, PRIORITY_RETRY, PRIORITY_BACKFILL
+
+SCENARIOS = {
+    "idle": None,
+    "same_level": PRIORITY_INTERACTIVE,
+    "priority": PRIORITY_BACKFILL,
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def run_scenario(backfill_priority, args) -> dict:
+    """Drain a seeded backlog while interactive links arrive; returns wait stats for the interactive links"""
+    async with async_database.acquire() as conn:
+        await conn.execute("TRUNCATE riff CASCADE")
+        if backfill_priority is not None:
+            await conn.execute("""
+                INSERT INTO riff (chatgpt_url, user_name, status, priority, next_run_at)
+                SELECT 'https://chatgpt.com/share/backfill-' || g, 'backfill', 'pending', $1,
+                       NOW() - INTERVAL '1 minute' + g * INTERVAL '1 millisecond'
+                FROM generate_series(1, $2) AS g
+            """, backfill_priority, args.backfill)
+        await conn.execute("ANALYZE riff")
+
+    scheduler = WeightedRoundRobin({
+        PRIORITY_INTERACTIVE: SCRAPE_WEIGHT_INTERACTIVE,
+        PRIORITY_RETRY: SCRAPE_WEIGHT_RETRY,
+        PRIORITY_BACKFILL: SCRAPE_WEIGHT_BACKFILL
+    })
+    interactive_urls = set()
+    waits = []
+    claimed = {"interactive": 0, "backfill": 0}
+
+    async def worker(n: int):
+        while True:
+            jobs = await claim_scrape_jobs(f"bench-{n}", 60, scheduler.next())
+            if not jobs:
+                await webhook.wait_for_jobs()
+                continue
+            job = jobs[0]
+            if job['chatgpt_url'] in interactive_urls:
+                waits.append(job['queued_seconds'])
+                claimed["interactive"] += 1
+            else:
+                claimed["backfill"] += 1
+            await asyncio.sleep(args.scrape_ms / 1000)
+            await update_conversation_content(job['chatgpt_url'], "bench content", "bench digest")
+
+    listener = asyncio.create_task(webhook.job_listener())
+    workers = [asyncio.create_task(worker(n)) for n in range(args.workers)]
+    for i in range(args.links):
+        url = f"https://chatgpt.com/share/interactive-{i}"
+        interactive_urls.add(url)
+        await insert_link(url, random.choice(["xyn", "seven", "ana", "lee"]))
+        await asyncio.sleep(args.interval_ms / 1000)
+    while len(waits) < len(interactive_urls):
+        await asyncio.sleep(0.05)
+    for task in workers + [listener]:
+        task.cancel()
+    await asyncio.gather(*workers, listener, return_exceptions=True)
+
+    return {
+        "p50": percentile(waits, 0.5),
+        "p95": percentile(waits, 0.95),
+        "max": max(waits, default=0.0),
+        "backfill_claimed": claimed["backfill"],
+    }
+
+
+async def run(args):
+    results = {}
+    for name, backfill_priority in SCENARIOS.items():
+        print(f"Running {name}...")
+        results[name] = await run_scenario(backfill_priority, args)
+    await async_database.close_pool()
+
+    print(f"\nInteractive wait, submission to claim ({args.links} links, {args.workers} workers, "
+          f"{args.scrape_ms} ms per scrape, {args.backfill} backfill jobs)")
+    print(f"{'scenario':<12} {'p50':>9} {'p95':>9} {'max':>9} {'backfill done':>14}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['p50'] * 1000:>6,.0f} ms {r['p95'] * 1000:>6,.0f} ms "
+              f"{r['max'] * 1000:>6,.0f} ms {r['backfill_claimed']:>14,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", type=int, default=5000, help="backlog size (default: 5000)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent scrape workers (default: 4)")
+    parser.add_argument("--scrape-ms", type=int, default=50, help="simulated scrape time (default: 50)")
+    parser.add_argument("--links", type=int, default=40, help="interactive links submitted (default: 40)")
+    parser.add_argument("--interval-ms", type=int, default=100, help="time between interactive links (default: 100)")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCRATCH_SCHEMA}")
+            cur.execute(f"SET search_path TO {SCRATCH_SCHEMA}, public")
+            for statement in SCHEMA_STATEMENTS:
+                cur.execute(statement)
+        conn.commit()
+
+        asyncio.run(run(args))
+
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN check: verify the riff lookups use index scans on a large table.
+
+Creates a scratch schema, applies the real riff schema, seeds it with a
+million synthetic rows, and fails if any hot query plans a sequential scan.
+The scratch schema is dropped afterwards.
+
+Usage:
+    DATABASE_URL=postgres://... python explain_indexes.py [row_count]
+"""
+
+import os
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from schema import SCHEMA_STATEMENTS
+
+load_dotenv()
+
+SCRATCH_SCHEMA = "riff_explain_check"
+ROW_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+# The hot lookups issued by database.py / async_database.py, plus the
+# unshared-rows scan served by the partial index
+QUERIES = {
+    "conversations_by_date (today)": ("""
+        SELECT r.id, r.created_at, r.chatgpt_url, r.user_name, r.digest, r.shared_to_group_at
+        FROM riff r
+        WHERE r.status = 'scraped'
+        AND r.created_at >= COALESCE(%(date)s::date, CURRENT_DATE)
+        AND r.created_at < COALESCE(%(date)s::date, CURRENT_DATE) + 1
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT 51
+    """, {"date": None}),
+    "conversations_by_date (explicit date, next page)": ("""
+        SELECT r.id, r.created_at, r.chatgpt_url, r.user_name, r.digest, r.shared_to_group_at
+        FROM riff r
+        WHERE r.status = 'scraped'
+        AND r.created_at >= COALESCE(%(date)s::date, CURRENT_DATE)
+        AND r.created_at < COALESCE(%(date)s::date, CURRENT_DATE) + 1
+        AND (r.created_at, r.id) < (%(after)s::timestamp, %(after_id)s::uuid)
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT 51
+    """, {"date": "2025-06-01", "after": "2025-06-01 12:00", "after_id": "00000000-0000-0000-0000-000000000000"}),
+    "user_submissions": ("""
+        SELECT r.id, r.created_at, r.chatgpt_url, r.digest, r.status, r.shared_to_group_at
+        FROM riff r
+        WHERE r.user_name = %(user)s
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT 51
+    """, {"user": "user_42"}),
+    "user_submissions (next page)": ("""
+        SELECT r.id, r.created_at, r.chatgpt_url, r.digest, r.status, r.shared_to_group_at
+        FROM riff r
+        WHERE r.user_name = %(user)s
+        AND (r.created_at, r.id) < (NOW()::timestamp - INTERVAL '300 days', %(after_id)s::uuid)
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT 51
+    """, {"user": "user_42", "after_id": "00000000-0000-0000-0000-000000000000"}),
+    "search_conversations": ("""
+        WITH q AS (
+            SELECT websearch_to_tsquery('english', %(query)s) AS query
+        )
+        SELECT r.chatgpt_url, ts_rank_cd(r.search_vector, q.query) AS rank
+        FROM riff r, q
+        WHERE r.search_vector @@ q.query
+        ORDER BY rank DESC, r.created_at DESC
+        LIMIT 10
+    """, {"query": "gardening compilers"}),
+    "pending scan": ("""
+        SELECT chatgpt_url
+        FROM riff
+        WHERE status = 'pending'
+        ORDER BY created_at
+    """, {}),
+    "unshared scan": ("""
+        SELECT chatgpt_url
+        FROM riff
+        WHERE shared_to_group_at IS NULL
+        ORDER BY created_at
+    """, {}),
+}
+
+SEED_SQL = """
+    INSERT INTO riff (chatgpt_url, user_name, digest, status, created_at, shared_to_group_at, search_vector)
+    SELECT
+        'https://chatgpt.com/share/synthetic-' || g,
+        'user_' || (g %% 500),
+        digest,
+        CASE WHEN g %% 200 = 0 THEN 'pending' ELSE 'scraped' END,
+        ts,
+        CASE WHEN g %% 100 = 0 THEN NULL ELSE ts + INTERVAL '10 minutes' END,
+        riff_search_vector(digest, NULL)
+    FROM (
+        SELECT g, NOW() - (g * INTERVAL '1 minute') AS ts,
+               'digest ' || g || ' about ' || topics[1 + g %% 20] || ' and ' || topics[1 + (g / 20) %% 20] AS digest
+        FROM generate_series(1, %(rows)s) AS g,
+             (SELECT ARRAY['agents', 'curiosity', 'taste', 'graphs', 'review', 'inflation', 'coordination',
+                           'sleep', 'proof', 'markets', 'latency', 'memory', 'compilers', 'gardening',
+                           'grief', 'startups', 'robotics', 'tea', 'cities', 'language'] AS topics) AS t
+    ) AS seed
+"""
+
+
+def main():
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    failures = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCRATCH_SCHEMA}")
+            cur.execute(f"SET search_path TO {SCRATCH_SCHEMA}, public")
+            for statement in SCHEMA_STATEMENTS:
+                cur.execute(statement)
+
+            print(f"Seeding {ROW_COUNT:,} synthetic rows...")
+            cur.execute(SEED_SQL, {"rows": ROW_COUNT})
+            cur.execute("ANALYZE riff")
+
+            for name, (query, params) in QUERIES.items():
+                cur.execute("EXPLAIN " + query, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+                uses_index = "Index" in plan and "Seq Scan" not in plan
+                print(f"\n{'✅' if uses_index else '❌'} {name}")
+                print(plan)
+                if not uses_index:
+                    failures.append(name)
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+    if failures:
+        print(f"\nSequential scans planned for: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nAll lookups use index scans")
+
+
+if __name__ == "__main__":
+    main()
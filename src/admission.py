@@ -0,0 +1,102 @@
+"""
+Admission control for new scrape jobs.
+
+Jobs live in Postgres, so a flood of submissions can't exhaust memory, but
+an unbounded backlog still pushes fresh links hours behind. The backlog is
+the number of jobs due now or being scraped, not counting due backfill jobs
+(those only run when nothing more urgent is waiting; see fair_scheduler.py).
+Once it reaches
+QUEUE_HIGH_WATERMARK the queue is saturated and new submissions are refused
+(with a Retry-After) until it drains to QUEUE_LOW_WATERMARK, so admission
+doesn't flap around a single limit.
+
+Submissions don't pay for admission while the queue is healthy: links are
+inserted first, and each newly inserted one bumps a local estimate of the
+backlog. The backlog is only read from the database (one COUNT) when this
+process has no reading yet, when the estimate reaches the high watermark
+(to confirm it against jobs other processes enqueued and workers finished),
+and while saturated at most every QUEUE_DEPTH_CACHE_SECONDS to notice the
+drain. Every /metrics scrape also refreshes it, which keeps the processes
+(webhook replicas, MCP server) close to one shared view.
+"""
+
+import os
+import time
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from pipeline_metrics import queue_saturated, queue_full, queue_rejected
+
+load_dotenv()
+
+QUEUE_HIGH_WATERMARK = int(os.environ.get("QUEUE_HIGH_WATERMARK", 1000))
+QUEUE_LOW_WATERMARK = int(os.environ.get("QUEUE_LOW_WATERMARK", 800))
+QUEUE_DEPTH_CACHE_SECONDS = float(os.environ.get("QUEUE_DEPTH_CACHE_SECONDS", 1))
+QUEUE_RETRY_AFTER_SECONDS = int(os.environ.get("QUEUE_RETRY_AFTER_SECONDS", 60))
+
+class AdmissionController:
+    """Saturated at the high watermark, admitting again at the low watermark"""
+
+    def __init__(
+        self,
+        high_watermark: int = QUEUE_HIGH_WATERMARK,
+        low_watermark: int = QUEUE_LOW_WATERMARK,
+        cache_seconds: float = QUEUE_DEPTH_CACHE_SECONDS,
+        retry_after: int = QUEUE_RETRY_AFTER_SECONDS
+    ):
+        self.high_watermark = max(1, high_watermark)
+        self.low_watermark = min(low_watermark, self.high_watermark)
+        self.cache_seconds = cache_seconds
+        self.retry_after = retry_after
+        self.backlog = None
+        self.checked_at = None
+        self.saturated = False
+        self.times_saturated = 0
+        self.rejected = 0
+        queue_saturated.set(0)
+        queue_full.inc(0)
+
+    def needs_refresh(self) -> bool:
+        """Whether the next submission should read the backlog from the database first"""
+        if self.backlog is None:
+            return True
+        if self.saturated:
+            return time.monotonic() - self.checked_at >= self.cache_seconds
+        return self.backlog >= self.high_watermark
+
+    def update(self, depth: Dict):
+        """Take the backlog from get_queue_depth()"""
+        self.backlog = (depth.get('due') or 0) - (depth.get('backfill_due') or 0) + (depth.get('scraping') or 0)
+        self.checked_at = time.monotonic()
+        if not self.saturated and self.backlog >= self.high_watermark:
+            self.saturated = True
+            self.times_saturated += 1
+            queue_full.inc()
+            print(f"Scrape queue saturated ({self.backlog} jobs), refusing new links until it drains to {self.low_watermark}")
+        elif self.saturated and self.backlog <= self.low_watermark:
+            self.saturated = False
+            print(f"Scrape queue drained ({self.backlog} jobs), accepting new links")
+        queue_saturated.set(1 if self.saturated else 0)
+
+    def record(self, count: int):
+        """Count newly enqueued jobs towards the backlog estimate"""
+        if self.backlog is not None:
+            self.backlog += count
+
+    def refuse(self, count: int, source: str = "webhook"):
+        """Count jobs refused while saturated"""
+        self.rejected += count
+        queue_rejected.inc(count, source=source)
+
+    def stats(self) -> Dict:
+        return {
+            "saturated": self.saturated,
+            "backlog": self.backlog,
+            "high_watermark": self.high_watermark,
+            "low_watermark": self.low_watermark,
+            "times_saturated": self.times_saturated,
+            "rejected": self.rejected
+        }
+
+admission = AdmissionController()
@@ -0,0 +1,657 @@
+"""
+Asyncio database layer for the webhook service, backed by an asyncpg pool.
+
+Mirrors the helpers in database.py so the webhook event loop never blocks on
+Postgres. The sync API in database.py stays in use by the MCP server.
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import date as date_type
+from typing import Callable, List, Dict, Optional, Set
+
+import asyncpg
+from dotenv import load_dotenv
+
+from schema import SCHEMA_STATEMENTS, SCHEMA_VERSION, SCHEMA_VERSION_TABLE, SCHEMA_LOCK, SEARCH_CONTENT_MAX_CHARS, PRIORITY_INTERACTIVE, PRIORITY_RETRY, PRIORITY_BACKFILL
+from content_codec import compress_content, decompress_content
+from near_duplicates import pack_signature, lsh_buckets
+
+load_dotenv()
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+# Pool configuration (same knobs as the sync pool in database.py)
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get("DB_POOL_MAX_IDLE_SECONDS", 300))
+
+_pool: Optional[asyncpg.Pool] = None
+_waiting = 0
+_checkouts = 0
+_latencies = deque(maxlen=1024)
+
+async def init_pool() -> asyncpg.Pool:
+    """Create the process-wide asyncpg pool (call once from the running event loop)"""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_IDLE_SECONDS
+        )
+    return _pool
+
+async def close_pool():
+    """Close the asyncpg pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def acquire():
+    """Borrow a pooled connection, recording wait and checkout latency"""
+    global _waiting, _checkouts
+    pool = _pool or await init_pool()
+    start = time.monotonic()
+    _waiting += 1
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_TIMEOUT)
+    finally:
+        _waiting -= 1
+    _checkouts += 1
+    _latencies.append(time.monotonic() - start)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+def get_pool_stats() -> Dict:
+    """Get asyncpg pool stats (in-use, waiting, checkout latency)"""
+    if _pool is None:
+        return {"size": 0, "in_use": 0, "waiting": 0}
+
+    latencies = sorted(_latencies)
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "size": size,
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        "idle": idle,
+        "in_use": size - idle,
+        "waiting": _waiting,
+        "checkouts": _checkouts,
+        "checkout_latency_ms": {
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0
+        }
+    }
+
+async def listen(callbacks: Dict[str, Callable[[str], None]]) -> asyncpg.Connection:
+    """
+    Open a dedicated (unpooled) connection that LISTENs on each channel in callbacks.
+
+    callbacks[channel](payload) is invoked on the event loop for every
+    notification. The caller owns the connection and must close it.
+    """
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        for channel, callback in callbacks.items():
+            await conn.add_listener(channel, lambda _conn, _pid, _channel, payload, callback=callback: callback(payload))
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+@asynccontextmanager
+async def try_advisory_lock(name: str):
+    """
+    Hold a session advisory lock on name for the with-block, if no other session has it.
+
+    Yields whether it was acquired (never waits), so work like the group digest
+    send runs in exactly one webhook replica at a time.
+    """
+    async with acquire() as conn:
+        locked = await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", name)
+        try:
+            yield locked
+        finally:
+            if locked:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", name)
+
+def _parse_date(date: Optional[str]) -> Optional[date_type]:
+    return date_type.fromisoformat(date) if date else None
+
+async def create_table():
+    """Create or migrate the riff table unless the current SCHEMA_VERSION is already applied"""
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))", SCHEMA_LOCK)
+            await conn.execute(SCHEMA_VERSION_TABLE)
+            if await conn.fetchval("SELECT 1 FROM riff_schema_version WHERE version = $1", SCHEMA_VERSION):
+                return
+            for statement in SCHEMA_STATEMENTS:
+                await conn.execute(statement)
+            await conn.execute("INSERT INTO riff_schema_version (version) VALUES ($1)", SCHEMA_VERSION)
+
+async def get_table_info() -> Dict:
+    """Check that the riff table exists and count its rows"""
+    async with acquire() as conn:
+        table_name = await conn.fetchval("""
+            SELECT table_name
+            FROM information_schema.tables
+            WHERE table_name = 'riff' AND table_schema = 'public'
+        """)
+        row_count = await conn.fetchval("SELECT COUNT(*) FROM riff") if table_name else 0
+        return {"table_name": table_name, "row_count": row_count}
+
+async def insert_link(url: str, user_name: str) -> Optional[str]:
+    """Insert a new ChatGPT link into the database"""
+    async with acquire() as conn:
+        link_id = await conn.fetchval("""
+            INSERT INTO riff (chatgpt_url, user_name, status)
+            VALUES ($1, $2, 'pending')
+            ON CONFLICT (chatgpt_url) DO NOTHING
+            RETURNING id
+        """, url, user_name)
+        return str(link_id) if link_id else None
+
+async def insert_links(urls: List[str], user_name: Optional[str] = None) -> Dict[str, str]:
+    """Insert many ChatGPT links in one statement; returns {url: id} for the newly inserted ones"""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            INSERT INTO riff (chatgpt_url, user_name, status)
+            SELECT url, $1, 'pending'
+            FROM unnest($2::text[]) AS url
+            ON CONFLICT (chatgpt_url) DO NOTHING
+            RETURNING id, chatgpt_url
+        """, user_name, urls)
+        return {row['chatgpt_url']: str(row['id']) for row in rows}
+
+async def existing_urls(urls: List[str]) -> Set[str]:
+    """The subset of urls that are already stored"""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT chatgpt_url
+            FROM riff
+            WHERE chatgpt_url = ANY($1::text[])
+        """, urls)
+        return {row['chatgpt_url'] for row in rows}
+
+async def update_conversation_content(
+    url: str,
+    content: str,
+    digest: str = None,
+    signature: Optional[List[int]] = None,
+    near_duplicate: Optional[Dict] = None,
+    trace: Optional[Dict] = None,
+    worker_id: Optional[str] = None
+) -> bool:
+    """
+    Update the conversation content after scraping (compressed if large) and release the job lease.
+
+    This is the only write path for scraped content (database.py has no sync
+    counterpart), so lease, search and near-duplicate handling can't diverge.
+
+    The full-text search vector is rebuilt from the plaintext, and with a
+    MinHash signature the row is (re-)indexed for near-duplicate lookups,
+    in the same transaction; near_duplicate is the match from
+    near_duplicates.best_near_duplicate() whose digest was reused, if any.
+    trace is this scrape's pipeline trace, stored as metadata['pipeline'].
+    When worker_id is given, only a job still leased to that worker is
+    written; returns False if the lease was lost (another worker re-claimed
+    the job after it expired, or already stored it).
+    """
+    plain_text, blob, metadata = await asyncio.to_thread(compress_content, content)
+    if trace is not None:
+        metadata["pipeline"] = trace
+    if near_duplicate:
+        metadata["near_duplicate_of_url"] = near_duplicate['chatgpt_url']
+        metadata["near_duplicate_similarity"] = round(near_duplicate['similarity'], 3)
+
+    async with acquire() as conn:
+        async with conn.transaction():
+            riff_id = await conn.fetchval("""
+                UPDATE riff
+                SET conversation_content = $1,
+                    conversation_content_z = $2,
+                    digest = $3,
+                    status = 'scraped',
+                    scraped_at = NOW(),
+                    metadata = (COALESCE(metadata, '{}'::jsonb) - 'near_duplicate_of_url' - 'near_duplicate_similarity') || $4::jsonb,
+                    minhash = $5,
+                    near_duplicate_of = $6,
+                    search_vector = riff_search_vector($3, $8),
+                    lease_expires_at = NULL,
+                    leased_by = NULL,
+                    last_error = NULL,
+                    failed_at = NULL
+                WHERE chatgpt_url = $7
+                AND ($9::text IS NULL OR (status = 'scraping' AND leased_by = $9))
+                RETURNING id
+            """, plain_text, blob, digest, json.dumps(metadata),
+                pack_signature(signature) if signature else None,
+                near_duplicate['root_id'] if near_duplicate else None, url,
+                content[:SEARCH_CONTENT_MAX_CHARS] if content else None, worker_id)
+
+            if riff_id is None:
+                return False
+            await conn.execute("DELETE FROM riff_lsh_bucket WHERE riff_id = $1", riff_id)
+            if signature:
+                bands, buckets = zip(*lsh_buckets(signature))
+                await conn.execute("""
+                    INSERT INTO riff_lsh_bucket (band, bucket, riff_id)
+                    SELECT band, bucket, $3
+                    FROM unnest($1::smallint[], $2::bigint[]) AS b(band, bucket)
+                    ON CONFLICT DO NOTHING
+                """, list(bands), list(buckets), riff_id)
+            return True
+
+async def find_near_duplicate_candidates(signature: List[int], exclude_url: str, limit: int = 20) -> List[Dict]:
+    """Scraped conversations sharing at least one LSH bucket with a signature (index lookup, not a scan)"""
+    bands, buckets = zip(*lsh_buckets(signature))
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT r.id, r.chatgpt_url, r.digest, r.minhash, r.near_duplicate_of
+            FROM riff r
+            WHERE r.id IN (
+                SELECT b.riff_id
+                FROM riff_lsh_bucket b
+                JOIN unnest($1::smallint[], $2::bigint[]) AS q(band, bucket)
+                    ON b.band = q.band AND b.bucket = q.bucket
+            )
+            AND r.chatgpt_url <> $3
+            -- Not this row's own forks (when an original is re-scraped)
+            AND r.near_duplicate_of IS DISTINCT FROM (SELECT id FROM riff WHERE chatgpt_url = $3)
+            AND r.status = 'scraped'
+            LIMIT $4
+        """, list(bands), list(buckets), exclude_url, limit)
+        return [dict(row) for row in rows]
+
+async def enqueue_scrape_job(url: str) -> bool:
+    """Insert (or re-arm) a scrape job for a URL; returns False if it is being scraped right now"""
+    async with acquire() as conn:
+        link_id = await conn.fetchval("""
+            INSERT INTO riff (chatgpt_url, status)
+            VALUES ($1, 'pending')
+            ON CONFLICT (chatgpt_url) DO UPDATE
+            SET status = 'pending',
+                attempts = 0,
+                next_run_at = NOW(),
+                priority = $2,
+                failed_at = NULL
+            WHERE riff.status <> 'scraping'
+            RETURNING id
+        """, url, PRIORITY_INTERACTIVE)
+        return link_id is not None
+
+async def requeue_pending_jobs(keep_interactive_seconds: float = 0) -> int:
+    """
+    Make every pending or retrying job due now; returns the number of such jobs.
+
+    The jobs are demoted to backfill priority whether or not they were already
+    due (a never-scraped backlog is due from the moment it is inserted), so a
+    bulk drain never delays freshly submitted links. Jobs submitted within the
+    last keep_interactive_seconds keep their priority, and jobs that were
+    already due keep their place in line.
+    """
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                UPDATE riff
+                SET next_run_at = LEAST(next_run_at, NOW()),
+                    priority = CASE WHEN created_at < NOW() - make_interval(secs => $2) THEN $1 ELSE priority END
+                WHERE status IN ('pending', 'retrying')
+                AND (
+                    next_run_at > NOW()
+                    OR (priority <> $1 AND created_at < NOW() - make_interval(secs => $2))
+                )
+            """, PRIORITY_BACKFILL, float(keep_interactive_seconds))
+            return await conn.fetchval("""
+                SELECT COUNT(*)
+                FROM riff
+                WHERE status IN ('pending', 'retrying')
+            """)
+
+async def get_job_states(urls: List[str]) -> Dict[str, str]:
+    """
+    {url: state} for scrape jobs: 'scraped', 'failed', 'retrying' (waiting out a
+    backoff after a failed attempt) or 'queued' (due, or being scraped)
+    """
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT chatgpt_url,
+                   CASE
+                       WHEN status IN ('scraped', 'failed') THEN status
+                       WHEN status = 'retrying' AND next_run_at > NOW() THEN 'retrying'
+                       ELSE 'queued'
+                   END AS state
+            FROM riff
+            WHERE chatgpt_url = ANY($1::text[])
+        """, urls)
+        return {row['chatgpt_url']: row['state'] for row in rows}
+
+async def claim_scrape_jobs(worker_id: str, lease_seconds: float, priority: int = PRIORITY_INTERACTIVE, limit: int = 1) -> List[Dict]:
+    """
+    Claim due scrape jobs for this worker.
+
+    Picks pending/retrying jobs whose next_run_at has passed, plus jobs whose lease
+    expired (a worker died mid-scrape), and leases them to worker_id.
+    Candidates are (priority level, user) pairs with due jobs, found by a
+    loose scan of riff_scrape_priority_user_idx (one index probe per pair,
+    however long the backlog is) and ranked: the requested level first, then
+    the most urgent (see fair_scheduler.py); within a level, the user with
+    the fewest jobs in flight, then the longest waiting head job. Each
+    candidate in turn gets a claim of up to limit of its oldest due jobs
+    with FOR UPDATE SKIP LOCKED, so workers woken together by the same
+    NOTIFY fall through to the next user or level instead of coming back
+    empty while due jobs remain, and no job is ever handed to two workers.
+    """
+    async with acquire() as conn:
+        candidates = await conn.fetch("""
+            WITH RECURSIVE pairs AS (
+                -- In index order, a pair's first due row is also its longest waiting job
+                (
+                    SELECT priority, COALESCE(user_name, '') AS user_key, next_run_at AS head_run_at
+                    FROM riff
+                    WHERE status IN ('pending', 'retrying', 'scraping')
+                    AND next_run_at <= NOW()
+                    AND (status <> 'scraping' OR lease_expires_at < NOW())
+                    ORDER BY priority, COALESCE(user_name, ''), next_run_at
+                    LIMIT 1
+                )
+                UNION ALL
+                SELECT next.priority, next.user_key, next.head_run_at
+                FROM pairs p
+                CROSS JOIN LATERAL (
+                    SELECT r.priority, COALESCE(r.user_name, '') AS user_key, r.next_run_at AS head_run_at
+                    FROM riff r
+                    WHERE (r.priority, COALESCE(r.user_name, '')) > (p.priority, p.user_key)
+                    AND r.status IN ('pending', 'retrying', 'scraping')
+                    AND r.next_run_at <= NOW()
+                    AND (r.status <> 'scraping' OR r.lease_expires_at < NOW())
+                    ORDER BY r.priority, COALESCE(r.user_name, ''), r.next_run_at
+                    LIMIT 1
+                ) next
+            ),
+            in_flight AS (
+                SELECT COALESCE(user_name, '') AS user_key, COUNT(*) AS jobs
+                FROM riff
+                WHERE status = 'scraping'
+                AND lease_expires_at >= NOW()
+                GROUP BY 1
+            )
+            SELECT p.priority, p.user_key
+            FROM pairs p
+            LEFT JOIN in_flight f ON f.user_key = p.user_key
+            ORDER BY p.priority <> $1, p.priority, COALESCE(f.jobs, 0), p.head_run_at
+        """, priority)
+
+        for candidate in candidates:
+            rows = await conn.fetch("""
+                UPDATE riff
+                SET status = 'scraping',
+                    attempts = attempts + 1,
+                    leased_by = $1,
+                    lease_expires_at = NOW() + make_interval(secs => $2)
+                WHERE id IN (
+                    SELECT id
+                    FROM riff
+                    WHERE priority = $3
+                    AND COALESCE(user_name, '') = $4
+                    AND status IN ('pending', 'retrying', 'scraping')
+                    AND next_run_at <= NOW()
+                    AND (status <> 'scraping' OR lease_expires_at < NOW())
+                    ORDER BY next_run_at
+                    LIMIT $5
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, chatgpt_url, user_name, attempts, priority,
+                          GREATEST(EXTRACT(EPOCH FROM NOW() - next_run_at), 0)::float8 AS queued_seconds
+            """, worker_id, float(lease_seconds), candidate['priority'], candidate['user_key'], limit)
+            if rows:
+                return [dict(row) for row in rows]
+        return []
+
+async def claim_scrape_job(url: str, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+    """
+    Claim one specific job (pending, retrying or dead-lettered) outside the queue order.
+
+    The conditional UPDATE is the lock between processes: of any number of
+    concurrent claims only one moves the row to 'scraping', the rest get
+    None, as they do while another worker holds an unexpired lease (or the
+    link is already scraped). A dead-lettered job starts a fresh retry budget.
+    """
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            UPDATE riff
+            SET status = 'scraping',
+                attempts = CASE WHEN status = 'failed' THEN 1 ELSE attempts + 1 END,
+                leased_by = $2,
+                lease_expires_at = NOW() + make_interval(secs => $3)
+            WHERE chatgpt_url = $1
+            AND (status IN ('pending', 'retrying', 'failed') OR (status = 'scraping' AND lease_expires_at < NOW()))
+            RETURNING id, chatgpt_url, user_name, attempts, priority,
+                      GREATEST(EXTRACT(EPOCH FROM NOW() - next_run_at), 0)::float8 AS queued_seconds
+        """, url, worker_id, float(lease_seconds))
+        return dict(row) if row else None
+
+async def release_scrape_job(url: str, worker_id: str, delay_seconds: float):
+    """
+    Hand a claimed job back to the queue, due again after delay_seconds.
+
+    For jobs that couldn't run (upstream throttling or down), so the claim's
+    attempt is given back rather than counted against the retry budget.
+    """
+    async with acquire() as conn:
+        await conn.execute("""
+            UPDATE riff
+            SET status = CASE WHEN attempts > 1 THEN 'retrying' ELSE 'pending' END,
+                attempts = GREATEST(attempts - 1, 0),
+                next_run_at = NOW() + make_interval(secs => $3),
+                lease_expires_at = NULL,
+                leased_by = NULL
+            WHERE chatgpt_url = $1
+            AND status = 'scraping'
+            AND leased_by = $2
+        """, url, worker_id, float(delay_seconds))
+
+async def fail_scrape_job(url: str, error: str, retry_delay_seconds: Optional[float], worker_id: Optional[str] = None):
+    """
+    Record a failed scrape attempt.
+
+    With a retry delay the job becomes 'retrying' and is due again after it;
+    with None it is dead-lettered as 'failed'. When worker_id is given, only
+    a job still leased to that worker is touched.
+    """
+    async with acquire() as conn:
+        await conn.execute("""
+            UPDATE riff
+            SET status = CASE WHEN $3::float8 IS NULL THEN 'failed' ELSE 'retrying' END,
+                next_run_at = NOW() + make_interval(secs => COALESCE($3::float8, 0)),
+                priority = GREATEST(priority, $5),
+                failed_at = CASE WHEN $3::float8 IS NULL THEN NOW() END,
+                last_error = $2,
+                lease_expires_at = NULL,
+                leased_by = NULL
+            WHERE chatgpt_url = $1
+            AND ($4::text IS NULL OR (status = 'scraping' AND leased_by = $4))
+        """, url, error, retry_delay_seconds, worker_id, PRIORITY_RETRY)
+
+async def get_dead_letter_jobs(limit: int = 100) -> List[Dict]:
+    """Dead-lettered (failed) jobs, most recent failures first"""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT chatgpt_url, user_name, attempts, last_error, created_at, failed_at
+            FROM riff
+            WHERE status = 'failed'
+            ORDER BY failed_at DESC
+            LIMIT $1
+        """, limit)
+        return [dict(row) for row in rows]
+
+async def requeue_dead_letter_jobs(urls: Optional[List[str]] = None) -> int:
+    """Move dead-lettered jobs (all, or just `urls`) back to pending at backfill priority with a fresh retry budget"""
+    async with acquire() as conn:
+        result = await conn.execute("""
+            UPDATE riff
+            SET status = 'pending',
+                attempts = 0,
+                next_run_at = NOW(),
+                priority = $2,
+                failed_at = NULL
+            WHERE status = 'failed'
+            AND ($1::text[] IS NULL OR chatgpt_url = ANY($1::text[]))
+        """, urls, PRIORITY_BACKFILL)
+        return int(result.split()[-1])
+
+async def get_queue_depth() -> Dict:
+    """Count jobs that are due (and how many of those are backfill), scheduled for later, retrying, leased, and dead-lettered, and the oldest due job's wait"""
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT
+                COUNT(*) FILTER (WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW()) AS due,
+                COUNT(*) FILTER (WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW() AND priority = $1) AS backfill_due,
+                COUNT(*) FILTER (WHERE status = 'pending' AND next_run_at > NOW()) AS scheduled,
+                COUNT(*) FILTER (WHERE status = 'retrying' AND next_run_at > NOW()) AS retrying,
+                COUNT(*) FILTER (WHERE status = 'scraping') AS scraping,
+                COUNT(*) FILTER (WHERE status = 'failed') AS dead_letter,
+                COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(next_run_at) FILTER (
+                    WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW()
+                )), 0)::float8 AS oldest_due_seconds
+            FROM riff
+            WHERE status IN ('pending', 'retrying', 'scraping', 'failed')
+        """, PRIORITY_BACKFILL)
+        return dict(row)
+
+async def get_conversations_by_date(date: Optional[str] = None) -> List[Dict]:
+    """Get all conversations for a specific date (defaults to today)"""
+    async with acquire() as conn:
+        # Half-open range on the raw column so (status, created_at) can be used.
+        # Content is deliberately not selected; use get_conversation_content().
+        rows = await conn.fetch("""
+            SELECT id, chatgpt_url, user_name, digest, created_at, shared_to_group_at, near_duplicate_of
+            FROM riff
+            WHERE status = 'scraped'
+            AND created_at >= COALESCE($1::date, CURRENT_DATE)
+            AND created_at < COALESCE($1::date, CURRENT_DATE) + 1
+            ORDER BY created_at DESC
+        """, _parse_date(date))
+        return [dict(row) for row in rows]
+
+async def get_conversation_by_url(url: str) -> Optional[Dict]:
+    """Get conversation details by URL (without content; see get_conversation_content)"""
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT id, chatgpt_url, user_name, digest, status, created_at,
+                   scraped_at, shared_to_group_at, metadata
+            FROM riff
+            WHERE chatgpt_url = $1
+        """, url)
+        return dict(row) if row else None
+
+async def get_conversation_content(url: str) -> Optional[str]:
+    """Load (and decompress) the full scraped conversation content for a URL"""
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT conversation_content, conversation_content_z,
+                   metadata->>'content_codec' AS content_codec
+            FROM riff
+            WHERE chatgpt_url = $1
+        """, url)
+    if not row:
+        return None
+    return await asyncio.to_thread(
+        decompress_content, row['conversation_content'], row['conversation_content_z'], row['content_codec']
+    )
+
+async def get_cached_digest(cache_key: str) -> Optional[str]:
+    """Look up a cached LLM digest by content hash"""
+    async with acquire() as conn:
+        return await conn.fetchval("""
+            SELECT digest
+            FROM digest_cache
+            WHERE cache_key = $1
+        """, cache_key)
+
+async def store_cached_digest(cache_key: str, model: str, prompt_version: str, digest: str):
+    """Store an LLM digest under its content hash"""
+    async with acquire() as conn:
+        await conn.execute("""
+            INSERT INTO digest_cache (cache_key, model, prompt_version, digest)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (cache_key) DO UPDATE
+            SET digest = EXCLUDED.digest,
+                created_at = NOW()
+        """, cache_key, model, prompt_version, digest)
+
+async def get_synthesis_state(date: Optional[str] = None) -> Optional[Dict]:
+    """Running summary and already-synthesized URLs for a day (defaults to today)"""
+    async with acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT digest_date, running_summary, synthesized_urls, updated_at
+            FROM group_synthesis_state
+            WHERE digest_date = COALESCE($1::date, CURRENT_DATE)
+        """, _parse_date(date))
+        return dict(row) if row else None
+
+async def save_synthesis_state(running_summary: str, synthesized_urls: List[str], date: Optional[str] = None):
+    """Persist a day's running summary and the URLs folded into it"""
+    async with acquire() as conn:
+        await conn.execute("""
+            INSERT INTO group_synthesis_state (digest_date, running_summary, synthesized_urls, updated_at)
+            VALUES (COALESCE($1::date, CURRENT_DATE), $2, $3::text[], NOW())
+            ON CONFLICT (digest_date) DO UPDATE
+            SET running_summary = EXCLUDED.running_summary,
+                synthesized_urls = EXCLUDED.synthesized_urls,
+                updated_at = NOW()
+        """, _parse_date(date), running_summary, synthesized_urls)
+
+async def get_unscraped_links() -> List[Dict]:
+    """Get links that haven't been scraped successfully: pending, retrying or dead-lettered"""
+    async with acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT chatgpt_url, status
+            FROM riff
+            WHERE status IN ('pending', 'retrying', 'failed')
+        """)
+        return [dict(row) for row in rows]
+
+async def mark_conversations_as_shared(urls: List[str]) -> int:
+    """Mark multiple conversations as shared to group"""
+    async with acquire() as conn:
+        result = await conn.execute("""
+            UPDATE riff
+            SET shared_to_group_at = NOW()
+            WHERE chatgpt_url = ANY($1::text[])
+            AND shared_to_group_at IS NULL
+        """, urls)
+        count = int(result.split()[-1])
+        print(f"Database: Marked {count} of {len(urls)} URLs as shared")
+        return count
+
+async def mark_all_conversations_as_unshared() -> int:
+    """Mark all conversations as unshared (for testing purposes)"""
+    async with acquire() as conn:
+        result = await conn.execute("""
+            UPDATE riff
+            SET shared_to_group_at = NULL
+            WHERE shared_to_group_at IS NOT NULL
+        """)
+        return int(result.split()[-1])
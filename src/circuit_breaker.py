@@ -0,0 +1,95 @@
+"""
+Per-provider circuit breakers for upstream APIs.
+
+After CIRCUIT_FAILURE_THRESHOLD consecutive failures (5xx, timeouts,
+connection errors) a provider's circuit opens and requests fail fast with
+CircuitOpenError for CIRCUIT_RESET_SECONDS. Then a single probe request is
+let through (half-open): success closes the circuit, failure re-opens it.
+"""
+
+import os
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", 60))
+
+class CircuitOpenError(Exception):
+    """Request refused because the provider's circuit is open"""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} circuit open (retry after {round(retry_after or 0, 1)}s)")
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.open_for == 0 else "open"
+
+    @property
+    def open_for(self) -> float:
+        """Seconds until the next probe is allowed (0 when closed or probing)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go out now"""
+        if self.opened_at is None:
+            return
+        if self.open_for > 0 or self.probe_in_flight:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.open_for or self.reset_seconds)
+        self.probe_in_flight = True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.probe_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.probe_in_flight:
+                self.times_opened += 1
+                print(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def abandon(self):
+        """A request ended without an outcome (e.g. cancelled); let another probe through"""
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "open_for_seconds": round(self.open_for, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+# Keyed like http_client.UPSTREAMS
+breakers = {name: CircuitBreaker(name) for name in ("firecrawl", "openrouter", "poke")}
+
+def get_circuit_stats() -> Dict:
+    return {name: breaker.stats() for name, breaker in breakers.items()}
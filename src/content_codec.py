@@ -0,0 +1,49 @@
+"""
+Compression codec for stored conversation content
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+import zstandard
+
+# Codec written for new rows; the codec and version are recorded in riff.metadata
+CONTENT_CODEC = "zstd"
+CONTENT_CODEC_VERSION = 1
+CONTENT_COMPRESSION_LEVEL = int(os.environ.get("CONTENT_COMPRESSION_LEVEL", 10))
+
+# Short content (errors, placeholders) is left as plain TEXT
+CONTENT_COMPRESSION_MIN_BYTES = int(os.environ.get("CONTENT_COMPRESSION_MIN_BYTES", 1024))
+
+def compress_content(content: Optional[str]) -> Tuple[Optional[str], Optional[bytes], Dict]:
+    """
+    Encode content for storage.
+
+    Returns (plain_text, compressed_blob, metadata): exactly one of plain_text
+    and compressed_blob is set (both None for None content), and metadata
+    describes how the content was stored.
+    """
+    if content is None:
+        return (None, None, {})
+
+    raw = content.encode("utf-8")
+    if len(raw) < CONTENT_COMPRESSION_MIN_BYTES:
+        return (content, None, {"content_codec": "none", "content_bytes": len(raw)})
+
+    blob = zstandard.ZstdCompressor(level=CONTENT_COMPRESSION_LEVEL).compress(raw)
+    return (None, blob, {
+        "content_codec": CONTENT_CODEC,
+        "content_codec_version": CONTENT_CODEC_VERSION,
+        "content_bytes": len(raw),
+        "content_stored_bytes": len(blob)
+    })
+
+def decompress_content(plain_text: Optional[str], blob: Optional[bytes], codec: Optional[str]) -> Optional[str]:
+    """Decode content stored by compress_content"""
+    if blob is None:
+        return plain_text
+
+    if codec == CONTENT_CODEC:
+        return zstandard.ZstdDecompressor().decompress(bytes(blob)).decode("utf-8")
+
+    raise ValueError(f"Unknown content codec: {codec}")
@@ -1,36 +1,74 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import json
+import base64
+import threading
+import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
 from dotenv import load_dotenv
 
+from db_pool import ConnectionPool
+from content_codec import decompress_content
+from schema import SCHEMA_STATEMENTS, SCHEMA_VERSION, SCHEMA_VERSION_TABLE, SCHEMA_LOCK, SEARCH_CONFIG, PRIORITY_BACKFILL
+
 load_dotenv()
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# Connection pool configuration
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get("DB_POOL_MAX_IDLE_SECONDS", 300))
+DB_POOL_MAX_LIFETIME_SECONDS = float(os.environ.get("DB_POOL_MAX_LIFETIME_SECONDS", 3600))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.environ.get("DB_POOL_HEALTH_CHECK_SECONDS", 30))
+
+# Full-text search: how many of the most recent matches are ranked per query
+SEARCH_MAX_CANDIDATES = int(os.environ.get("SEARCH_MAX_CANDIDATES", 1000))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_idle=DB_POOL_MAX_IDLE_SECONDS,
+                    max_lifetime=DB_POOL_MAX_LIFETIME_SECONDS,
+                    health_check_after=DB_POOL_HEALTH_CHECK_SECONDS
+                )
+                pool.open()
+                _pool = pool
+    return _pool
+
 def get_connection():
-    """Get a database connection"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """Borrow a pooled database connection (use as a context manager)"""
+    return get_pool().connection()
+
+def get_pool_stats() -> Dict:
+    """Get connection pool stats (in-use, waiting, checkout latency)"""
+    if _pool is None:
+        return {"size": 0, "in_use": 0, "waiting": 0}
+    return _pool.stats()
 
 def create_table():
-    """Create the riff table if it doesn't exist"""
+    """Create or migrate the riff table unless the current SCHEMA_VERSION is already applied"""
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS riff (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    chatgpt_url TEXT NOT NULL UNIQUE,
-                    user_name VARCHAR(255),
-                    conversation_content TEXT,
-                    digest TEXT,
-                    status VARCHAR(50) DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    scraped_at TIMESTAMP,
-                    shared_to_group_at TIMESTAMP,
-                    metadata JSONB
-                )
-            """)
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (SCHEMA_LOCK,))
+            cur.execute(SCHEMA_VERSION_TABLE)
+            cur.execute("SELECT 1 FROM riff_schema_version WHERE version = %s", (SCHEMA_VERSION,))
+            if cur.fetchone() is None:
+                for statement in SCHEMA_STATEMENTS:
+                    cur.execute(statement)
+                cur.execute("INSERT INTO riff_schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
             conn.commit()
 
 def insert_link(url: str, user_name: str) -> str:
@@ -47,19 +85,51 @@ def insert_link(url: str, user_name: str) -> str:
             conn.commit()
             return str(result['id']) if result else None
 
-def update_conversation_content(url: str, content: str, digest: str = None):
-    """Update the conversation content after scraping"""
+def insert_links(urls: List[str], user_name: str) -> Dict[str, str]:
+    """Insert many ChatGPT links in one statement; returns {url: id} for the newly inserted ones"""
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                UPDATE riff
-                SET conversation_content = %s,
-                    digest = %s,
-                    status = 'scraped',
-                    scraped_at = NOW()
-                WHERE chatgpt_url = %s
-            """, (content, digest, url))
+                INSERT INTO riff (chatgpt_url, user_name, status)
+                SELECT url, %s, 'pending'
+                FROM unnest(%s::text[]) AS url
+                ON CONFLICT (chatgpt_url) DO NOTHING
+                RETURNING id, chatgpt_url
+            """, (user_name, urls))
+            rows = cur.fetchall()
             conn.commit()
+            return {row['chatgpt_url']: str(row['id']) for row in rows}
+
+def existing_urls(urls: List[str]) -> Set[str]:
+    """The subset of urls that are already stored"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT chatgpt_url
+                FROM riff
+                WHERE chatgpt_url = ANY(%s::text[])
+            """, (urls,))
+            return {row['chatgpt_url'] for row in cur.fetchall()}
+
+def get_queue_depth() -> Dict:
+    """Count jobs that are due (and how many of those are backfill), scheduled for later, retrying, leased, and dead-lettered, and the oldest due job's wait"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW()) AS due,
+                    COUNT(*) FILTER (WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW() AND priority = %s) AS backfill_due,
+                    COUNT(*) FILTER (WHERE status = 'pending' AND next_run_at > NOW()) AS scheduled,
+                    COUNT(*) FILTER (WHERE status = 'retrying' AND next_run_at > NOW()) AS retrying,
+                    COUNT(*) FILTER (WHERE status = 'scraping') AS scraping,
+                    COUNT(*) FILTER (WHERE status = 'failed') AS dead_letter,
+                    COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(next_run_at) FILTER (
+                        WHERE status IN ('pending', 'retrying') AND next_run_at <= NOW()
+                    )), 0)::float8 AS oldest_due_seconds
+                FROM riff
+                WHERE status IN ('pending', 'retrying', 'scraping', 'failed')
+            """, (PRIORITY_BACKFILL,))
+            return dict(cur.fetchone())
 
 def get_distinct_users() -> List[str]:
     """Get all distinct user names who have submitted links"""
@@ -73,51 +143,274 @@ def get_distinct_users() -> List[str]:
             """)
             return [row['user_name'] for row in cur.fetchall()]
 
-def get_conversations_by_date(date: Optional[str] = None) -> List[Dict]:
-    """Get all conversations for a specific date"""
+# Columns the listing queries can project (columns=...); content is never listed
+LIST_COLUMNS = {
+    "chatgpt_url": "r.chatgpt_url",
+    "user_name": "r.user_name",
+    "digest": "r.digest",
+    "status": "r.status",
+    "created_at": "r.created_at",
+    "shared_to_group_at": "r.shared_to_group_at",
+    "near_duplicate_of_url": "original.chatgpt_url"
+}
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque keyset cursor for the listing position just after row"""
+    position = json.dumps([row['created_at'].isoformat(), str(row['id'])])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(created_at, id) from encode_cursor(); raises ValueError for anything else"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(created_at), str(uuid.UUID(row_id)))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def _list_select(columns: Optional[List[str]]) -> str:
+    """SELECT list for the requested LIST_COLUMNS, plus the keyset columns (id, created_at)"""
+    columns = list(columns) if columns else list(LIST_COLUMNS)
+    unknown = [column for column in columns if column not in LIST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    columns = [column for column in columns if column != "created_at"]
+    return ", ".join(["r.id", "r.created_at"] + [f"{LIST_COLUMNS[column]} AS {column}" for column in columns])
+
+def _keyset_params(limit: Optional[int], cursor: Optional[str]) -> Dict:
+    after_created_at, after_id = decode_cursor(cursor) if cursor else (None, None)
+    return {"limit": limit, "after_created_at": after_created_at, "after_id": after_id}
+
+def get_conversations_by_date(
+    date: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    Scraped conversations for a date (defaults to today), newest first.
+
+    Keyset-paginated on (created_at, id): pass encode_cursor(last row) as
+    cursor for the next page. limit=None returns every row; columns picks a
+    subset of LIST_COLUMNS (id and created_at are always included).
+    """
     with get_connection() as conn:
         with conn.cursor() as cur:
-            if date:
-                cur.execute("""
-                    SELECT chatgpt_url, user_name, digest, conversation_content, created_at, shared_to_group_at
-                    FROM riff
-                    WHERE DATE(created_at) = %s
-                    AND status = 'scraped'
-                    ORDER BY created_at DESC
-                """, (date,))
-            else:
-                cur.execute("""
-                    SELECT chatgpt_url, user_name, digest, conversation_content, created_at, shared_to_group_at
-                    FROM riff
-                    WHERE DATE(created_at) = CURRENT_DATE
-                    AND status = 'scraped'
-                    ORDER BY created_at DESC
-                """)
+            # Half-open range on the raw column so (status, created_at, id) can be used.
+            # Content is deliberately not selected; use get_conversation_content().
+            cur.execute(f"""
+                SELECT {_list_select(columns)}
+                FROM riff r
+                LEFT JOIN riff original ON original.id = r.near_duplicate_of
+                WHERE r.status = 'scraped'
+                AND r.created_at >= COALESCE(%(date)s::date, CURRENT_DATE)
+                AND r.created_at < COALESCE(%(date)s::date, CURRENT_DATE) + 1
+                AND (%(after_created_at)s::timestamp IS NULL
+                     OR (r.created_at, r.id) < (%(after_created_at)s::timestamp, %(after_id)s::uuid))
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT %(limit)s
+            """, {"date": date, **_keyset_params(limit, cursor)})
             return cur.fetchall()
 
-def get_user_submissions(user_name: str) -> List[Dict]:
-    """Get all submissions from a specific user"""
+def get_user_submissions(
+    user_name: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> List[Dict]:
+    """Submissions from a specific user, newest first (paginated like get_conversations_by_date)"""
     with get_connection() as conn:
         with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {_list_select(columns)}
+                FROM riff r
+                LEFT JOIN riff original ON original.id = r.near_duplicate_of
+                WHERE r.user_name = %(user_name)s
+                AND (%(after_created_at)s::timestamp IS NULL
+                     OR (r.created_at, r.id) < (%(after_created_at)s::timestamp, %(after_id)s::uuid))
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT %(limit)s
+            """, {"user_name": user_name, **_keyset_params(limit, cursor)})
+            return cur.fetchall()
+
+SEARCH_HEADLINE_OPTIONS = "StartSel=**, StopSel=**, MaxWords=35, MinWords=15, MaxFragments=2"
+
+def search_conversations(query: str, user_name: Optional[str] = None, since: Optional[datetime] = None, limit: int = 10) -> Dict:
+    """
+    Full-text search over digests and content, best matches first.
+
+    query uses web search syntax ("quoted phrases", OR, -excluded). Matches
+    come from the riff_search_idx GIN index; only the SEARCH_MAX_CANDIDATES
+    most recent matches are ranked, which bounds the cost of very common
+    terms ("capped" is True when more matched, so narrowing with user_name
+    or since reaches older ones). Each result has a rank, matched_in
+    ("digest" or "content") and a snippet of the digest, with the matched
+    terms in **bold** when the digest matched. Content is stored compressed,
+    so it is never read back just to build snippets.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH q AS (
+                    SELECT websearch_to_tsquery(%(config)s::regconfig, %(query)s) AS query
+                ),
+                candidates AS (
+                    SELECT r.id, r.chatgpt_url, r.user_name, r.digest, r.created_at, r.search_vector
+                    FROM riff r, q
+                    WHERE r.search_vector @@ q.query
+                    AND (%(user)s::text IS NULL OR r.user_name = %(user)s)
+                    AND (%(since)s::timestamp IS NULL OR r.created_at >= %(since)s::timestamp)
+                    ORDER BY r.created_at DESC
+                    LIMIT %(candidates)s + 1
+                ),
+                matches AS (
+                    SELECT c.id, c.chatgpt_url, c.user_name, c.digest, c.created_at,
+                           ts_rank_cd(c.search_vector, q.query) AS rank,
+                           to_tsvector(%(config)s::regconfig, COALESCE(c.digest, '')) @@ q.query AS digest_matched
+                    FROM (SELECT * FROM candidates ORDER BY created_at DESC LIMIT %(candidates)s) c, q
+                    ORDER BY rank DESC, c.created_at DESC
+                    LIMIT %(limit)s
+                )
+                SELECT m.chatgpt_url, m.user_name, m.created_at, m.rank,
+                       (SELECT COUNT(*) FROM candidates) > %(candidates)s AS capped,
+                       CASE WHEN m.digest_matched THEN 'digest' ELSE 'content' END AS matched_in,
+                       ts_headline(%(config)s::regconfig, COALESCE(m.digest, ''), q.query, %(headline)s) AS snippet
+                FROM matches m
+                CROSS JOIN q
+                ORDER BY m.rank DESC, m.created_at DESC
+            """, {
+                "config": SEARCH_CONFIG,
+                "query": query,
+                "user": user_name,
+                "since": since,
+                "candidates": SEARCH_MAX_CANDIDATES,
+                "limit": limit,
+                "headline": SEARCH_HEADLINE_OPTIONS
+            })
+            rows = cur.fetchall()
+
+    return {
+        "matches": [
+            {key: row[key] for key in ("chatgpt_url", "user_name", "created_at", "rank", "matched_in", "snippet")}
+            for row in rows
+        ],
+        "capped": bool(rows) and rows[0]['capped']
+    }
+
+def get_pipeline_stats(since: Optional[datetime] = None, slowest: int = 5) -> Dict:
+    """
+    Aggregate per-link pipeline traces (metadata['pipeline']) of links scraped since a time (default: the last day).
+
+    Returns p50/p95/p99/max seconds per stage (plus "total"), digest latency
+    and token totals per digest source and model, total seconds per job
+    priority, attempt counts, and the slowest links. Percentiles are computed in SQL over the
+    riff_pipeline_trace_idx range.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH traced AS (
+                    SELECT chatgpt_url, scraped_at, metadata->'pipeline' AS trace
+                    FROM riff
+                    WHERE metadata ? 'pipeline'
+                    AND scraped_at >= COALESCE(%(since)s::timestamp, NOW() - INTERVAL '1 day')
+                )
+                SELECT s.stage, COUNT(*) AS count,
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY s.seconds) AS percentiles,
+                       MAX(s.seconds) AS max
+                FROM traced t
+                CROSS JOIN LATERAL (
+                    SELECT key, value::float8 FROM jsonb_each_text(t.trace->'stages')
+                    UNION ALL
+                    SELECT 'total', (t.trace->>'total_seconds')::float8
+                ) AS s(stage, seconds)
+                WHERE s.seconds IS NOT NULL
+                GROUP BY s.stage
+                ORDER BY percentile_cont(0.95) WITHIN GROUP (ORDER BY s.seconds) DESC
+            """, {"since": since})
+            stages = cur.fetchall()
+
             cur.execute("""
-                SELECT chatgpt_url, digest, status, created_at, shared_to_group_at
+                SELECT metadata->'pipeline'->'digest'->>'source' AS source,
+                       metadata->'pipeline'->'digest'->>'model' AS model,
+                       COUNT(*) AS count,
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (
+                           ORDER BY (metadata->'pipeline'->'stages'->>'digest')::float8
+                       ) AS percentiles,
+                       SUM((metadata->'pipeline'->'digest'->>'llm_calls')::int)::int AS llm_calls,
+                       SUM((metadata->'pipeline'->'digest'->>'prompt_tokens')::bigint)::bigint AS prompt_tokens,
+                       SUM((metadata->'pipeline'->'digest'->>'completion_tokens')::bigint)::bigint AS completion_tokens
                 FROM riff
-                WHERE user_name = %s
-                ORDER BY created_at DESC
-            """, (user_name,))
-            return cur.fetchall()
+                WHERE metadata ? 'pipeline'
+                AND scraped_at >= COALESCE(%(since)s::timestamp, NOW() - INTERVAL '1 day')
+                GROUP BY 1, 2
+                ORDER BY count DESC
+            """, {"since": since})
+            digests = cur.fetchall()
+
+            cur.execute("""
+                SELECT metadata->'pipeline'->>'priority' AS priority,
+                       COUNT(*) AS count,
+                       percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (
+                           ORDER BY (metadata->'pipeline'->>'total_seconds')::float8
+                       ) AS percentiles
+                FROM riff
+                WHERE metadata ? 'pipeline'
+                AND scraped_at >= COALESCE(%(since)s::timestamp, NOW() - INTERVAL '1 day')
+                GROUP BY 1
+                ORDER BY count DESC
+            """, {"since": since})
+            priorities = cur.fetchall()
+
+            cur.execute("""
+                SELECT COUNT(*) AS links,
+                       COUNT(*) FILTER (WHERE (metadata->'pipeline'->>'retries')::int > 0) AS retried_links,
+                       COALESCE(SUM((metadata->'pipeline'->>'retries')::int), 0)::int AS retries,
+                       AVG((metadata->'pipeline'->>'content_chars')::float8) AS avg_content_chars
+                FROM riff
+                WHERE metadata ? 'pipeline'
+                AND scraped_at >= COALESCE(%(since)s::timestamp, NOW() - INTERVAL '1 day')
+            """, {"since": since})
+            totals = cur.fetchone()
+
+            cur.execute("""
+                SELECT chatgpt_url, scraped_at, metadata->'pipeline' AS trace
+                FROM riff
+                WHERE metadata ? 'pipeline'
+                AND scraped_at >= COALESCE(%(since)s::timestamp, NOW() - INTERVAL '1 day')
+                ORDER BY (metadata->'pipeline'->>'total_seconds')::float8 DESC NULLS LAST
+                LIMIT %(slowest)s
+            """, {"since": since, "slowest": slowest})
+            slowest_links = cur.fetchall()
+
+    return {"totals": totals, "stages": stages, "digests": digests, "priorities": priorities, "slowest": slowest_links}
 
 def get_conversation_by_url(url: str) -> Dict:
-    """Get full conversation details by URL"""
+    """Get conversation details by URL (without content; see get_conversation_content)"""
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT *
+                SELECT id, chatgpt_url, user_name, digest, status, created_at,
+                       scraped_at, shared_to_group_at, metadata
                 FROM riff
                 WHERE chatgpt_url = %s
             """, (url,))
             return cur.fetchone()
 
+def get_conversation_content(url: str) -> Optional[str]:
+    """Load (and decompress) the full scraped conversation content for a URL"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT conversation_content, conversation_content_z,
+                       metadata->>'content_codec' AS content_codec
+                FROM riff
+                WHERE chatgpt_url = %s
+            """, (url,))
+            row = cur.fetchone()
+    if not row:
+        return None
+    return decompress_content(row['conversation_content'], row['conversation_content_z'], row['content_codec'])
+
 def mark_conversations_as_shared(urls: List[str]) -> int:
     """Mark multiple conversations as shared to group"""
     with get_connection() as conn:
@@ -146,6 +439,31 @@ def mark_conversations_as_shared(urls: List[str]) -> int:
             print(f"Database: Successfully updated {cur.rowcount} rows")
             return cur.rowcount
 
+def get_cached_digest(cache_key: str) -> Optional[str]:
+    """Look up a cached LLM digest by content hash"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT digest
+                FROM digest_cache
+                WHERE cache_key = %s
+            """, (cache_key,))
+            row = cur.fetchone()
+            return row['digest'] if row else None
+
+def store_cached_digest(cache_key: str, model: str, prompt_version: str, digest: str):
+    """Store an LLM digest under its content hash"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO digest_cache (cache_key, model, prompt_version, digest)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET digest = EXCLUDED.digest,
+                    created_at = NOW()
+            """, (cache_key, model, prompt_version, digest))
+            conn.commit()
+
 def mark_all_conversations_as_unshared() -> int:
     """Mark all conversations as unshared (for testing purposes)"""
     with get_connection() as conn:
@@ -0,0 +1,270 @@
+"""
+Process-wide PostgreSQL connection pool with health checks and idle recycling
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+# Number of recent checkout latencies kept for percentile stats
+LATENCY_WINDOW = 1024
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to max_size and reused LIFO so the warm
+    ones stay warm. Connections idle for longer than max_idle are closed down to
+    min_size, connections older than max_lifetime are replaced, and a connection
+    that sat idle for longer than health_check_after is pinged before reuse.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        health_check_after: float = 30.0,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size} max={max_size}")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._checked_out = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._recycled = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+
+    def open(self):
+        """Pre-open min_size connections"""
+        entries = []
+        try:
+            for _ in range(self.min_size):
+                entries.append(_PooledConnection(self._connect()))
+        except Exception:
+            self._close_quietly(entries)
+            raise
+        with self._cond:
+            self._idle.extend(entries)
+            self._size += len(entries)
+
+    def _pop_expired_locked(self, now: float) -> list:
+        """Remove idle connections past max_idle (down to min_size) or max_lifetime"""
+        expired = []
+        kept = deque()
+        while self._idle:
+            entry = self._idle.popleft()
+            too_old = now - entry.created_at > self.max_lifetime
+            too_idle = (
+                now - entry.last_used > self.max_idle
+                and self._size - len(expired) > self.min_size
+            )
+            if too_old or too_idle:
+                expired.append(entry)
+            else:
+                kept.append(entry)
+        self._idle = kept
+        self._size -= len(expired)
+        self._recycled += len(expired)
+        return expired
+
+    @staticmethod
+    def _close_quietly(entries):
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting up to the pool timeout"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                expired = self._pop_expired_locked(time.monotonic())
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"Timed out after {self.timeout}s waiting for a database connection"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+
+            self._close_quietly(expired)
+
+            if entry is None:
+                try:
+                    entry = _PooledConnection(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif time.monotonic() - entry.last_used > self.health_check_after and not self._is_healthy(entry.conn):
+                self._close_quietly([entry])
+                with self._cond:
+                    self._size -= 1
+                    self._health_check_failures += 1
+                    self._cond.notify()
+                continue
+
+            latency = time.monotonic() - start
+            with self._cond:
+                self._checked_out[id(entry.conn)] = entry
+                self._checkouts += 1
+                self._latencies.append(latency)
+            return entry.conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, closing it if it is broken or stale"""
+        with self._cond:
+            entry = self._checked_out.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Connection was not checked out from this pool")
+
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        now = time.monotonic()
+        discard = discard or conn.closed or self._closed or now - entry.created_at > self.max_lifetime
+
+        with self._cond:
+            if discard:
+                self._size -= 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly([entry])
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block, committing on success"""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> Dict:
+        """Snapshot of pool occupancy and checkout latency"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            stats = {
+                "size": self._size,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": len(self._checked_out),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "checkout_timeouts": self._timeouts,
+                "health_check_failures": self._health_check_failures,
+                "recycled": self._recycled,
+            }
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        stats["checkout_latency_ms"] = {
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        }
+        return stats
+
+    def close(self):
+        """Close all idle connections; checked-out connections are closed when returned"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_quietly(idle)
@@ -0,0 +1,162 @@
+"""
+Content-addressed cache for LLM conversation digests.
+
+Keys are a hash of (normalized content, model, prompt version), so identical
+inputs skip the OpenRouter call. Lookups go through an in-process LRU first
+and then the digest_cache table, which is shared by every process: get/put
+use the sync psycopg2 pool (MCP server), get_async/put_async the asyncpg
+pool (webhook workers).
+"""
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from prompts import DIGEST_SYSTEM_PROMPT
+
+DIGEST_CACHE_SIZE = int(os.environ.get("DIGEST_CACHE_SIZE", 1024))
+DIGEST_CACHE_DB_ENABLED = os.environ.get("DIGEST_CACHE_DB_ENABLED", "true").lower() == "true"
+
+def prompt_version(*parts: str) -> str:
+    """Version tag derived from prompt text, so any prompt edit invalidates old entries"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+DIGEST_PROMPT_VERSION = prompt_version(DIGEST_SYSTEM_PROMPT)
+
+_TRAILING_WHITESPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+def normalize_content(content: str) -> str:
+    """Normalize content so cosmetic differences don't change the cache key"""
+    content = unicodedata.normalize("NFC", content)
+    content = content.replace("\r\n", "\n").replace("\r", "\n")
+    content = _TRAILING_WHITESPACE.sub("", content)
+    content = _BLANK_LINES.sub("\n\n", content)
+    return content.strip()
+
+def cache_key(content: str, model: str, prompt_version: str = DIGEST_PROMPT_VERSION) -> str:
+    """Hash of (normalized content, model, prompt version)"""
+    h = hashlib.sha256()
+    for part in (model, prompt_version, normalize_content(content)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class DigestCache:
+    """Two-tier digest cache: in-process LRU in front of the digest_cache table"""
+
+    def __init__(self, max_entries: int = DIGEST_CACHE_SIZE, use_db: bool = DIGEST_CACHE_DB_ENABLED):
+        self.max_entries = max_entries
+        self.use_db = use_db
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+    def _remember(self, key: str, digest: str):
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+            return digest
+
+    def _db_hit(self, key: str, digest: Optional[str]) -> Optional[str]:
+        """Count a database lookup's outcome, promoting hits into the LRU"""
+        if digest is not None:
+            self._remember(key, digest)
+            self._count("db_hits")
+        else:
+            self._count("misses")
+        return digest
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a digest, promoting database hits into the LRU"""
+        digest = self._memory_get(key)
+        if digest is not None:
+            return digest
+        if not self.use_db:
+            self._count("misses")
+            return None
+
+        try:
+            from database import get_cached_digest
+            digest = get_cached_digest(key)
+        except Exception as e:
+            print(f"Digest cache lookup failed: {e}")
+            self._count("db_errors")
+            digest = None
+        return self._db_hit(key, digest)
+
+    def put(self, key: str, model: str, digest: str, prompt_version: str = DIGEST_PROMPT_VERSION):
+        """Store a freshly generated digest in both tiers"""
+        self._remember(key, digest)
+        self._count("stores")
+
+        if self.use_db:
+            try:
+                from database import store_cached_digest
+                store_cached_digest(key, model, prompt_version, digest)
+            except Exception as e:
+                print(f"Digest cache store failed: {e}")
+                self._count("db_errors")
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """get() for the event loop: the database tier goes through the asyncpg pool"""
+        digest = self._memory_get(key)
+        if digest is not None:
+            return digest
+        if not self.use_db:
+            self._count("misses")
+            return None
+
+        try:
+            from async_database import get_cached_digest
+            digest = await get_cached_digest(key)
+        except Exception as e:
+            print(f"Digest cache lookup failed: {e}")
+            self._count("db_errors")
+            digest = None
+        return self._db_hit(key, digest)
+
+    async def put_async(self, key: str, model: str, digest: str, prompt_version: str = DIGEST_PROMPT_VERSION):
+        """put() for the event loop: the database tier goes through the asyncpg pool"""
+        self._remember(key, digest)
+        self._count("stores")
+
+        if self.use_db:
+            try:
+                from async_database import store_cached_digest
+                await store_cached_digest(key, model, prompt_version, digest)
+            except Exception as e:
+                print(f"Digest cache store failed: {e}")
+                self._count("db_errors")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current LRU size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+digest_cache = DigestCache()
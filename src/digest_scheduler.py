@@ -0,0 +1,140 @@
+"""
+Event-driven scheduler for group digests.
+
+Scrape completions (Postgres NOTIFY on the riff_scraped channel) call
+notify(); nothing runs, and nothing touches the database, until one does. A
+send then happens once scrapes go quiet for DIGEST_DEBOUNCE_SECONDS, but no
+later than DIGEST_MAX_DELAY_MINUTES after the first unsent completion, no
+sooner than DIGEST_MIN_INTERVAL_MINUTES after the previous send, and never
+during DIGEST_QUIET_HOURS. A burst of completions becomes one synthesis.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIGEST_DEBOUNCE_SECONDS = float(os.environ.get("DIGEST_DEBOUNCE_SECONDS", 120))
+DIGEST_MIN_INTERVAL_MINUTES = float(os.environ.get("DIGEST_MIN_INTERVAL_MINUTES", 30))
+DIGEST_MAX_DELAY_MINUTES = float(os.environ.get("DIGEST_MAX_DELAY_MINUTES", 60))
+DIGEST_QUIET_HOURS = os.environ.get("DIGEST_QUIET_HOURS", "")  # e.g. "23:00-08:00"
+DIGEST_TIMEZONE = os.environ.get("DIGEST_TIMEZONE")  # e.g. "America/Los_Angeles"; server local time if unset
+
+def parse_quiet_hours(spec: str) -> Optional[Tuple[int, int]]:
+    """"HH[:MM]-HH[:MM]" to (start, end) minutes past midnight; may wrap midnight"""
+    if not spec.strip():
+        return None
+
+    def minutes(part: str) -> int:
+        hours, _, mins = part.strip().partition(":")
+        return int(hours) * 60 + int(mins or 0)
+
+    start, _, end = spec.partition("-")
+    return (minutes(start), minutes(end))
+
+class DigestScheduler:
+    """Debounced, rate-bounded trigger for an async send callback"""
+
+    def __init__(
+        self,
+        send: Callable[[], Awaitable[bool]],
+        debounce_seconds: float = DIGEST_DEBOUNCE_SECONDS,
+        min_interval_seconds: float = DIGEST_MIN_INTERVAL_MINUTES * 60,
+        max_delay_seconds: float = DIGEST_MAX_DELAY_MINUTES * 60,
+        quiet_hours: Optional[Tuple[int, int]] = parse_quiet_hours(DIGEST_QUIET_HOURS),
+        timezone: Optional[str] = DIGEST_TIMEZONE
+    ):
+        """send() returns True if it sent a digest (False: nothing to send)"""
+        self._send = send
+        self.debounce_seconds = debounce_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.quiet_hours = quiet_hours
+        self.tz = ZoneInfo(timezone) if timezone else None
+        self._wake = asyncio.Event()
+        self.first_event_at = None
+        self.last_event_at = None
+        self.last_sent_at = None
+        self._counters = {"events": 0, "ticks": 0, "sends": 0, "errors": 0}
+
+    def notify(self):
+        """Record that something new is ready to share (e.g. a scrape completed)"""
+        now = time.time()
+        if self.first_event_at is None:
+            self.first_event_at = now
+        self.last_event_at = now
+        self._counters["events"] += 1
+        self._wake.set()
+
+    def quiet_hours_end(self, ts: float) -> Optional[float]:
+        """End of the quiet period containing ts, or None if ts is outside quiet hours"""
+        if not self.quiet_hours:
+            return None
+        start, end = self.quiet_hours
+        local = datetime.fromtimestamp(ts, self.tz)
+        minute = local.hour * 60 + local.minute
+        inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+        if not inside:
+            return None
+        end_at = local.replace(hour=end // 60, minute=end % 60, second=0, microsecond=0)
+        if end_at <= local:
+            end_at += timedelta(days=1)
+        return end_at.timestamp()
+
+    def next_send_at(self) -> Optional[float]:
+        """When the pending events should be sent (None when there are none)"""
+        if self.first_event_at is None:
+            return None
+        due = min(self.last_event_at + self.debounce_seconds, self.first_event_at + self.max_delay_seconds)
+        if self.last_sent_at is not None:
+            due = max(due, self.last_sent_at + self.min_interval_seconds)
+        # Checked against now too: a send that comes due late (a slow wake-up, a retry after a
+        # contended send) must not go out if quiet hours have started since
+        return self.quiet_hours_end(max(due, time.time())) or due
+
+    async def run(self):
+        """Wait for events and send when due, until cancelled"""
+        while True:
+            self._wake.clear()
+            due = self.next_send_at()
+            if due is None:
+                # Idle: no timer, no queries, just wait for the next event
+                await self._wake.wait()
+                continue
+
+            # Recomputed right before every send, so quiet hours are re-checked at send time
+            delay = due - time.time()
+            if delay > 0:
+                # A new event may move the deadline, so recompute when one arrives
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Events arriving while the send runs start a new batch
+            self.first_event_at = self.last_event_at = None
+            self._counters["ticks"] += 1
+            try:
+                if await self._send():
+                    self.last_sent_at = time.time()
+                    self._counters["sends"] += 1
+            except Exception as e:
+                print(f"Error in digest send, retrying after debounce: {e}")
+                self._counters["errors"] += 1
+                self.notify()
+
+    def stats(self) -> Dict:
+        next_send_at = self.next_send_at()
+        return {
+            **self._counters,
+            "pending": self.first_event_at is not None,
+            "next_send_in_seconds": round(max(0.0, next_send_at - time.time()), 1) if next_send_at else None,
+            "last_sent_at": datetime.fromtimestamp(self.last_sent_at, self.tz).isoformat() if self.last_sent_at else None
+        }
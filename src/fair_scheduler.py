@@ -0,0 +1,63 @@
+"""
+Weighted fair scheduling of scrape jobs across priority levels.
+
+Every job has a priority (schema.PRIORITY_*): interactive for fresh
+submissions, retry for failed attempts, backfill for bulk requeues. Each
+claim asks for one level, picked by smooth weighted round-robin over the
+SCRAPE_WEIGHT_* weights; a claim for a level with nothing due takes the most
+urgent level that has due jobs instead, so workers never idle while work is
+waiting. With the default 8:3:1 weights a backlog of backfill jobs gets one
+claim in twelve while interactive links are waiting (so it still drains),
+and every claim nobody else needs.
+
+Within a level, claim_scrape_jobs prefers users with the fewest jobs in
+flight, so one user's 100-link paste doesn't hold up everyone else's links,
+and it falls through to the next user (and level) when the preferred one's
+jobs are being claimed by another worker.
+"""
+
+import os
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from schema import PRIORITY_INTERACTIVE, PRIORITY_RETRY, PRIORITY_BACKFILL, PRIORITY_NAMES
+
+load_dotenv()
+
+SCRAPE_WEIGHT_INTERACTIVE = int(os.environ.get("SCRAPE_WEIGHT_INTERACTIVE", 8))
+SCRAPE_WEIGHT_RETRY = int(os.environ.get("SCRAPE_WEIGHT_RETRY", 3))
+SCRAPE_WEIGHT_BACKFILL = int(os.environ.get("SCRAPE_WEIGHT_BACKFILL", 1))
+
+class WeightedRoundRobin:
+    """Smooth weighted round-robin (as in nginx): levels interleave in proportion to their weights"""
+
+    def __init__(self, weights: Dict[int, int]):
+        # A level with weight 0 is never asked for, only claimed from when nothing else is due
+        self.weights = {level: weight for level, weight in weights.items() if weight > 0}
+        self.total = sum(self.weights.values())
+        self.current = {level: 0 for level in self.weights}
+        self.picks = {level: 0 for level in weights}
+
+    def next(self) -> int:
+        """Level the next claim should ask for"""
+        if not self.weights:
+            return PRIORITY_INTERACTIVE
+        for level, weight in self.weights.items():
+            self.current[level] += weight
+        level = max(self.current, key=self.current.get)
+        self.current[level] -= self.total
+        self.picks[level] += 1
+        return level
+
+    def stats(self) -> Dict:
+        return {
+            "weights": {PRIORITY_NAMES[level]: weight for level, weight in self.weights.items()},
+            "picks": {PRIORITY_NAMES[level]: picks for level, picks in self.picks.items()}
+        }
+
+scheduler = WeightedRoundRobin({
+    PRIORITY_INTERACTIVE: SCRAPE_WEIGHT_INTERACTIVE,
+    PRIORITY_RETRY: SCRAPE_WEIGHT_RETRY,
+    PRIORITY_BACKFILL: SCRAPE_WEIGHT_BACKFILL
+})
@@ -0,0 +1,242 @@
+"""
+Group digest synthesis: turns the day's conversation digests into one group chat message.
+
+Two modes (GROUP_SYNTHESIS_MODE):
+
+    full         - every tick re-sends all of today's digests to the LLM
+    incremental  - every tick sends only digests not synthesized yet, plus a
+                   compact running summary of the earlier ones, persisted per
+                   day in group_synthesis_state
+
+Near-duplicate conversations (forks of one share, see near_duplicates.py)
+are collapsed into one line in both modes.
+
+Input tokens and latency per tick are recorded for both, labelled by mode.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from async_database import get_synthesis_state, save_synthesis_state
+from http_client import http
+from metrics import Histogram
+from near_duplicates import cluster_key
+from pipeline_metrics import track_stage
+from scraper import CHARS_PER_TOKEN, OPENROUTER_API_URL
+from prompts import (
+    GROUP_DIGEST_TEMPLATE,
+    NO_CONVERSATIONS_MESSAGE,
+    GROUP_SYNTHESIS_SYSTEM_PROMPT,
+    SYNTHESIS_INPUT_TEMPLATE,
+    INCREMENTAL_SYNTHESIS_INPUT_TEMPLATE,
+    RUNNING_SUMMARY_SYSTEM_PROMPT,
+    RUNNING_SUMMARY_INPUT_TEMPLATE,
+    NO_RUNNING_SUMMARY
+)
+
+load_dotenv()
+
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+DIGEST_MODEL = os.environ.get("DIGEST_MODEL", "openai/gpt-3.5-turbo")
+GROUP_SYNTHESIS_MODE = os.environ.get("GROUP_SYNTHESIS_MODE", "incremental")
+RUNNING_SUMMARY_MAX_WORDS = int(os.environ.get("RUNNING_SUMMARY_MAX_WORDS", 150))
+DIGESTS_PER_USER = 2
+
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+synthesis_latency = Histogram(
+    "group_synthesis_seconds",
+    "Wall-clock LLM time per group synthesis tick",
+    labelnames=("mode",)
+)
+synthesis_input_tokens = Histogram(
+    "group_synthesis_input_tokens",
+    "LLM input (prompt) tokens per group synthesis tick",
+    labelnames=("mode",),
+    buckets=TOKEN_BUCKETS
+)
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count for when the provider doesn't report usage"""
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN
+
+def collapse_near_duplicates(conversations: List[Dict]) -> List[Dict]:
+    """One conversation per near-duplicate cluster (the original if present), with the other sharers in 'also_shared_by'"""
+    clusters = {}
+    for conv in conversations:
+        clusters.setdefault(cluster_key(conv), []).append(conv)
+
+    collapsed = []
+    for members in clusters.values():
+        kept = next((conv for conv in members if not conv.get('near_duplicate_of')), members[0])
+        kept_user = kept.get('user_name', 'Anonymous')
+        others = [conv.get('user_name', 'Anonymous') for conv in members if conv is not kept]
+        collapsed.append({**kept, "also_shared_by": [user for user in dict.fromkeys(others) if user != kept_user]})
+    return collapsed
+
+def format_raw_summaries(conversations: List[Dict]) -> str:
+    """Digests grouped by user (at most DIGESTS_PER_USER each) as LLM input lines; near-duplicates appear once"""
+    by_user = {}
+    for conv in collapse_near_duplicates(conversations):
+        user = conv.get('user_name', 'Anonymous')
+        digest = conv.get('digest', '')
+        if user not in by_user:
+            by_user[user] = []
+        if digest:
+            by_user[user].append((digest, conv['also_shared_by']))
+
+    raw_summaries = []
+    for user, digests in by_user.items():
+        for i, (digest, also_shared_by) in enumerate(digests[:DIGESTS_PER_USER], 1):
+            also = f", also shared by {', '.join(also_shared_by)}" if also_shared_by else ""
+            raw_summaries.append(f"From {user} (#{i}{also}): {digest}")
+    return "\n\n".join(raw_summaries)
+
+async def _synthesis_call(system_prompt: str, user_content: str) -> Tuple[str, int]:
+    """One OpenRouter completion; returns (content, input tokens); raises on a non-200 response"""
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "model": DIGEST_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": user_content
+            }
+        ]
+    }
+
+    response = await http.post("openrouter", OPENROUTER_API_URL, headers=headers, json=payload)
+    if response.status != 200:
+        raise RuntimeError(f"OpenRouter API error: {response.status} {response.text()[:200]}")
+
+    data = response.json()
+    input_tokens = (data.get('usage') or {}).get('prompt_tokens') or estimate_tokens(system_prompt, user_content)
+    return (data['choices'][0]['message']['content'], input_tokens)
+
+async def synthesize_with_openrouter(raw_summaries: str) -> str:
+    """Use OpenRouter to synthesize raw summaries into engaging group message"""
+    if not OPENROUTER_API_KEY:
+        # Fallback if no API key
+        return "Openrouter API key not found"
+
+    print(f"🤖 Using model: {DIGEST_MODEL}")
+
+    start = time.monotonic()
+    try:
+        content, input_tokens = await _synthesis_call(
+            GROUP_SYNTHESIS_SYSTEM_PROMPT,
+            SYNTHESIS_INPUT_TEMPLATE.format(raw_summaries=raw_summaries)
+        )
+        synthesis_latency.observe(time.monotonic() - start, mode="full")
+        synthesis_input_tokens.observe(input_tokens, mode="full")
+        print(f"✅ Synthesis successful with {DIGEST_MODEL} ({input_tokens} input tokens)")
+        print(f"📝 Generated content: {content[:100]}...")
+        return content
+
+    except Exception as e:
+        print(f"Error synthesizing digest: {e}")
+        return f"🎯 Daily ChatGPT Insights:\n\n{raw_summaries}\n\n✨ Share your own insights by submitting ChatGPT links!"
+
+async def create_group_digest(conversations: List[Dict]) -> str:
+    """Create a synthesized message from multiple conversations using LLM"""
+    if not conversations:
+        return NO_CONVERSATIONS_MESSAGE
+
+    raw_summaries_text = format_raw_summaries(conversations)
+    if not raw_summaries_text:
+        return NO_CONVERSATIONS_MESSAGE
+
+    # Use LLM to synthesize the raw summaries into an engaging message
+    synthesized_content = await synthesize_with_openrouter(raw_summaries_text)
+
+    return GROUP_DIGEST_TEMPLATE.format(synthesized_content=synthesized_content)
+
+async def create_incremental_group_digest(conversations: List[Dict], date: Optional[str] = None) -> str:
+    """
+    Synthesize only the conversations not folded into the day's running summary yet.
+
+    The group message and the updated running summary are generated
+    concurrently from (running summary + new digests), so input size tracks
+    the delta instead of the whole day. State only advances once both calls
+    succeed; on failure the next tick retries the same delta.
+    """
+    if not conversations:
+        return NO_CONVERSATIONS_MESSAGE
+
+    if not OPENROUTER_API_KEY:
+        return GROUP_DIGEST_TEMPLATE.format(synthesized_content="Openrouter API key not found")
+
+    state = await get_synthesis_state(date)
+    synthesized_urls = list(state['synthesized_urls']) if state else []
+    running_summary = state['running_summary'] if state else NO_RUNNING_SUMMARY
+
+    already = set(synthesized_urls)
+    new_conversations = [conv for conv in conversations if conv['chatgpt_url'] not in already]
+    # Forks of a conversation already in the running summary add nothing new
+    synthesized_clusters = {cluster_key(conv) for conv in conversations if conv['chatgpt_url'] in already}
+    new_summaries = format_raw_summaries(
+        [conv for conv in new_conversations if cluster_key(conv) not in synthesized_clusters]
+    )
+    if not new_summaries and not state:
+        return NO_CONVERSATIONS_MESSAGE
+
+    start = time.monotonic()
+    try:
+        hook_call = _synthesis_call(
+            GROUP_SYNTHESIS_SYSTEM_PROMPT,
+            INCREMENTAL_SYNTHESIS_INPUT_TEMPLATE.format(
+                running_summary=running_summary,
+                new_summaries=new_summaries or NO_RUNNING_SUMMARY
+            )
+        )
+        if new_summaries:
+            summary_call = _synthesis_call(
+                RUNNING_SUMMARY_SYSTEM_PROMPT.format(max_words=RUNNING_SUMMARY_MAX_WORDS),
+                RUNNING_SUMMARY_INPUT_TEMPLATE.format(running_summary=running_summary, new_summaries=new_summaries)
+            )
+            (content, hook_tokens), (running_summary, summary_tokens) = await asyncio.gather(hook_call, summary_call)
+        else:
+            # Nothing new (e.g. conversations were un-shared): re-hook from the summary alone
+            content, hook_tokens = await hook_call
+            summary_tokens = 0
+
+    except Exception as e:
+        print(f"Error in incremental synthesis, falling back to full: {e}")
+        return await create_group_digest(conversations)
+
+    input_tokens = hook_tokens + summary_tokens
+    synthesis_latency.observe(time.monotonic() - start, mode="incremental")
+    synthesis_input_tokens.observe(input_tokens, mode="incremental")
+    print(f"✅ Incremental synthesis: {len(new_conversations)} new conversations, {input_tokens} input tokens")
+
+    if new_conversations:
+        synthesized_urls.extend(conv['chatgpt_url'] for conv in new_conversations)
+        await save_synthesis_state(running_summary, synthesized_urls, date)
+
+    return GROUP_DIGEST_TEMPLATE.format(synthesized_content=content)
+
+async def create_daily_digest(conversations: List[Dict]) -> str:
+    """Group digest for today's conversations using the configured GROUP_SYNTHESIS_MODE"""
+    with track_stage("synthesis"):
+        if GROUP_SYNTHESIS_MODE == "full":
+            return await create_group_digest(conversations)
+        return await create_incremental_group_digest(conversations)
+
+def get_synthesis_stats() -> Dict:
+    return {
+        "mode": GROUP_SYNTHESIS_MODE,
+        "latency_seconds": synthesis_latency.snapshot(),
+        "input_tokens": synthesis_input_tokens.snapshot()
+    }
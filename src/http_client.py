@@ -0,0 +1,160 @@
+"""
+Shared keep-alive HTTP client for upstream APIs (Firecrawl, OpenRouter, Poke).
+
+One long-lived aiohttp session per upstream, each with its own connection
+limit and timeouts, so calls reuse pooled keep-alive connections instead of
+repeating DNS, TCP and TLS setup. Request latency is recorded per upstream.
+Every request also goes through the upstream's rate limiter (rate_limit.py);
+429s are waited out per Retry-After and retried instead of being returned,
+and a per-upstream circuit breaker (circuit_breaker.py) fails fast while an
+upstream is down.
+"""
+
+import json
+import os
+import time
+from typing import Dict
+
+import aiohttp
+from dotenv import load_dotenv
+
+from metrics import Histogram
+from circuit_breaker import breakers, get_circuit_stats
+from rate_limit import RATE_LIMIT_MAX_RETRIES, RateLimitedError, limiters, parse_retry_after, get_rate_limit_stats
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", 10))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", 60))
+
+# Per-upstream connection limit and total request timeout
+UPSTREAMS = {
+    "firecrawl": {
+        "max_connections": int(os.environ.get("FIRECRAWL_MAX_CONNECTIONS", 8)),
+        "timeout": float(os.environ.get("FIRECRAWL_TIMEOUT_SECONDS", 90))
+    },
+    "openrouter": {
+        "max_connections": int(os.environ.get("OPENROUTER_MAX_CONNECTIONS", 8)),
+        "timeout": float(os.environ.get("OPENROUTER_TIMEOUT_SECONDS", 60))
+    },
+    "poke": {
+        "max_connections": int(os.environ.get("POKE_MAX_CONNECTIONS", 4)),
+        "timeout": float(os.environ.get("POKE_TIMEOUT_SECONDS", 15))
+    }
+}
+
+upstream_latency = Histogram(
+    "upstream_request_seconds",
+    "Latency of outbound HTTP requests by upstream and status class",
+    labelnames=("upstream", "status")
+)
+
+class UpstreamResponse:
+    """Fully-read response, safe to use after the connection went back to the pool"""
+
+    def __init__(self, status: int, headers, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body)
+
+class HttpClient:
+    """Long-lived aiohttp sessions, one per upstream"""
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    async def start(self):
+        """Open a session per upstream (call from the running event loop)"""
+        for name, config in UPSTREAMS.items():
+            session = self._sessions.get(name)
+            if session is not None and not session.closed:
+                continue
+            connector = aiohttp.TCPConnector(
+                limit=config["max_connections"],
+                limit_per_host=config["max_connections"],
+                keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+                ttl_dns_cache=300
+            )
+            timeout = aiohttp.ClientTimeout(total=config["timeout"], connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+            self._sessions[name] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        """Close every session and its pooled connections"""
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+    async def request(self, upstream: str, method: str, url: str, **kwargs) -> UpstreamResponse:
+        """
+        Send a request through the upstream's pooled session and read the whole body.
+
+        Waits for the upstream's rate limiter first. A 429 pauses the limiter for
+        Retry-After and the request is retried up to RATE_LIMIT_MAX_RETRIES
+        times; after that RateLimitedError is raised. CircuitOpenError is raised
+        without sending anything while the upstream's circuit is open.
+        """
+        session = self._sessions.get(upstream)
+        if session is None or session.closed:
+            await self.start()
+            session = self._sessions[upstream]
+        limiter = limiters[upstream]
+        breaker = breakers[upstream]
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            async with limiter.slot():
+                breaker.before_request()
+                start = time.monotonic()
+                try:
+                    async with session.request(method, url, **kwargs) as response:
+                        result = UpstreamResponse(response.status, response.headers, await response.read())
+                except Exception:
+                    latency = time.monotonic() - start
+                    upstream_latency.observe(latency, upstream=upstream, status="error")
+                    limiter.record(None, latency)
+                    breaker.record_failure()
+                    raise
+                except BaseException:
+                    breaker.abandon()
+                    raise
+
+            latency = time.monotonic() - start
+            upstream_latency.observe(latency, upstream=upstream, status=f"{result.status // 100}xx")
+            retry_after = parse_retry_after(result.headers.get("Retry-After"))
+            limiter.record(result.status, latency, retry_after)
+            if result.status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if result.status != 429:
+                return result
+            print(f"{upstream} returned 429 (attempt {attempt + 1}), retry after {retry_after}s")
+
+        raise RateLimitedError(upstream, retry_after)
+
+    async def post(self, upstream: str, url: str, **kwargs) -> UpstreamResponse:
+        return await self.request(upstream, "POST", url, **kwargs)
+
+    def stats(self) -> Dict:
+        """Connection usage, rate limiter and circuit state, and latency histograms per upstream"""
+        connections = {}
+        for name, session in self._sessions.items():
+            connections[name] = {
+                "limit": UPSTREAMS[name]["max_connections"],
+                "timeout_seconds": UPSTREAMS[name]["timeout"],
+                "closed": session.closed
+            }
+        return {
+            "connections": connections,
+            "rate_limits": get_rate_limit_stats(),
+            "circuits": get_circuit_stats(),
+            "latency_seconds": upstream_latency.snapshot()
+        }
+
+http = HttpClient()
@@ -0,0 +1,75 @@
+"""
+ChatGPT share link helpers shared by the MCP server and the webhook service
+
+Share links are identified by the UUID in their path. Every spelling of the
+same share (trailing slash, query string, #fragment, chat.openai.com host,
+/share/e/ embed path, upper-case hex) canonicalizes to one URL, which is
+what gets stored in riff.chatgpt_url.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional
+
+SHARE_URL_PREFIX = "https://chatgpt.com/share/"
+MAX_LINKS_PER_SUBMISSION = int(os.environ.get("MAX_LINKS_PER_SUBMISSION", 100))
+
+# Keep in sync with the riff.share_id generated column in schema.py
+_SHARE_URL = re.compile(
+    r"^https?://(?:www\.)?(?:chatgpt\.com|chat\.openai\.com)/share/(?:e/)?"
+    r"([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?![0-9a-f-])",
+    re.IGNORECASE
+)
+
+def share_id(url) -> Optional[str]:
+    """The share's UUID (lower-case), or None if url isn't a ChatGPT share link"""
+    if not isinstance(url, str):
+        return None
+    match = _SHARE_URL.match(url.strip())
+    return match.group(1).lower() if match else None
+
+def canonical_share_url(url) -> Optional[str]:
+    """https://chatgpt.com/share/<uuid> for any spelling of a share link, or None"""
+    uuid = share_id(url)
+    return f"{SHARE_URL_PREFIX}{uuid}" if uuid else None
+
+def canonical_or_raw(url: str) -> str:
+    """Canonical URL when url is a share link; otherwise url unchanged (for lookups of legacy rows)"""
+    return canonical_share_url(url) or url
+
+def is_share_url(url) -> bool:
+    return share_id(url) is not None
+
+def unique_share_urls(urls: List[str]) -> List[str]:
+    """Canonical URLs of the valid share links in a submission, de-duplicated, in submission order"""
+    return list(dict.fromkeys(filter(None, (canonical_share_url(url) for url in urls))))
+
+def submission_results(urls: List[str], inserted: Dict[str, str]) -> List[Dict]:
+    """Per-URL status for a bulk submission, given {canonical url: id} of the rows actually inserted"""
+    results = []
+    seen = set()
+    for url in urls:
+        canonical = canonical_share_url(url)
+        if canonical is None:
+            results.append({"url": url, "status": "invalid", "error": "Invalid ChatGPT share URL format"})
+            continue
+
+        result = {"url": canonical}
+        if url != canonical:
+            result["submitted_url"] = url
+        if canonical in seen:
+            result["status"] = "duplicate"
+        elif canonical in inserted:
+            result["status"] = "queued"
+            result["id"] = inserted[canonical]
+        else:
+            result["status"] = "already_exists"
+        seen.add(canonical)
+        results.append(result)
+    return results
+
+def count_statuses(results: List[Dict]) -> Dict[str, int]:
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts
@@ -0,0 +1,161 @@
+"""
+In-process metrics primitives
+
+Every metric registers itself in REGISTRY on creation; render_prometheus()
+serializes them all in the Prometheus text exposition format for /metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Seconds; spans DB round trips up to slow LLM calls
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metrics created in this process, in creation order
+REGISTRY: List = []
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+class _Metric:
+    """Name, help text, label names and per-label-values series, shared by every metric type"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        REGISTRY.append(self)
+
+    def _label_values(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    """Thread-safe monotonically increasing count, optionally split by label values"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            series = dict(self._series)
+        return {",".join(f"{n}={v}" for n, v in zip(self.labelnames, key)) or "all": value for key, value in series.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in series]
+
+class Gauge(Counter):
+    """Point-in-time value (set on every scrape of /metrics or as state changes)"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._series[key] = value
+
+class Histogram(_Metric):
+    """Thread-safe cumulative-bucket histogram, optionally split by label values"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Record one observation"""
+        key = self._label_values(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a with-block"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _quantile(self, counts, total: int, q: float):
+        """Upper bound of the bucket holding the q-quantile ("+Inf" past the last bucket)"""
+        rank = q * total
+        for bound, cumulative in zip(self.buckets, counts):
+            if cumulative >= rank:
+                return bound
+        return "+Inf"
+
+    def snapshot(self) -> Dict:
+        """Per-series count, sum, cumulative buckets and approximate quantiles"""
+        with self._lock:
+            series = {key: {"counts": list(s["counts"]), "count": s["count"], "sum": s["sum"]} for key, s in self._series.items()}
+
+        result = {}
+        for key, s in series.items():
+            label = ",".join(f"{n}={v}" for n, v in zip(self.labelnames, key)) or "all"
+            result[label] = {
+                "count": s["count"],
+                "sum": round(s["sum"], 6),
+                "buckets": {str(bound): c for bound, c in zip(self.buckets, s["counts"])},
+                "p50": self._quantile(s["counts"], s["count"], 0.50),
+                "p95": self._quantile(s["counts"], s["count"], 0.95),
+                "p99": self._quantile(s["counts"], s["count"], 0.99)
+            }
+        return result
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(s["counts"]), s["count"], s["sum"]) for key, s in self._series.items())
+
+        lines = self._header()
+        for key, counts, count, total in series:
+            labels = _format_labels(self.labelnames, key)
+            bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, cumulative in zip(bounds, counts + [count]):
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,123 @@
+"""
+Near-duplicate detection for scraped conversations (MinHash + LSH).
+
+Forks of one ChatGPT conversation get distinct share URLs but nearly
+identical markdown. Each scrape is reduced to a MinHash signature over word
+shingles; the signature is split into LSH bands, and every band hashes to a
+bucket stored in riff_lsh_bucket. Conversations sharing any bucket are
+candidates, so a lookup touches a handful of index entries instead of every
+stored conversation. Candidates are then confirmed by estimated Jaccard
+similarity against NEAR_DUPLICATE_THRESHOLD.
+
+Signatures use one-permutation hashing: each shingle is hashed once and
+assigned to one of MINHASH_PERMUTATIONS bins, keeping the minimum per bin,
+with empty bins filled from their neighbours (densification). That is one
+hash per shingle instead of one per shingle per permutation, which keeps
+long conversations cheap in pure Python.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+NEAR_DUPLICATE_DETECTION = os.environ.get("NEAR_DUPLICATE_DETECTION", "true").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", 0.8))
+MINHASH_SHINGLE_WORDS = int(os.environ.get("MINHASH_SHINGLE_WORDS", 5))
+
+# Changing these invalidates stored signatures and buckets
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 similarity almost always share a bucket
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+# Conversations this short are mostly page chrome; don't call them duplicates
+MINHASH_MIN_SHINGLES = 25
+
+_EMPTY = (1 << 64) - 1
+_BIN_RANGE = 1 << 57  # 64-bit hash // 128 bins
+_WORD = re.compile(r"\w+")
+_SIGNATURE = struct.Struct(f">{MINHASH_PERMUTATIONS}Q")
+
+def shingles(content: str, words: int = MINHASH_SHINGLE_WORDS) -> set:
+    """Distinct word n-grams of the case- and punctuation-folded content"""
+    tokens = _WORD.findall(unicodedata.normalize("NFKC", content).lower())
+    if len(tokens) <= words:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + words]) for i in range(len(tokens) - words + 1)}
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+def minhash_signature(content: str) -> Optional[List[int]]:
+    """MINHASH_PERMUTATIONS 64-bit values, or None when content is too short to compare"""
+    shingle_set = shingles(content)
+    if len(shingle_set) < MINHASH_MIN_SHINGLES:
+        return None
+
+    bins = [_EMPTY] * MINHASH_PERMUTATIONS
+    for shingle in shingle_set:
+        h = _hash64(shingle.encode("utf-8"))
+        b = h % MINHASH_PERMUTATIONS
+        v = h // MINHASH_PERMUTATIONS
+        if v < bins[b]:
+            bins[b] = v
+
+    # Densify: an empty bin borrows the next non-empty bin's value, offset by the distance
+    signature = list(bins)
+    for i, value in enumerate(bins):
+        if value != _EMPTY:
+            continue
+        distance = 1
+        while bins[(i + distance) % MINHASH_PERMUTATIONS] == _EMPTY:
+            distance += 1
+        signature[i] = bins[(i + distance) % MINHASH_PERMUTATIONS] + distance * _BIN_RANGE
+    return signature
+
+def pack_signature(signature: List[int]) -> bytes:
+    return _SIGNATURE.pack(*signature)
+
+def unpack_signature(blob: bytes) -> Optional[List[int]]:
+    """Stored signature, or None if it was written with a different MINHASH_PERMUTATIONS"""
+    blob = bytes(blob)
+    if len(blob) != _SIGNATURE.size:
+        return None
+    return list(_SIGNATURE.unpack(blob))
+
+def lsh_buckets(signature: List[int]) -> List[Tuple[int, int]]:
+    """(band, bucket) pairs to index and look up; bucket is a signed 64-bit hash of the band's rows"""
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f">{LSH_ROWS}Q", *rows), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / MINHASH_PERMUTATIONS
+
+def best_near_duplicate(signature: List[int], candidates: List[Dict]) -> Optional[Dict]:
+    """
+    Most similar candidate at or above NEAR_DUPLICATE_THRESHOLD, or None.
+
+    Candidates are rows with id, chatgpt_url, digest, minhash and
+    near_duplicate_of. The match gets 'similarity' and 'root_id' (the
+    original of its cluster, so forks of forks point at one conversation).
+    """
+    best = None
+    for candidate in candidates:
+        other = unpack_signature(candidate['minhash']) if candidate.get('minhash') is not None else None
+        if other is None:
+            continue
+        similarity = estimate_similarity(signature, other)
+        if similarity >= NEAR_DUPLICATE_THRESHOLD and (best is None or similarity > best['similarity']):
+            best = {**candidate, "similarity": similarity}
+    if best is not None:
+        best['root_id'] = str(best.get('near_duplicate_of') or best['id'])
+    return best
+
+def cluster_key(conversation: Dict) -> str:
+    """Conversations with the same key are near-duplicates of one original"""
+    return str(conversation.get('near_duplicate_of') or conversation.get('id') or conversation['chatgpt_url'])
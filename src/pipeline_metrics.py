@@ -0,0 +1,119 @@
+"""
+Pipeline metrics shared by the webhook service and the MCP server.
+
+Every stage of a link's trip (enqueue wait, Firecrawl scrape, near-duplicate
+lookup, digest LLM, DB write, group synthesis, Poke send) is timed into
+pipeline_stage_seconds and counted by outcome in pipeline_stage_total.
+Queue and DB pool gauges are refreshed from their stats right before
+/metrics renders; admission control (admission.py) reports saturation and
+refused links.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from metrics import Counter, Gauge, Histogram
+
+# Stage latencies run from sub-millisecond lookups to multi-minute backlogs
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+stage_latency = Histogram(
+    "pipeline_stage_seconds",
+    "Latency of each pipeline stage",
+    labelnames=("stage",),
+    buckets=STAGE_BUCKETS
+)
+stage_total = Counter(
+    "pipeline_stage_total",
+    "Pipeline stage runs by outcome",
+    labelnames=("stage", "outcome")
+)
+job_wait = Histogram(
+    "scrape_job_wait_seconds",
+    "Time from a scrape job becoming due to being claimed, by priority",
+    labelnames=("priority",),
+    buckets=STAGE_BUCKETS
+)
+scrape_deduplicated = Counter(
+    "scrape_deduplicated_total",
+    "Scrapes not started because the link was already being scraped, here (joined) or by another process",
+    labelnames=("reason",)
+)
+queue_jobs = Gauge(
+    "scrape_queue_jobs",
+    "Scrape jobs by queue state",
+    labelnames=("state",)
+)
+queue_oldest_due = Gauge(
+    "scrape_queue_oldest_due_seconds",
+    "How long the oldest due scrape job has been waiting to be claimed"
+)
+queue_saturated = Gauge(
+    "scrape_queue_saturated",
+    "1 while new submissions are refused because the scrape backlog is over its high watermark"
+)
+queue_full = Counter(
+    "scrape_queue_full_total",
+    "Times the scrape backlog reached its high watermark"
+)
+queue_rejected = Counter(
+    "scrape_queue_rejected_total",
+    "Links refused while the scrape queue was saturated",
+    labelnames=("source",)
+)
+db_pool = Gauge(
+    "db_pool",
+    "Database connection pool occupancy and lifetime counts",
+    labelnames=("stat",)
+)
+db_pool_checkout_latency = Gauge(
+    "db_pool_checkout_latency_ms",
+    "Recent database connection checkout latency",
+    labelnames=("quantile",)
+)
+
+class StageTiming:
+    """Outcome (settable by the caller) and duration of one tracked stage"""
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.seconds = 0.0
+
+def record_stage(stage: str, seconds: float, outcome: str = "ok"):
+    stage_latency.observe(seconds, stage=stage)
+    stage_total.inc(stage=stage, outcome=outcome)
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a with-block as a pipeline stage (outcome "error" if it raises)"""
+    timing = StageTiming()
+    start = time.monotonic()
+    try:
+        yield timing
+    except Exception:
+        timing.outcome = "error"
+        raise
+    except BaseException:
+        timing.outcome = "cancelled"
+        raise
+    finally:
+        timing.seconds = time.monotonic() - start
+        record_stage(stage, timing.seconds, timing.outcome)
+
+def record_queue_depth(depth: Dict):
+    """Set queue gauges from get_queue_depth()"""
+    for state, count in depth.items():
+        if state == "oldest_due_seconds":
+            queue_oldest_due.set(count or 0)
+        else:
+            queue_jobs.set(count, state=state)
+
+def record_pool_stats(stats: Dict):
+    """Set pool gauges from get_pool_stats() (numeric stats and checkout latency quantiles)"""
+    for stat, value in stats.items():
+        if stat == "checkout_latency_ms":
+            for quantile, ms in value.items():
+                db_pool_checkout_latency.set(ms, quantile=quantile)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            db_pool.set(value, stat=stat)
@@ -71,6 +71,30 @@ Silent checklist (do not print):
 [ ] Only source content  [ ] PII redacted  [ ] Sections complete
 [ ] Clear tensions  [ ] ≤ max_words_per_section per section"""
 
+# Map step for long conversations: notes on one part, merged later by DIGEST_SYSTEM_PROMPT
+DIGEST_CHUNK_SYSTEM_PROMPT = """SYSTEM — CONVERSATION EXCERPT NOTES
+
+You receive ONE part of a longer ChatGPT conversation. Write dense working
+notes that a later pass will merge with the notes from the other parts into
+a single digest.
+
+GUARDRAILS (hard)
+- Use ONLY provided content. Do not invent names, facts, or quotes.
+- Redact PII (emails, phones, addresses); generalize sensitive details to topic-level.
+- Plain text bullets, no preamble, ≤ 150 words.
+- Do not summarize the whole conversation; you only see this part.
+
+CAPTURE
+- Claims, decisions and pivots made in this part.
+- Load-bearing terms and how they are defined or redefined.
+- Tensions, tradeoffs and constraints that bite.
+- Questions raised but left open."""
+
+# Input templates for chunked (map-reduce) digesting
+DIGEST_INPUT_TEMPLATE = "Conversation input:\n\n{content}"
+DIGEST_CHUNK_INPUT_TEMPLATE = "Conversation excerpt (part {part} of {total}):\n\n{content}"
+DIGEST_REDUCE_INPUT_TEMPLATE = "Conversation input (notes from {total} consecutive parts of one long conversation):\n\n{notes}"
+
 # System prompt for synthesizing group digest
 GROUP_SYNTHESIS_SYSTEM_PROMPT = """SYSTEM
 
@@ -110,6 +134,51 @@ Example output:
 The point is to share those shower thoughts in a filtered way.
 """
 
+# Template for incremental synthesis: running summary of earlier digests + only the new ones
+INCREMENTAL_SYNTHESIS_INPUT_TEMPLATE = """Earlier today this group shared shower thoughts (ChatGPT convos) summarized here:
+
+{running_summary}
+
+New since the last update, from different users in this group:
+
+{new_summaries}
+
+Create an engaging group chat hook that inspire ppl in the group to talk more, led by the new summaries and tying them back to earlier threads where they clash or connect.
+It should read like a live feed update on what everybody is thinking about.
+
+Don't sounds like a robot. Absolutely no emojis, they are hella cringe. Make sure the message is within 30 words.
+
+Keep ppl guessing, find the conflicts.
+
+The point is to share those shower thoughts in a filtered way.
+"""
+
+# Keeps the per-day running summary compact so incremental synthesis input stays bounded
+RUNNING_SUMMARY_SYSTEM_PROMPT = """SYSTEM
+
+Maintain a compact running summary of the ChatGPT conversation digests a group shared today.
+
+METHOD
+1) Merge the new digests into the existing summary.
+2) One short line per distinct thread: core idea, tension or open question.
+3) Fold near-duplicates together; drop filler and detail that no longer distinguishes threads.
+
+GUARDRAILS
+- At most {max_words} words total; plain text lines; no names, PII, links, or emojis.
+- Never invent content that is not in the summary or the digests.
+"""
+
+RUNNING_SUMMARY_INPUT_TEMPLATE = """Current running summary:
+
+{running_summary}
+
+New digests to merge in:
+
+{new_summaries}
+"""
+
+NO_RUNNING_SUMMARY = "(nothing yet today)"
+
 # Template for group chat message (after LLM synthesis)
 GROUP_DIGEST_TEMPLATE = """Send the following message to the group chat between Xyn and Friends, remember, do NOT send it to Xyn's DM, send it in the group:
 
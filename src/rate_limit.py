@@ -0,0 +1,214 @@
+"""
+Per-provider rate limiting for upstream APIs.
+
+Each provider gets a token bucket (steady request rate plus burst) and an
+AIMD concurrency limit: the number of in-flight requests grows additively
+while responses are fast and healthy, and is cut multiplicatively on 429s,
+timeouts or latency above target. Retry-After pauses the whole bucket.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pause applied after a 429 that carries no Retry-After header
+DEFAULT_THROTTLE_PAUSE_SECONDS = float(os.environ.get("DEFAULT_THROTTLE_PAUSE_SECONDS", 5))
+# 429 retries per request before giving up with RateLimitedError
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get("RATE_LIMIT_MAX_RETRIES", 3))
+
+class RateLimitedError(Exception):
+    """Upstream kept answering 429 after all rate-limit retries"""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} rate limited (retry after {retry_after or DEFAULT_THROTTLE_PAUSE_SECONDS}s)")
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) to seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens/second up to burst; rate <= 0 means unlimited"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait for a token (FIFO across waiters)"""
+        if self.rate <= 0 and time.monotonic() >= self._paused_until:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    return
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause_for(self, seconds: float):
+        """Hand out no tokens for the next `seconds` (honors Retry-After)"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = now
+
+    @property
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests"""
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        target_latency: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        if self.target_latency and latency > self.target_latency:
+            self.on_congestion()
+            return
+        # Additive increase: about +1 per limit's worth of successful requests
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_congestion(self):
+        now = time.monotonic()
+        # One cut per cooldown, so a burst of 429s from one window isn't counted many times
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+
+class ProviderLimiter:
+    """Token bucket + adaptive concurrency for one upstream provider"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_concurrency: int, target_latency: Optional[float] = None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, target_latency=target_latency)
+        self.throttled = 0
+        self.congestion_signals = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a concurrency slot and a rate token for the duration of one request"""
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+            yield
+        finally:
+            await self.concurrency.release()
+
+    def record(self, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """Feed a request outcome back into the limits (status None = timeout / connection error)"""
+        if status == 429 or (status == 503 and retry_after is not None):
+            self.throttled += 1
+            self.concurrency.on_congestion()
+            self.bucket.pause_for(retry_after if retry_after is not None else DEFAULT_THROTTLE_PAUSE_SECONDS)
+        elif status is None or status >= 500:
+            self.congestion_signals += 1
+            self.concurrency.on_congestion()
+        else:
+            self.concurrency.on_success(latency)
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "paused_for_seconds": round(self.bucket.paused_for, 3),
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "max_concurrency": self.concurrency.max_limit,
+            "in_flight": self.concurrency.in_flight,
+            "throttled": self.throttled,
+            "congestion_signals": self.congestion_signals
+        }
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+# Keyed like http_client.UPSTREAMS
+limiters = {
+    "firecrawl": ProviderLimiter(
+        "firecrawl",
+        rate=_env_float("FIRECRAWL_RATE_PER_SECOND", 5),
+        burst=_env_float("FIRECRAWL_BURST", 10),
+        max_concurrency=int(os.environ.get("FIRECRAWL_CONCURRENCY", 4)),
+        target_latency=_env_float("FIRECRAWL_TARGET_LATENCY_SECONDS", 30)
+    ),
+    "openrouter": ProviderLimiter(
+        "openrouter",
+        rate=_env_float("OPENROUTER_RATE_PER_SECOND", 10),
+        burst=_env_float("OPENROUTER_BURST", 20),
+        max_concurrency=int(os.environ.get("OPENROUTER_CONCURRENCY", 4)),
+        target_latency=_env_float("OPENROUTER_TARGET_LATENCY_SECONDS", 30)
+    ),
+    "poke": ProviderLimiter(
+        "poke",
+        rate=_env_float("POKE_RATE_PER_SECOND", 2),
+        burst=_env_float("POKE_BURST", 5),
+        max_concurrency=int(os.environ.get("POKE_CONCURRENCY", 2)),
+        target_latency=_env_float("POKE_TARGET_LATENCY_SECONDS", 10)
+    )
+}
+
+def get_rate_limit_stats() -> Dict:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
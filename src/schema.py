@@ -0,0 +1,273 @@
+"""
+Schema DDL for the riff table, shared by the sync and async database layers
+"""
+
+import hashlib
+import os
+
+# NOTIFY channel the webhook service LISTENs on for new scrape jobs
+SCRAPE_JOBS_CHANNEL = "riff_scrape_jobs"
+# NOTIFY channel for completed scrapes (drives the digest scheduler)
+SCRAPES_COMPLETED_CHANNEL = "riff_scraped"
+
+# Scrape job priorities (riff.priority), most urgent first; see fair_scheduler.py
+PRIORITY_INTERACTIVE = 0
+PRIORITY_RETRY = 1
+PRIORITY_BACKFILL = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_RETRY: "retry", PRIORITY_BACKFILL: "backfill"}
+
+# Full-text search: text search configuration, and how much of each conversation is indexed
+SEARCH_CONFIG = "english"
+SEARCH_CONTENT_MAX_CHARS = int(os.environ.get("SEARCH_CONTENT_MAX_CHARS", 100_000))
+
+# Statements are idempotent and executed in order by create_table(), which skips them
+# once SCHEMA_VERSION is recorded (ALTER TABLE and DROP/CREATE TRIGGER lock riff even
+# when they change nothing, so they shouldn't run on every process start)
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS riff (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        chatgpt_url TEXT NOT NULL UNIQUE,
+        user_name VARCHAR(255),
+        conversation_content TEXT,
+        digest TEXT,
+        status VARCHAR(50) DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT NOW(),
+        scraped_at TIMESTAMP,
+        shared_to_group_at TIMESTAMP,
+        metadata JSONB
+    )
+    """,
+    # Digest and listing lookups: status filter + created_at range / ordering, with id
+    # as the tie-breaker for keyset pagination on (created_at, id)
+    """
+    CREATE INDEX IF NOT EXISTS riff_status_created_at_id_idx
+    ON riff (status, created_at, id)
+    """,
+    # Per-user submission history, newest first (keyset on (created_at, id))
+    """
+    CREATE INDEX IF NOT EXISTS riff_user_name_created_at_id_idx
+    ON riff (user_name, created_at DESC, id DESC)
+    """,
+    # Rows not yet shared to the group (a small, shrinking subset)
+    """
+    CREATE INDEX IF NOT EXISTS riff_unshared_created_at_idx
+    ON riff (created_at)
+    WHERE shared_to_group_at IS NULL
+    """,
+    # Scrape job state: each pending row is a durable job claimed by webhook workers
+    """
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS next_run_at TIMESTAMP DEFAULT NOW(),
+        ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS leased_by TEXT
+    """,
+    # Job claims: due pending/retrying rows and expired leases
+    """
+    CREATE INDEX IF NOT EXISTS riff_scrape_queue_idx
+    ON riff (next_run_at)
+    WHERE status IN ('pending', 'retrying', 'scraping')
+    """,
+    # zstd-compressed content; conversation_content holds only short, uncompressed content
+    """
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS conversation_content_z BYTEA
+    """,
+    # Failure tracking: last error message and when a job was dead-lettered (status 'failed')
+    """
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS last_error TEXT,
+        ADD COLUMN IF NOT EXISTS failed_at TIMESTAMP
+    """,
+    # Share UUID parsed from the URL; every spelling of a share link maps to one share_id
+    # (keep the pattern in sync with links.py)
+    r"""
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS share_id TEXT GENERATED ALWAYS AS (
+            substring(lower(chatgpt_url) from
+                '^https?://(?:www\.)?(?:chatgpt\.com|chat\.openai\.com)/share/(?:e/)?([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?![0-9a-f-])')
+        ) STORED
+    """,
+    # One-time migration, run before the unique index exists: merge rows that are the same
+    # share under different URL spellings (keeping the best-scraped row), then store every
+    # URL in canonical form
+    """
+    DO $$
+    DECLARE
+        merged_count INTEGER;
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext('riff_share_id_key'));
+        IF to_regclass('riff_share_id_key') IS NOT NULL THEN
+            RETURN;
+        END IF;
+
+        CREATE TEMP TABLE riff_share_merge ON COMMIT DROP AS
+        SELECT id, share_id, user_name, created_at, shared_to_group_at,
+               row_number() OVER (
+                   PARTITION BY share_id
+                   ORDER BY (status = 'scraped') DESC, scraped_at DESC NULLS LAST, created_at
+               ) AS rank
+        FROM riff
+        WHERE share_id IN (
+            SELECT share_id FROM riff WHERE share_id IS NOT NULL GROUP BY share_id HAVING COUNT(*) > 1
+        );
+
+        UPDATE riff
+        SET user_name = COALESCE(riff.user_name, merged.user_name),
+            created_at = merged.created_at,
+            shared_to_group_at = merged.shared_to_group_at
+        FROM (
+            SELECT share_id,
+                   (array_agg(user_name ORDER BY created_at) FILTER (WHERE user_name IS NOT NULL))[1] AS user_name,
+                   MIN(created_at) AS created_at,
+                   MIN(shared_to_group_at) AS shared_to_group_at
+            FROM riff_share_merge
+            GROUP BY share_id
+        ) merged, riff_share_merge survivor
+        WHERE survivor.id = riff.id
+        AND survivor.rank = 1
+        AND survivor.share_id = merged.share_id;
+
+        DELETE FROM riff
+        WHERE id IN (SELECT id FROM riff_share_merge WHERE rank > 1);
+        GET DIAGNOSTICS merged_count = ROW_COUNT;
+
+        UPDATE riff
+        SET chatgpt_url = 'https://chatgpt.com/share/' || share_id
+        WHERE share_id IS NOT NULL
+        AND chatgpt_url <> 'https://chatgpt.com/share/' || share_id;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS riff_share_id_key ON riff (share_id);
+        RAISE NOTICE 'riff: merged % duplicate share rows', merged_count;
+    END
+    $$
+    """,
+    # Dead-letter inspection, newest failures first
+    """
+    CREATE INDEX IF NOT EXISTS riff_dead_letter_idx
+    ON riff (failed_at DESC)
+    WHERE status = 'failed'
+    """,
+    # Wake LISTENing scrape workers whenever a job becomes due now
+    f"""
+    CREATE OR REPLACE FUNCTION riff_notify_scrape_job() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{SCRAPE_JOBS_CHANNEL}', NEW.id::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DROP TRIGGER IF EXISTS riff_scrape_job_notify ON riff
+    """,
+    """
+    CREATE TRIGGER riff_scrape_job_notify
+    AFTER INSERT OR UPDATE OF status, next_run_at ON riff
+    FOR EACH ROW
+    WHEN (NEW.status IN ('pending', 'retrying') AND NEW.next_run_at <= NOW())
+    EXECUTE FUNCTION riff_notify_scrape_job()
+    """,
+    # Wake the digest scheduler whenever a conversation finishes scraping
+    f"""
+    CREATE OR REPLACE FUNCTION riff_notify_scraped() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{SCRAPES_COMPLETED_CHANNEL}', NEW.id::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    DROP TRIGGER IF EXISTS riff_scraped_notify ON riff
+    """,
+    """
+    CREATE TRIGGER riff_scraped_notify
+    AFTER UPDATE OF status ON riff
+    FOR EACH ROW
+    WHEN (NEW.status = 'scraped' AND OLD.status IS DISTINCT FROM 'scraped')
+    EXECUTE FUNCTION riff_notify_scraped()
+    """,
+    # Content-addressed LLM digest cache (see digest_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS digest_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    # Per-day state for incremental group synthesis (see group_synthesis.py)
+    """
+    CREATE TABLE IF NOT EXISTS group_synthesis_state (
+        digest_date DATE PRIMARY KEY,
+        running_summary TEXT NOT NULL,
+        synthesized_urls TEXT[] NOT NULL DEFAULT '{}',
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    # Near-duplicate index (see near_duplicates.py): MinHash signature per scraped row,
+    # the original a near-duplicate's digest was reused from, and one LSH bucket per band
+    """
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS minhash BYTEA,
+        ADD COLUMN IF NOT EXISTS near_duplicate_of UUID REFERENCES riff(id) ON DELETE SET NULL
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS riff_lsh_bucket (
+        band SMALLINT NOT NULL,
+        bucket BIGINT NOT NULL,
+        riff_id UUID NOT NULL REFERENCES riff(id) ON DELETE CASCADE,
+        PRIMARY KEY (band, bucket, riff_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS riff_lsh_bucket_riff_id_idx
+    ON riff_lsh_bucket (riff_id)
+    """,
+    # Full-text search over digest (weight A) and content (weight B). Content is stored
+    # compressed, so this can't be a generated column: writers pass the plaintext to
+    # riff_search_vector() in the same UPDATE that stores the content.
+    """
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION riff_search_vector(digest TEXT, content TEXT) RETURNS TSVECTOR AS $$
+        SELECT setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(digest, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(content, '')), 'B')
+    $$ LANGUAGE SQL IMMUTABLE
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS riff_search_idx
+    ON riff USING GIN (search_vector) WITH (fastupdate = off)
+    """,
+    # Pipeline stats over recently scraped rows that carry a trace (see get_pipeline_stats)
+    """
+    CREATE INDEX IF NOT EXISTS riff_pipeline_trace_idx
+    ON riff (scraped_at)
+    WHERE metadata ? 'pipeline'
+    """,
+    # Job priority: fresh submissions are interactive, failed attempts retry, bulk requeues backfill
+    f"""
+    ALTER TABLE riff
+        ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT {PRIORITY_INTERACTIVE}
+    """,
+    # Claims walk the (priority, user) pairs with due jobs, taking a user's longest waiting jobs
+    """
+    CREATE INDEX IF NOT EXISTS riff_scrape_priority_user_idx
+    ON riff (priority, (COALESCE(user_name, '')), next_run_at)
+    WHERE status IN ('pending', 'retrying', 'scraping')
+    """,
+]
+
+# Applied schema versions: one row per distinct SCHEMA_STATEMENTS
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS riff_schema_version (
+        version TEXT PRIMARY KEY,
+        applied_at TIMESTAMP DEFAULT NOW()
+    )
+"""
+SCHEMA_VERSION = hashlib.sha256("\n".join(SCHEMA_STATEMENTS).encode("utf-8")).hexdigest()[:16]
+# Advisory lock held while checking and applying the schema, so replicas starting together apply it once
+SCHEMA_LOCK = "riff_schema"
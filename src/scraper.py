@@ -1,102 +1,308 @@
-
 import os
-import requests
+import re
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-from firecrawl import Firecrawl
+from http_client import http
+from digest_cache import digest_cache, cache_key, prompt_version
 from prompts import (
     DIGEST_SYSTEM_PROMPT,
-    ERROR_NO_CONTENT,
+    DIGEST_CHUNK_SYSTEM_PROMPT,
+    DIGEST_INPUT_TEMPLATE,
+    DIGEST_CHUNK_INPUT_TEMPLATE,
+    DIGEST_REDUCE_INPUT_TEMPLATE,
     ERROR_SCRAPE_FAILED,
     ERROR_UNEXPECTED_FORMAT
 )
 
 load_dotenv()
 
-firecrawl = Firecrawl(api_key=os.environ.get("FIRECRAWL_API_KEY"))
+FIRECRAWL_API_KEY = os.environ.get("FIRECRAWL_API_KEY")
+FIRECRAWL_API_URL = os.environ.get("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 DIGEST_MODEL = os.environ.get("DIGEST_MODEL", "openai/gpt-3.5-turbo")
 
+# Chunked (map-reduce) digesting: per-chunk token budget and per-digest fan-out
+DIGEST_CHUNK_TOKENS = int(os.environ.get("DIGEST_CHUNK_TOKENS", 3000))
+DIGEST_MAP_CONCURRENCY = int(os.environ.get("DIGEST_MAP_CONCURRENCY", 4))
+# Extra map passes over the notes when they don't fit one reduce request
+DIGEST_MAX_REDUCE_ROUNDS = int(os.environ.get("DIGEST_MAX_REDUCE_ROUNDS", 3))
+CHARS_PER_TOKEN = 4
+
+# Cache versions cover both prompts and the chunk budget, which shape the output
+DIGEST_PROMPT_VERSION_CHUNKED = prompt_version(
+    DIGEST_SYSTEM_PROMPT, DIGEST_CHUNK_SYSTEM_PROMPT, str(DIGEST_CHUNK_TOKENS)
+)
+CHUNK_PROMPT_VERSION = prompt_version(DIGEST_CHUNK_SYSTEM_PROMPT)
+
+# Turn headings in Firecrawl's markdown of a share page, e.g. "##### You said:"
+_TURN_BOUNDARY = re.compile(r"^(?=#{1,6}\s*(?:You|ChatGPT|User|Assistant)(?:\s+said)?\s*:?\s*$)", re.MULTILINE | re.IGNORECASE)
+_PARAGRAPH_BOUNDARY = re.compile(r"\n\s*\n")
+
+# Usage dict of the digest being traced in the current task, if any (see digest_usage())
+_digest_usage: ContextVar[Optional[Dict]] = ContextVar("digest_usage", default=None)
+
+class ScrapeError(Exception):
+    """Scraping a link failed; retryable=False means retrying the same link won't help"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        self.retryable = retryable
+        super().__init__(message)
+
 def scrape_and_digest_chatgpt_conversation(url: str) -> tuple[str, str]:
     """
     Scrapes a ChatGPT share URL and generates a digest of the conversation
 
+    Blocking wrapper around scrape_and_digest_chatgpt_conversation_async for
+    scripts and other sync callers; do not call it from a running event loop.
+
     Args:
         url: ChatGPT share URL like https://chatgpt.com/share/68c3b038-316c-8008-b45e-14f96bc66c07
 
     Returns:
         Tuple of (full_content, digest) where:
         - full_content: The complete scraped conversation
-        - digest: AI-generated summary or truncated version
+        - digest: AI-generated summary (truncated content if OPENROUTER_API_KEY is unset)
+
+    Raises:
+        ScrapeError, RateLimitedError, CircuitOpenError, an OpenRouter error or a network error;
+        nothing is returned in place of content when scraping fails.
 
     Example:
         >>> content, digest = scrape_and_digest_chatgpt_conversation("https://chatgpt.com/share/...")
         >>> print(digest)
         "This conversation discusses implementing web scrapers using Python..."
     """
-    try:
-        # Use Firecrawl to scrape the ChatGPT share page
-        doc = firecrawl.scrape(url, formats=["markdown"])
-        # doc = firecrawl.scrape(url, formats=["markdown", "summary"])
-        # Extract the markdown content from the Document object
-        full_content = ""
-        digest = ""
-        if doc and hasattr(doc, 'markdown'):
-            full_content = doc.markdown
-            # Use the summary from Firecrawl or generate our own
-            if hasattr(doc, 'summary') and doc.summary:
-                digest = doc.summary
-            else:
-                # Fallback to generating digest if no summary available
-                digest = _generate_digest(full_content)
-        else:
-            return (ERROR_UNEXPECTED_FORMAT.format(url=url), ERROR_NO_CONTENT)
-
-        return (full_content, digest)
-
-    except Exception as e:
-        error_msg = ERROR_SCRAPE_FAILED.format(url=url, error=str(e))
-        return (error_msg, error_msg)
-
-def _generate_digest(content: str) -> str:
-    """Generate a digest of the conversation using OpenRouter API"""
-    if not OPENROUTER_API_KEY:
-        # Fallback to simple truncation if no API key
-        return content[:500] + "..." if len(content) > 500 else content
+    async def run():
+        try:
+            return await scrape_and_digest_chatgpt_conversation_async(url)
+        finally:
+            await http.close()
+
+    return asyncio.run(run())
 
+async def scrape_and_digest_chatgpt_conversation_async(url: str) -> tuple[str, str]:
+    """
+    Scrape and digest a ChatGPT share URL without blocking the event loop.
+
+    Firecrawl and OpenRouter are called through the shared keep-alive HTTP
+    client, which rate-limits each provider (see rate_limit.py).
+
+    Raises instead of returning error text, so callers never store an
+    error as content: ScrapeError for failed scrapes (see .retryable),
+    RateLimitedError / CircuitOpenError while a provider is throttling or
+    down, and OpenRouter and network errors as-is.
+    """
+    full_content, summary = await scrape_chatgpt_conversation_async(url)
+    return (full_content, await digest_conversation_async(full_content, summary))
+
+async def scrape_chatgpt_conversation_async(url: str) -> tuple[str, Optional[str]]:
+    """Scrape a share URL without digesting it; returns (markdown, Firecrawl summary or None)"""
+    full_content, summary = await _scrape(url)
+    if full_content is None:
+        raise ScrapeError(ERROR_UNEXPECTED_FORMAT.format(url=url))
+    return (full_content, summary)
+
+async def digest_conversation_async(content: str, summary: Optional[str] = None) -> str:
+    """Use the summary from Firecrawl or generate our own"""
+    if summary:
+        _note_digest_source("firecrawl")
+        return summary
+    return await _generate_digest(content)
+
+def new_digest_usage(source: Optional[str] = None) -> Dict:
+    """Empty usage dict, as yielded by digest_usage()"""
+    return {"source": source, "model": None, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+@contextmanager
+def digest_usage():
+    """
+    Collect where digests made inside the block came from and what they cost.
+
+    Yields a dict: source ("firecrawl", "cache", "llm" or "truncated"),
+    model, and llm_calls / prompt_tokens / completion_tokens summed over
+    every OpenRouter call, including map steps run concurrently.
+    """
+    usage = new_digest_usage()
+    token = _digest_usage.set(usage)
     try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        yield usage
+    finally:
+        _digest_usage.reset(token)
+
+def _note_digest_source(source: str, model: Optional[str] = None):
+    usage = _digest_usage.get()
+    if usage is not None:
+        usage["source"] = source
+        usage["model"] = model
+
+async def _scrape(url: str) -> tuple[Optional[str], Optional[str]]:
+    """Scrape a share page with Firecrawl; returns (markdown, summary), or (None, None) on an unexpected response"""
+    response = await http.post(
+        "firecrawl",
+        f"{FIRECRAWL_API_URL}/v2/scrape",
+        headers={
+            "Authorization": f"Bearer {FIRECRAWL_API_KEY}",
             "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": DIGEST_MODEL,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": DIGEST_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": f"Conversation input:\n\n{content[:3000]}"  # Limit context
-                }
-            ]
-        }
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
+        },
+        json={"url": url, "formats": ["markdown"]}
+    )
+
+    if response.status != 200:
+        # 4xx (other than timeouts/throttling) means this link can't be scraped as submitted
+        retryable = response.status >= 500 or response.status in (408, 429)
+        error = f"Firecrawl API error: {response.status} {response.text()[:200]}"
+        raise ScrapeError(ERROR_SCRAPE_FAILED.format(url=url, error=error), retryable=retryable)
+
+    body = response.json()
+    data = body.get('data') if body.get('success') else None
+    if not data or data.get('markdown') is None:
+        return (None, None)
+    return (data['markdown'], data.get('summary'))
+
+def split_into_chunks(content: str, max_chars: int) -> List[str]:
+    """
+    Split conversation markdown into chunks of at most max_chars.
+
+    Splits on turn boundaries ("You said:" / "ChatGPT said:" headings) and
+    packs whole turns greedily; turns that are too long on their own fall back
+    to paragraph splits, then to hard character splits.
+    """
+    turns = [turn for turn in _TURN_BOUNDARY.split(content) if turn.strip()]
+    if len(turns) <= 1:
+        turns = _PARAGRAPH_BOUNDARY.split(content)
+
+    pieces = []
+    for turn in turns:
+        if len(turn) <= max_chars:
+            pieces.append(turn)
+            continue
+        for paragraph in _PARAGRAPH_BOUNDARY.split(turn):
+            pieces.extend(paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+async def _chat_completion(system_prompt: str, user_content: str) -> str:
+    """Single OpenRouter chat completion; raises on a non-200 response"""
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    payload = {
+        "model": DIGEST_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": user_content
+            }
+        ]
+    }
+
+    response = await http.post("openrouter", OPENROUTER_API_URL, headers=headers, json=payload)
+
+    if response.status != 200:
+        raise RuntimeError(f"OpenRouter API error: {response.status}")
+
+    data = response.json()
+    usage = _digest_usage.get()
+    if usage is not None:
+        tokens = data.get('usage') or {}
+        usage["llm_calls"] += 1
+        usage["prompt_tokens"] += tokens.get('prompt_tokens') or 0
+        usage["completion_tokens"] += tokens.get('completion_tokens') or 0
+    return data['choices'][0]['message']['content']
+
+async def _digest_chunk_notes(chunk: str, part: int, total: int) -> str:
+    """Map step: notes for one chunk, cached by chunk content"""
+    key = cache_key(chunk, DIGEST_MODEL, CHUNK_PROMPT_VERSION)
+    notes = await digest_cache.get_async(key)
+    if notes is None:
+        notes = await _chat_completion(
+            DIGEST_CHUNK_SYSTEM_PROMPT,
+            DIGEST_CHUNK_INPUT_TEMPLATE.format(part=part, total=total, content=chunk)
         )
+        await digest_cache.put_async(key, DIGEST_MODEL, notes, CHUNK_PROMPT_VERSION)
+    return notes
+
+async def _map_chunks(chunks: List[str]) -> str:
+    """Map step over all chunks, DIGEST_MAP_CONCURRENCY at a time; returns the combined notes"""
+    total = len(chunks)
+    fan_out = asyncio.Semaphore(DIGEST_MAP_CONCURRENCY)
+
+    async def map_one(part: int, chunk: str) -> str:
+        async with fan_out:
+            return await _digest_chunk_notes(chunk, part, total)
+
+    notes = await asyncio.gather(*(map_one(i, chunk) for i, chunk in enumerate(chunks, 1)))
+    return "\n\n".join(f"[Part {i} of {total}]\n{n}" for i, n in enumerate(notes, 1))
+
+async def _map_reduce_digest(content: str, max_chars: int) -> str:
+    """Digest content of any length: notes per chunk (concurrently), then one reduce pass"""
+    chunks = split_into_chunks(content, max_chars)
+    if len(chunks) <= 1:
+        return await _chat_completion(DIGEST_SYSTEM_PROMPT, DIGEST_INPUT_TEMPLATE.format(content=chunks[0] if chunks else content))
+
+    combined = await _map_chunks(chunks)
+
+    # Very long conversations: collapse the notes again until they fit one request, for at most
+    # DIGEST_MAX_REDUCE_ROUNDS passes and only while they keep shrinking
+    for _ in range(DIGEST_MAX_REDUCE_ROUNDS):
+        if len(combined) <= max_chars:
+            break
+        collapsed = await _map_chunks(split_into_chunks(combined, max_chars))
+        if len(collapsed) >= len(combined):
+            break
+        combined = collapsed
+    if len(combined) > max_chars:
+        print(f"Chunk notes still {len(combined)} chars after collapsing, reducing the first {max_chars}")
+        combined = combined[:max_chars]
+
+    return await _chat_completion(
+        DIGEST_SYSTEM_PROMPT,
+        DIGEST_REDUCE_INPUT_TEMPLATE.format(total=len(chunks), notes=combined)
+    )
+
+async def _generate_digest(content: str) -> str:
+    """
+    Generate a digest of the conversation using OpenRouter API.
+
+    Content longer than DIGEST_CHUNK_TOKENS is split on turn boundaries and
+    digested map-reduce style: chunk notes are generated concurrently (up to
+    DIGEST_MAP_CONCURRENCY at a time) and merged by a final pass with
+    DIGEST_SYSTEM_PROMPT, so nothing is truncated away. Content is only
+    truncated when no OpenRouter key is configured; OpenRouter errors raise.
+    """
+    if not OPENROUTER_API_KEY or not content.strip():
+        # Fallback to simple truncation if no API key (and nothing to digest in empty content)
+        _note_digest_source("truncated")
+        return content[:500] + "..." if len(content) > 500 else content
 
-        if response.status_code == 200:
-            data = response.json()
-            return data['choices'][0]['message']['content']
-        else:
-            print(f"OpenRouter API error: {response.status_code}")
-            return content[:500] + "..."
+    key = cache_key(content, DIGEST_MODEL, DIGEST_PROMPT_VERSION_CHUNKED)
+    cached = await digest_cache.get_async(key)
+    if cached is not None:
+        _note_digest_source("cache", DIGEST_MODEL)
+        return cached
 
-    except Exception as e:
-        print(f"Error generating digest: {e}")
-        return content[:500] + "..."
\ No newline at end of file
+    # Failures (5xx, timeouts, malformed responses) propagate so the job is retried or
+    # dead-lettered instead of storing a truncated "digest" as a successful scrape
+    digest = await _map_reduce_digest(content, DIGEST_CHUNK_TOKENS * CHARS_PER_TOKEN)
+    await digest_cache.put_async(key, DIGEST_MODEL, digest, DIGEST_PROMPT_VERSION_CHUNKED)
+    _note_digest_source("llm", DIGEST_MODEL)
+    return digest
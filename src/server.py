@@ -1,78 +1,240 @@
 #!/usr/bin/env python3
 import os
+import time
+import asyncio
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 from typing import List, Dict, Optional
 from datetime import datetime
 
 # Import our modules
 from database import (
     insert_link,
-    update_conversation_content,
+    insert_links,
+    existing_urls,
     get_distinct_users,
     get_conversations_by_date,
-    get_user_submissions,
     get_conversation_by_url,
-    mark_conversations_as_shared
+    get_conversation_content,
+    mark_conversations_as_shared,
+    get_queue_depth,
+    get_pool_stats,
+    encode_cursor,
+    get_user_submissions as get_user_submissions_db,
+    search_conversations as search_conversations_db,
+    get_pipeline_stats as get_pipeline_stats_db
+)
+from metrics import Counter, Histogram, PROMETHEUS_CONTENT_TYPE, render_prometheus
+from pipeline_metrics import record_queue_depth, record_pool_stats
+from admission import admission
+from links import (
+    MAX_LINKS_PER_SUBMISSION,
+    canonical_share_url,
+    canonical_or_raw,
+    unique_share_urls,
+    submission_results,
+    count_statuses
 )
 
 mcp = FastMCP("ChatGPT Riff Server")
 
+tool_latency = Histogram(
+    "mcp_tool_call_seconds",
+    "MCP tool call latency by tool",
+    labelnames=("tool",)
+)
+tool_calls = Counter(
+    "mcp_tool_calls_total",
+    "MCP tool calls by tool and outcome",
+    labelnames=("tool", "outcome")
+)
+
+class ToolMetricsMiddleware(Middleware):
+    """Record latency and outcome of every MCP tool call"""
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        outcome = "error"
+        start = time.monotonic()
+        try:
+            result = await call_next(context)
+            outcome = "ok"
+            return result
+        finally:
+            tool_latency.observe(time.monotonic() - start, tool=tool)
+            tool_calls.inc(tool=tool, outcome=outcome)
+
+mcp.add_middleware(ToolMetricsMiddleware())
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """Prometheus metrics: per-tool call latency, queue depth and DB pool"""
+    try:
+        depth = await asyncio.to_thread(get_queue_depth)
+        record_queue_depth(depth)
+        admission.update(depth)
+    except Exception as e:
+        print(f"Error reading queue depth for metrics: {e}")
+    record_pool_stats(get_pool_stats())
+
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# Listing tools return one page at a time
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 200
+
+# Tool output field -> database.LIST_COLUMNS column
+DAILY_CONVERSATION_FIELDS = {
+    "user": "user_name",
+    "url": "chatgpt_url",
+    "digest": "digest",
+    "timestamp": "created_at",
+    "near_duplicate_of": "near_duplicate_of_url"
+}
+USER_SUBMISSION_FIELDS = {
+    "url": "chatgpt_url",
+    "digest": "digest",
+    "status": "status",
+    "submitted_at": "created_at",
+    "shared_to_group": "shared_to_group_at"
+}
+
+def list_page(fetch, field_map: Dict[str, str], key: str, limit: int, cursor: Optional[str], fields: Optional[List[str]]) -> Dict:
+    """
+    One page of a keyset-paginated listing, projected to the requested fields.
+
+    fetch(limit, cursor, columns) runs the database query; one extra row is
+    fetched to tell whether another page follows.
+    """
+    fields = fields or list(field_map)
+    unknown = [field for field in fields if field not in field_map]
+    if unknown:
+        return {"error": f"Unknown fields: {', '.join(unknown)}", "available_fields": list(field_map)}
+
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+    try:
+        rows = fetch(limit + 1, cursor, list(dict.fromkeys(field_map[field] for field in fields)))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    page = rows[:limit]
+    return {
+        key: [
+            {field: value.isoformat() if isinstance(value, datetime) else value
+             for field, value in ((field, row[field_map[field]]) for field in fields)}
+            for row in page
+        ],
+        "count": len(page),
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None
+    }
+
+def refused_by_admission(urls: List[str]) -> List[str]:
+    """
+    The links in urls to refuse because the scrape queue is saturated (none otherwise).
+
+    Costs no query while the backlog estimate is below the high watermark
+    (see admission.py). While saturated, links that are already stored are
+    let through: resubmissions add no work.
+    """
+    if admission.needs_refresh():
+        try:
+            admission.update(get_queue_depth())
+        except Exception as e:
+            print(f"Error reading queue depth, admitting without it: {e}")
+    if not admission.saturated:
+        return []
+    stored = existing_urls(urls)
+    refused = [url for url in urls if url not in stored]
+    admission.refuse(len(refused), "mcp")
+    return refused
+
+def queue_saturated_result(**fields) -> Dict:
+    return {
+        "status": "queue_saturated",
+        **fields,
+        "retry_after_seconds": admission.retry_after,
+        "message": f"Too many links are waiting to be processed. Nothing was stored; submit again in {admission.retry_after} seconds."
+    }
+
 @mcp.tool(description="Submit a ChatGPT conversation link for processing and storage")
 def submit_chatgpt_link(url: str, user_name: str) -> dict:
     """
     Submit a ChatGPT share URL to be scraped and stored in the database.
-    The link will be queued for async scraping via webhook.
+    The insert itself signals the webhook service (Postgres NOTIFY), which
+    scrapes the link asynchronously. Any spelling of a share link (query
+    string, fragment, chat.openai.com, ...) is stored as its canonical URL,
+    so resubmissions are recognized.
 
     Args:
         url: ChatGPT share URL (e.g., https://chatgpt.com/share/...)
         user_name: Name of the user submitting (e.g., "xyn", "seven")
 
     Returns:
-        Status of the submission and link ID
+        Status of the submission and link ID; status "queue_saturated" (with
+        retry_after_seconds) when the processing backlog is full and the
+        link was not stored (a link that is already stored is always
+        reported as "already_exists")
     """
-    import requests
-
-    # Validate URL format
-    if not url.startswith("https://chatgpt.com/share/"):
+    # Validate URL format and canonicalize
+    canonical_url = canonical_share_url(url)
+    if not canonical_url:
         return {"error": "Invalid ChatGPT share URL format"}
+    url = canonical_url
+
+    if refused_by_admission([url]):
+        return queue_saturated_result(user=user_name, url=url)
 
-    # Insert link into database with 'pending' status
+    # Insert link into database with 'pending' status; this enqueues the scrape job
     link_id = insert_link(url, user_name)
 
     if not link_id:
         return {"status": "already_exists", "url": url, "user": user_name}
+    admission.record(1)
 
-    # Trigger webhook for async scraping
-    try:
-        webhook_url = f"http://localhost:{os.environ.get('WEBHOOK_PORT', 8001)}/webhook/new-link"
-        response = requests.post(webhook_url, json={"url": url}, timeout=5)
-
-        if response.status_code == 200:
-            return {
-                "status": "queued",
-                "id": link_id,
-                "user": user_name,
-                "url": url,
-                "message": "Link queued for processing. Check back later for results."
-            }
-        else:
-            return {
-                "status": "queued_webhook_failed",
-                "id": link_id,
-                "user": user_name,
-                "url": url,
-                "message": "Link stored but webhook notification failed. Will be processed later."
-            }
+    return {
+        "status": "queued",
+        "id": link_id,
+        "user": user_name,
+        "url": url,
+        "message": "Link queued for processing. Check back later for results."
+    }
 
-    except Exception as e:
-        # Even if webhook fails, the link is stored
-        return {
-            "status": "queued_webhook_error",
-            "id": link_id,
-            "user": user_name,
-            "url": url,
-            "message": f"Link stored but webhook error: {str(e)}"
-        }
+@mcp.tool(description="Submit several ChatGPT conversation links at once (e.g. a pasted thread)")
+def submit_chatgpt_links(urls: List[str], user_name: str) -> dict:
+    """
+    Submit many ChatGPT share URLs in one call.
+
+    All new links are inserted (and so enqueued) by a single multi-row
+    INSERT; links that already exist are left untouched.
+
+    Args:
+        urls: ChatGPT share URLs (e.g., https://chatgpt.com/share/...)
+        user_name: Name of the user submitting (e.g., "xyn", "seven")
+
+    Returns:
+        Per-URL status (queued, already_exists, duplicate, invalid) and counts,
+        or status "queue_saturated" (nothing stored) when the backlog is full;
+        only links that aren't stored yet count against the backlog
+    """
+    if len(urls) > MAX_LINKS_PER_SUBMISSION:
+        return {"error": f"Too many links; submit at most {MAX_LINKS_PER_SUBMISSION} per call"}
+
+    valid_urls = unique_share_urls(urls)
+    refused = refused_by_admission(valid_urls) if valid_urls else []
+    if refused:
+        return queue_saturated_result(user=user_name, urls=refused)
+    inserted = insert_links(valid_urls, user_name) if valid_urls else {}
+    admission.record(len(inserted))
+    results = submission_results(urls, inserted)
+
+    return {
+        "user": user_name,
+        "counts": count_statuses(results),
+        "results": results,
+        "message": f"{len(inserted)} links queued for processing. Check back later for results."
+    }
 
 @mcp.tool(description="Get list of all users who have submitted ChatGPT links")
 def get_known_users() -> List[str]:
@@ -84,54 +246,55 @@ def get_known_users() -> List[str]:
     """
     return get_distinct_users()
 
-@mcp.tool(description="Get all ChatGPT conversations for a specific day for synthesis")
-def get_daily_conversations(date: Optional[str] = None) -> List[Dict]:
+@mcp.tool(description="Get ChatGPT conversations for a specific day for synthesis, one page at a time")
+def get_daily_conversations(
+    date: Optional[str] = None,
+    limit: int = LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Dict:
     """
-    Retrieve all scraped conversations for a specific date.
+    Retrieve scraped conversations for a specific date, newest first.
 
     Args:
         date: Date in YYYY-MM-DD format (defaults to today if not provided)
+        limit: Conversations per page (1-200, default 50)
+        cursor: next_cursor from the previous page (omit for the first page)
+        fields: Subset of user, url, digest, timestamp, near_duplicate_of (default: all)
 
     Returns:
-        List of conversation summaries with user info and digests
+        {"conversations": [...], "count", "next_cursor"}; next_cursor is None on the
+        last page. near_duplicate_of is the URL of the conversation a fork
+        duplicates (same digest), else None
     """
-    conversations = get_conversations_by_date(date)
-
-    # Format for easier consumption
-    return [
-        {
-            "user": conv['user_name'],
-            "url": conv['chatgpt_url'],
-            "digest": conv['digest'],
-            "timestamp": conv['created_at'].isoformat() if conv['created_at'] else None
-        }
-        for conv in conversations
-    ]
-
-@mcp.tool(description="Get all ChatGPT link submissions from a specific user")
-def get_user_submissions(user_name: str) -> List[Dict]:
+    return list_page(
+        lambda page_limit, page_cursor, columns: get_conversations_by_date(date, page_limit, page_cursor, columns),
+        DAILY_CONVERSATION_FIELDS, "conversations", limit, cursor, fields
+    )
+
+@mcp.tool(description="Get ChatGPT link submissions from a specific user, one page at a time")
+def get_user_submissions(
+    user_name: str,
+    limit: int = LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Dict:
     """
-    Get all ChatGPT links submitted by a specific user.
+    Get ChatGPT links submitted by a specific user, newest first.
 
     Args:
         user_name: Name of the user (e.g., "xyn")
+        limit: Submissions per page (1-200, default 50)
+        cursor: next_cursor from the previous page (omit for the first page)
+        fields: Subset of url, digest, status, submitted_at, shared_to_group (default: all)
 
     Returns:
-        List of submissions with status and timestamps
+        {"submissions": [...], "count", "next_cursor"}; next_cursor is None on the last page
     """
-    from database import get_user_submissions as get_user_submissions_db
-    submissions = get_user_submissions_db(user_name)
-
-    return [
-        {
-            "url": sub['chatgpt_url'],
-            "digest": sub['digest'],
-            "status": sub['status'],
-            "submitted_at": sub['created_at'].isoformat() if sub['created_at'] else None,
-            "shared_to_group": sub['shared_to_group_at'].isoformat() if sub['shared_to_group_at'] else None
-        }
-        for sub in submissions
-    ]
+    return list_page(
+        lambda page_limit, page_cursor, columns: get_user_submissions_db(user_name, page_limit, page_cursor, columns),
+        USER_SUBMISSION_FIELDS, "submissions", limit, cursor, fields
+    )
 
 @mcp.tool(description="Get full conversation content and details for a specific ChatGPT URL")
 def get_conversation_details(url: str) -> Dict:
@@ -144,6 +307,7 @@ def get_conversation_details(url: str) -> Dict:
     Returns:
         Full conversation details including content and metadata
     """
+    url = canonical_or_raw(url)
     conversation = get_conversation_by_url(url)
 
     if not conversation:
@@ -152,7 +316,7 @@ def get_conversation_details(url: str) -> Dict:
     return {
         "url": conversation['chatgpt_url'],
         "user": conversation['user_name'],
-        "content": conversation['conversation_content'],
+        "content": get_conversation_content(url),
         "digest": conversation['digest'],
         "status": conversation['status'],
         "created_at": conversation['created_at'].isoformat() if conversation['created_at'] else None,
@@ -160,6 +324,112 @@ def get_conversation_details(url: str) -> Dict:
         "shared_at": conversation['shared_to_group_at'].isoformat() if conversation['shared_to_group_at'] else None
     }
 
+@mcp.tool(description="Search past ChatGPT conversations by keywords (digests and full content), best matches first")
+def search_conversations(query: str, user_name: Optional[str] = None, since: Optional[str] = None, limit: int = 10) -> Dict:
+    """
+    Full-text search across every stored conversation.
+
+    Args:
+        query: Keywords; supports "quoted phrases", OR, and -excluded words
+        user_name: Only conversations submitted by this user (optional)
+        since: Only conversations submitted on or after this date, YYYY-MM-DD (optional)
+        limit: Maximum number of results (1-50, default 10)
+
+    Returns:
+        Ranked results with a snippet of the digest (matched terms in **bold**)
+        and matched_in: "digest", or "content" when only the full
+        conversation matched (use get_conversation_details). Only the most
+        recent 1000 (SEARCH_MAX_CANDIDATES) matches are ranked; "capped" is
+        true when there were more, and user_name or since reach older ones
+    """
+    try:
+        since_time = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return {"error": "Invalid since; use YYYY-MM-DD or an ISO datetime"}
+
+    limit = max(1, min(limit, 50))
+    found = search_conversations_db(query, user_name, since_time, limit)
+    matches = found['matches']
+
+    return {
+        "query": query,
+        "count": len(matches),
+        "capped": found['capped'],
+        "results": [
+            {
+                "url": match['chatgpt_url'],
+                "user": match['user_name'],
+                "snippet": match['snippet'],
+                "matched_in": match['matched_in'],
+                "rank": round(match['rank'], 4),
+                "submitted_at": match['created_at'].isoformat() if match['created_at'] else None
+            }
+            for match in matches
+        ]
+    }
+
+def _percentiles(row: Dict) -> Dict:
+    p50, p95, p99 = row['percentiles']
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)}
+
+@mcp.tool(description="Get per-stage latency percentiles, digest token usage and the slowest links of the processing pipeline")
+def get_pipeline_stats(since: Optional[str] = None) -> Dict:
+    """
+    Summarize the pipeline traces of links scraped since a time.
+
+    Args:
+        since: ISO date or datetime; defaults to the last 24 hours
+
+    Returns:
+        p50/p95/p99/max seconds per stage (enqueue_wait, scrape,
+        near_duplicate, digest, total), digest latency and tokens per
+        source/model, total seconds per job priority (interactive, retry,
+        backfill), retry counts, and the slowest links with their traces
+    """
+    try:
+        since_time = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        return {"error": "Invalid since; use YYYY-MM-DD or an ISO datetime"}
+
+    stats = get_pipeline_stats_db(since_time)
+    totals = stats['totals']
+
+    return {
+        "since": since_time.isoformat() if since_time else "last 24 hours",
+        "links": totals['links'],
+        "retried_links": totals['retried_links'],
+        "retries": totals['retries'],
+        "avg_content_chars": round(totals['avg_content_chars']) if totals['avg_content_chars'] is not None else None,
+        "stages": {
+            row['stage']: {"count": row['count'], **_percentiles(row), "max": round(row['max'], 3)}
+            for row in stats['stages']
+        },
+        "digests": [
+            {
+                "source": row['source'],
+                "model": row['model'],
+                "count": row['count'],
+                "latency_seconds": _percentiles(row) if row['percentiles'] else None,
+                "llm_calls": row['llm_calls'],
+                "prompt_tokens": row['prompt_tokens'],
+                "completion_tokens": row['completion_tokens']
+            }
+            for row in stats['digests']
+        ],
+        "priorities": {
+            (row['priority'] or "unqueued"): {"count": row['count'], "total_seconds": _percentiles(row)}
+            for row in stats['priorities']
+        },
+        "slowest": [
+            {
+                "url": row['chatgpt_url'],
+                "scraped_at": row['scraped_at'].isoformat(),
+                "trace": row['trace']
+            }
+            for row in stats['slowest']
+        ]
+    }
+
 @mcp.tool(description="Mark conversations as shared to the group chat")
 def mark_as_shared(urls: List[str]) -> Dict:
     """
@@ -171,6 +441,7 @@ def mark_as_shared(urls: List[str]) -> Dict:
     Returns:
         Count of conversations marked as shared
     """
+    urls = [canonical_or_raw(url) for url in urls]
     count = mark_conversations_as_shared(urls)
 
     return {
@@ -227,6 +498,7 @@ def get_server_info() -> dict:
             "user_inquiry_responses": {
                 "submission_history": "Use get_user_submissions to show users what they've shared",
                 "conversation_details": "Use get_conversation_details for specific information about shared conversations",
+                "finding_past_conversations": "Use search_conversations to find conversations about a topic, then get_conversation_details for the full text",
                 "user_list": "Use get_known_users to see who has been participating"
             }
         },
@@ -255,21 +527,36 @@ def get_server_info() -> dict:
                 "params": ["url", "user_name"],
                 "use_case": "When users share ChatGPT links in DMs"
             },
+            "submit_chatgpt_links": {
+                "purpose": "Submit several ChatGPT share URLs in one call",
+                "params": ["urls", "user_name"],
+                "use_case": "When a message contains more than one ChatGPT link"
+            },
             "get_daily_conversations": {
-                "purpose": "Retrieve all processed conversations for synthesis",
-                "params": ["date (optional)"],
-                "use_case": "For creating group digest messages"
+                "purpose": "Retrieve processed conversations for synthesis, one page at a time",
+                "params": ["date (optional)", "limit (optional)", "cursor (optional)", "fields (optional)"],
+                "use_case": "For creating group digest messages; pass next_cursor to get the next page"
             },
             "get_user_submissions": {
-                "purpose": "Get submission history for specific user",
-                "params": ["user_name"],
-                "use_case": "When users ask about their sharing history"
+                "purpose": "Get submission history for specific user, one page at a time",
+                "params": ["user_name", "limit (optional)", "cursor (optional)", "fields (optional)"],
+                "use_case": "When users ask about their sharing history; request only the fields you need"
             },
             "get_conversation_details": {
                 "purpose": "Get full details of a specific conversation",
                 "params": ["url"],
                 "use_case": "For detailed conversation lookups"
             },
+            "search_conversations": {
+                "purpose": "Find past conversations by keywords, ranked, with highlighted snippets",
+                "params": ["query", "user_name (optional)", "since (optional)", "limit (optional)"],
+                "use_case": "When users ask about something shared before instead of pulling whole days"
+            },
+            "get_pipeline_stats": {
+                "purpose": "Per-stage latency percentiles, digest tokens per model, and the slowest links",
+                "params": ["since (optional)"],
+                "use_case": "When links are slow to show up, to see which stage or provider is the bottleneck"
+            },
             "mark_as_shared": {
                 "purpose": "Mark conversations as shared to prevent duplicates",
                 "params": ["urls"],
@@ -299,6 +586,8 @@ def get_server_info() -> dict:
 
         "critical_reminders_for_poke": [
             "AUTOMATICALLY submit ANY ChatGPT link you see using submit_chatgpt_link - no exceptions",
+            "When a message has several ChatGPT links, submit them together with submit_chatgpt_links",
+            "If a submission returns queue_saturated, nothing was stored: submit the same links again after retry_after_seconds",
             "Users don't need to ask - just seeing a ChatGPT link should trigger submission",
             "When users say 'riff it' with a link, that's an explicit request to process it",
             "NEVER send webhook messages to individual user DMs",
@@ -0,0 +1,47 @@
+"""
+Single-flight scrapes: at most one scrape of a link runs in a process.
+
+Scrapes are registered by canonical URL. A second request for a link that
+is already being scraped here (a worker reclaiming a job whose lease ran out
+while the original scrape is still running) waits for the running scrape's
+outcome instead of scraping and digesting it again. Between processes the row's status is the lock: a scrape only starts
+after a conditional pending -> scraping UPDATE succeeds (claim_scrape_jobs /
+claim_scrape_job in async_database.py).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """One running task per key; later callers for the key await the same task"""
+
+    def __init__(self):
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.joined = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.in_flight
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of fn() for key, started now unless a call for key is already running"""
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+            # A joiner being cancelled mustn't cancel the scrape the starter is waiting on
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self.in_flight[key] = task
+        self.started += 1
+        task.add_done_callback(lambda done: self.in_flight.pop(key, None) if self.in_flight.get(key) is done else None)
+        return await task
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self.in_flight),
+            "started": self.started,
+            "joined": self.joined
+        }
+
+in_flight_scrapes = SingleFlight()
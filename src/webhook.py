@@ -4,32 +4,56 @@ Webhook service for async processing of ChatGPT links and periodic Poke notifica
 """
 
 import os
+import random
+import socket
+import time
 import asyncio
-import aiohttp
-from datetime import datetime, timedelta
-from typing import List, Dict
-import json
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 # Import our modules
-from database import (
-    get_conversation_by_url,
+from async_database import (
+    init_pool,
+    try_advisory_lock,
+    insert_links,
+    existing_urls,
+    listen,
+    close_pool,
+    get_pool_stats,
+    create_table,
+    get_table_info,
     update_conversation_content,
+    find_near_duplicate_candidates,
     get_conversations_by_date,
+    enqueue_scrape_job,
+    requeue_pending_jobs,
+    claim_scrape_jobs,
+    claim_scrape_job,
+    release_scrape_job,
+    fail_scrape_job,
+    get_dead_letter_jobs,
+    requeue_dead_letter_jobs,
+    get_queue_depth,
+    get_unscraped_links,
+    get_job_states,
     mark_conversations_as_shared,
-    mark_all_conversations_as_unshared,
-    get_connection,
-    create_table
-)
-from scraper import scrape_and_digest_chatgpt_conversation
-from prompts import (
-    GROUP_DIGEST_TEMPLATE,
-    USER_SECTION_TEMPLATE,
-    DIGEST_ITEM_TEMPLATE,
-    NO_CONVERSATIONS_MESSAGE,
-    GROUP_SYNTHESIS_SYSTEM_PROMPT,
-    SYNTHESIS_INPUT_TEMPLATE
+    mark_all_conversations_as_unshared
 )
+from schema import SCRAPE_JOBS_CHANNEL, SCRAPES_COMPLETED_CHANNEL, PRIORITY_NAMES
+from scraper import scrape_chatgpt_conversation_async, digest_conversation_async, digest_usage, new_digest_usage
+from near_duplicates import NEAR_DUPLICATE_DETECTION, minhash_signature, best_near_duplicate
+from rate_limit import RateLimitedError
+from circuit_breaker import CircuitOpenError, breakers
+from digest_cache import digest_cache
+from http_client import http
+from group_synthesis import create_daily_digest, get_synthesis_stats
+from digest_scheduler import DigestScheduler
+from metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from pipeline_metrics import track_stage, record_stage, stage_total, job_wait, scrape_deduplicated, record_queue_depth, record_pool_stats
+from admission import admission
+from fair_scheduler import scheduler
+from single_flight import in_flight_scrapes
+from links import MAX_LINKS_PER_SUBMISSION, canonical_share_url, canonical_or_raw, unique_share_urls, submission_results, count_statuses
 
 load_dotenv()
 
@@ -37,207 +61,332 @@ load_dotenv()
 WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8001))
 POKE_API_KEY = os.environ.get("POKE_API_KEY")
 POKE_API_URL = os.environ.get("POKE_API_URL", "https://api.poke.so/v1/messages")
-OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-DIGEST_MODEL = os.environ.get("DIGEST_MODEL", "openai/gpt-3.5-turbo")
-DIGEST_INTERVAL_MINUTES = 3  # Send digest every 10 minutes
 
-# Store pending scrape tasks
-scrape_queue = asyncio.Queue()
+# Durable scrape job queue (job state lives on the riff table)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", 4))
+SCRAPE_POLL_INTERVAL_SECONDS = float(os.environ.get("SCRAPE_POLL_INTERVAL_SECONDS", 30))
+SCRAPE_LEASE_SECONDS = float(os.environ.get("SCRAPE_LEASE_SECONDS", 300))
+SCRAPE_RETRY_DELAY_SECONDS = float(os.environ.get("SCRAPE_RETRY_DELAY_SECONDS", 60))
+SCRAPE_RETRY_MAX_DELAY_SECONDS = float(os.environ.get("SCRAPE_RETRY_MAX_DELAY_SECONDS", 3600))
+SCRAPE_MAX_ATTEMPTS = int(os.environ.get("SCRAPE_MAX_ATTEMPTS", 5))
+SCRAPE_BACKFILL_GRACE_SECONDS = float(os.environ.get("SCRAPE_BACKFILL_GRACE_SECONDS", 300))
+TEST_FLOW_TIMEOUT_SECONDS = float(os.environ.get("TEST_FLOW_TIMEOUT_SECONDS", 600))
+LISTEN_KEEPALIVE_SECONDS = 30
+
+# Advisory lock held while a replica synthesizes and sends the group digest
+DIGEST_SEND_LOCK = "riff_group_digest_send"
+
+# Set by the LISTEN connection when Postgres signals that new jobs are due
+jobs_available = asyncio.Event()
 
 # Flag to temporarily disable periodic digest sender during test
 test_mode_active = False
 
-async def scrape_worker():
-    """Worker that processes scraping tasks from the queue"""
+async def job_listener():
+    """Hold a LISTEN connection that wakes scrape workers on new jobs and the digest scheduler on completed scrapes"""
     while True:
+        conn = None
         try:
-            url = await scrape_queue.get()
-            print(f"Scraping {url}...")
-
-            # Scrape and digest the conversation
-            content, digest = scrape_and_digest_chatgpt_conversation(url)
+            conn = await listen({
+                SCRAPE_JOBS_CHANNEL: lambda payload: jobs_available.set(),
+                SCRAPES_COMPLETED_CHANNEL: lambda payload: digest_scheduler.notify()
+            })
+            print(f"Listening for scrape jobs on '{SCRAPE_JOBS_CHANNEL}' and completions on '{SCRAPES_COMPLETED_CHANNEL}'")
 
-            # Update database
-            update_conversation_content(url, content, digest)
+            # Catch up on anything enqueued or scraped while we weren't listening
+            jobs_available.set()
+            digest_scheduler.notify()
 
-            print(f"Successfully scraped and stored {url}")
+            # Keepalive query so a dropped connection is noticed and re-established
+            while True:
+                await asyncio.sleep(LISTEN_KEEPALIVE_SECONDS)
+                await conn.execute("SELECT 1")
 
         except Exception as e:
-            print(f"Error processing {url}: {e}")
+            print(f"Job listener error, reconnecting: {e}")
 
         finally:
-            scrape_queue.task_done()
+            if conn is not None and not conn.is_closed():
+                await conn.close()
 
+        await asyncio.sleep(5)
 
-async def send_to_poke(message: str, chat_id: str = None):
-    """Send a message to Poke group chat"""
-    if not POKE_API_KEY:
-        print(f"Would send to Poke: {message[:100]}...")
-        return
-
+async def wait_for_jobs():
+    """Sleep until a NOTIFY arrives, or the poll interval passes (picks up delayed retries)"""
+    try:
+        await asyncio.wait_for(jobs_available.wait(), SCRAPE_POLL_INTERVAL_SECONDS)
+    except asyncio.TimeoutError:
+        pass
+    jobs_available.clear()
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: somewhere in [d/2, d] for d = base * 2^(attempts-1), capped"""
+    delay = min(SCRAPE_RETRY_MAX_DELAY_SECONDS, SCRAPE_RETRY_DELAY_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+async def record_scrape_failure(job: Dict, error: Exception) -> str:
+    """Schedule a retry with backoff, or dead-letter the job once it is out of attempts; returns the job's new status"""
+    url = job['chatgpt_url']
+    retryable = getattr(error, 'retryable', True)
+    if retryable and job['attempts'] < SCRAPE_MAX_ATTEMPTS:
+        delay = retry_delay(job['attempts'])
+        print(f"Scrape of {url} failed (attempt {job['attempts']}/{SCRAPE_MAX_ATTEMPTS}), retrying in {delay:.0f}s: {error}")
+        await fail_scrape_job(url, str(error), delay, WORKER_ID)
+        return "retrying"
+    print(f"Scrape of {url} failed permanently after {job['attempts']} attempts, dead-lettered: {error}")
+    await fail_scrape_job(url, str(error), None, WORKER_ID)
+    return "failed"
+
+async def scrape_and_store(url: str, job: Optional[Dict] = None) -> bool:
+    """
+    Scrape a link, digest it and store the result (also releases the lease).
+
+    A near-duplicate of an already scraped conversation (e.g. a fork of the
+    same chat) reuses that conversation's digest instead of calling the LLM.
+    The link's pipeline trace (stage timings, content size, digest source,
+    model and tokens, attempts, priority) is stored with it in metadata['pipeline'];
+    job is the claimed queue job, if this run came from the queue; its
+    result is only stored while this worker still holds the lease, and
+    False is returned if the lease was lost.
+    """
+    started = time.monotonic()
+    stages = {}
+    if job is not None:
+        # Since the job became due: submission for a first attempt, the backoff's end for a retry
+        stages["enqueue_wait"] = job['queued_seconds']
+
+    with track_stage("scrape") as stage:
+        content, summary = await scrape_chatgpt_conversation_async(url)
+    stages["scrape"] = stage.seconds
+
+    signature = None
+    duplicate = None
+    if NEAR_DUPLICATE_DETECTION:
+        with track_stage("near_duplicate") as stage:
+            signature = await asyncio.to_thread(minhash_signature, content)
+            if signature:
+                duplicate = best_near_duplicate(signature, await find_near_duplicate_candidates(signature, url))
+        stages["near_duplicate"] = stage.seconds
+
+    if duplicate and duplicate['digest']:
+        print(f"{url} is a near-duplicate of {duplicate['chatgpt_url']} ({duplicate['similarity']:.0%} similar), reusing its digest")
+        digest = duplicate['digest']
+        usage = new_digest_usage("near_duplicate")
+        stage_total.inc(stage="digest", outcome="reused")
+    else:
+        duplicate = None
+        with track_stage("digest") as stage, digest_usage() as usage:
+            digest = await digest_conversation_async(content, summary)
+        stages["digest"] = stage.seconds
+
+    trace = {
+        "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+        "total_seconds": round(stages.get("enqueue_wait", 0) + time.monotonic() - started, 4),
+        "content_chars": len(content),
+        "digest": usage,
+        "attempts": job['attempts'] if job is not None else None,
+        "retries": max(job['attempts'] - 1, 0) if job is not None else None,
+        "priority": PRIORITY_NAMES[job['priority']] if job is not None else None,
+        "worker": WORKER_ID
+    }
+
+    with track_stage("db_write") as stage:
+        stored = await update_conversation_content(
+            url, content, digest, signature, duplicate, trace, WORKER_ID if job is not None else None
+        )
+        if not stored:
+            stage.outcome = "lease_lost"
+    return stored
+
+async def run_scrape_job(job: Dict) -> str:
+    """
+    Scrape a claimed job and settle it; returns 'scraped', 'deferred' (provider
+    throttled or down), 'retrying', 'failed' or 'lease_lost' (another worker
+    took the job over while this one was scraping, so the result was dropped).
+    """
+    url = job['chatgpt_url']
+
+    # Reclaimed after expired leases too many times (its worker keeps dying)
+    if job['attempts'] > SCRAPE_MAX_ATTEMPTS:
+        await fail_scrape_job(url, "Lease expired on every attempt", None, WORKER_ID)
+        return "failed"
+
+    print(f"Scraping {url} (attempt {job['attempts']})...")
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {POKE_API_KEY}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "message": message,
-                "chat_id": chat_id or "default_group"  # Adjust based on Poke API
-            }
-
-            async with session.post(POKE_API_URL, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    print("Successfully sent message to Poke")
-                else:
-                    print(f"Poke API error: {response.status}")
+        if not await scrape_and_store(url, job):
+            print(f"Lost the lease on {url} while scraping (re-claimed by another worker), result discarded")
+            return "lease_lost"
+        print(f"Successfully scraped and stored {url}")
+        return "scraped"
+
+    except (RateLimitedError, CircuitOpenError) as e:
+        # Provider is throttling or down: not this job's fault, so requeue it without spending an attempt
+        print(f"Deferring {url}: {e}")
+        try:
+            await release_scrape_job(url, WORKER_ID, e.retry_after or SCRAPE_RETRY_DELAY_SECONDS)
+        except Exception as release_error:
+            print(f"Error releasing job, lease will expire: {release_error}")
+        return "deferred"
 
     except Exception as e:
-        print(f"Error sending to Poke: {e}")
+        try:
+            return await record_scrape_failure(job, e)
+        except Exception as record_error:
+            print(f"Error recording failure for {url}, lease will expire: {record_error}")
+            return "failed"
+
+async def claim_and_run_scrape_job(url: str, job: Optional[Dict]) -> str:
+    """run_scrape_job() for job, claiming url first if job is None ('in_flight' if another process holds it)"""
+    if job is None:
+        job = await claim_scrape_job(url, WORKER_ID, SCRAPE_LEASE_SECONDS)
+        if job is None:
+            print(f"{url} is being scraped by another worker, skipping")
+            scrape_deduplicated.inc(reason="claimed_elsewhere")
+            return "in_flight"
+    return await run_scrape_job(job)
+
+async def scrape_once(url: str, job: Optional[Dict] = None) -> str:
+    """
+    Run a scrape of url, or wait for the one already running in this process.
+
+    job is the caller's claim on the link; without one the link is claimed
+    first, and if another process holds it the result is 'in_flight' (that
+    process will store it). Otherwise returns run_scrape_job()'s outcome.
+    """
+    key = canonical_or_raw(url)
+    if key in in_flight_scrapes:
+        print(f"{url} is already being scraped, waiting for that scrape")
+        scrape_deduplicated.inc(reason="joined")
+    return await in_flight_scrapes.run(key, lambda: claim_and_run_scrape_job(url, job))
 
-async def periodic_digest_sender():
-    """Periodically send digests to Poke group chat only if there are unshared conversations"""
+async def scrape_worker():
+    """Claim scrape jobs from the database queue and process them until cancelled"""
+    firecrawl_circuit = breakers["firecrawl"]
     while True:
         try:
-            # Wait for the interval
-            await asyncio.sleep(DIGEST_INTERVAL_MINUTES * 60)
-
-            # Skip if test mode is active
-            if test_mode_active:
-                print("Skipping periodic digest - test mode active")
-                continue
-
-            print("Checking for unshared conversations...")
-
-            # Get today's conversations
-            all_conversations = get_conversations_by_date()
-
-            if not all_conversations:
-                print("No conversations today")
+            # Don't take jobs while Firecrawl is known to be down
+            if firecrawl_circuit.open_for > 0:
+                await asyncio.sleep(firecrawl_circuit.open_for)
                 continue
 
-            # Check if there are any unshared conversations
-            unshared_conversations = [conv for conv in all_conversations if not conv.get('shared_to_group_at')]
-
-            # Debug: Print sharing status for each conversation
-            print("Conversation sharing status:")
-            for conv in all_conversations:
-                shared_status = conv.get('shared_to_group_at')
-                print(f"  URL: {conv['chatgpt_url'][:50]}... | Shared: {shared_status}")
-
-            if not unshared_conversations:
-                print(f"All {len(all_conversations)} conversations already shared - skipping digest")
+            jobs = await claim_scrape_jobs(WORKER_ID, SCRAPE_LEASE_SECONDS, scheduler.next())
+            if not jobs:
+                await wait_for_jobs()
                 continue
 
-            print(f"Found {len(unshared_conversations)} unshared conversations out of {len(all_conversations)} total")
-
-            # Create synthesized message using ALL today's conversations (including previously shared ones)
-            message = await create_group_digest(all_conversations)
-
-            # Send to Poke
-            await send_to_poke(message)
-
-            # Mark the unshared conversations as shared
-            unshared_urls = [conv['chatgpt_url'] for conv in unshared_conversations]
-            if unshared_urls:
-                print(f"About to mark URLs as shared: {unshared_urls}")
-                marked_count = mark_conversations_as_shared(unshared_urls)
-                print(f"Database says {marked_count} conversations were marked as shared")
-
-                # Verify the marking worked by re-querying
-                verification_conversations = get_conversations_by_date()
-                still_unshared = [conv for conv in verification_conversations if not conv.get('shared_to_group_at')]
-                print(f"Verification: {len(still_unshared)} conversations remain unshared after marking")
-
         except Exception as e:
-            print(f"Error in periodic digest: {e}")
+            print(f"Error claiming scrape jobs: {e}")
+            await asyncio.sleep(SCRAPE_POLL_INTERVAL_SECONDS)
+            continue
+
+        job = jobs[0]
+        record_stage("enqueue_wait", job['queued_seconds'])
+        job_wait.observe(job['queued_seconds'], priority=PRIORITY_NAMES[job['priority']])
+        await scrape_once(job['chatgpt_url'], job)
 
-async def synthesize_with_openrouter(raw_summaries: str) -> str:
-    """Use OpenRouter to synthesize raw summaries into engaging group message"""
-    if not OPENROUTER_API_KEY:
-        # Fallback if no API key
-        return "Openrouter API key not found"
 
-    print(f"🤖 Using model: {DIGEST_MODEL}")
-    print(f"🔑 API Key exists: {bool(OPENROUTER_API_KEY)}")
+async def send_to_poke(message: str, chat_id: str = None):
+    """Send a message to Poke group chat"""
+    if not POKE_API_KEY:
+        print(f"Would send to Poke: {message[:100]}...")
+        return
 
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": DIGEST_MODEL,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": GROUP_SYNTHESIS_SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": SYNTHESIS_INPUT_TEMPLATE.format(raw_summaries=raw_summaries)
-                    }
-                ]
-            }
-
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    content = data['choices'][0]['message']['content']
-                    print(f"✅ Synthesis successful with {DIGEST_MODEL}")
-                    print(f"📝 Generated content: {content[:100]}...")
-                    return content
-                else:
-                    error_text = await response.text()
-                    print(f"❌ OpenRouter API error: {response.status}")
-                    print(f"❌ Error details: {error_text}")
-                    return f"🎯 Daily ChatGPT Insights:\n\n{raw_summaries}\n\n✨ Share your own insights by submitting ChatGPT links!"
+        headers = {
+            "Authorization": f"Bearer {POKE_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {
+            "message": message,
+            "chat_id": chat_id or "default_group"  # Adjust based on Poke API
+        }
+
+        with track_stage("poke_send") as stage:
+            response = await http.post("poke", POKE_API_URL, headers=headers, json=payload)
+            if response.status != 200:
+                stage.outcome = "error"
+        if response.status == 200:
+            print("Successfully sent message to Poke")
+        else:
+            print(f"Poke API error: {response.status}")
 
     except Exception as e:
-        print(f"Error synthesizing digest: {e}")
-        return f"Error synthesizing digest: {e}"
-
-async def create_group_digest(conversations: List[Dict]) -> str:
-    """Create a synthesized message from multiple conversations using LLM"""
-    if not conversations:
-        return NO_CONVERSATIONS_MESSAGE
-
-    # Collect raw summaries by user
-    raw_summaries = []
-    by_user = {}
-    for conv in conversations:
-        user = conv.get('user_name', 'Anonymous')
-        digest = conv.get('digest', '')
-        if user not in by_user:
-            by_user[user] = []
-        if digest:
-            by_user[user].append(digest)
-
-    # Format raw summaries for LLM input
-    for user, digests in by_user.items():
-        for i, digest in enumerate(digests[:2], 1):  # Limit to 2 per user
-            raw_summaries.append(f"From {user} (#{i}): {digest}")
-
-    if not raw_summaries:
-        return NO_CONVERSATIONS_MESSAGE
-
-    raw_summaries_text = "\n\n".join(raw_summaries)
-
-    # Use LLM to synthesize the raw summaries into an engaging message
-    synthesized_content = await synthesize_with_openrouter(raw_summaries_text)
+        print(f"Error sending to Poke: {e}")
 
-    return GROUP_DIGEST_TEMPLATE.format(synthesized_content=synthesized_content)
+async def send_pending_digest() -> bool:
+    """
+    Send a digest if any of today's conversations are unshared; returns True if one was sent.
+
+    Every replica's scheduler hears the same scrape completions, so the
+    send runs under an advisory lock: one replica synthesizes, sends and
+    marks the rows shared, and the others find nothing left to share.
+    """
+    # The test flow sends its own digest; look again once it is done
+    if test_mode_active:
+        print("Deferring digest - test mode active")
+        digest_scheduler.notify()
+        return False
+
+    async with try_advisory_lock(DIGEST_SEND_LOCK) as locked:
+        if not locked:
+            # Another replica is sending; look again after the debounce in case it missed something
+            print("Deferring digest - another replica is sending")
+            digest_scheduler.notify()
+            return False
+        return await _send_unshared_digest()
+
+async def _send_unshared_digest() -> bool:
+    all_conversations = await get_conversations_by_date()
+    unshared_urls = [conv['chatgpt_url'] for conv in all_conversations if not conv.get('shared_to_group_at')]
+
+    if not unshared_urls:
+        print(f"All {len(all_conversations)} conversations already shared - skipping digest")
+        return False
+
+    print(f"Found {len(unshared_urls)} unshared conversations out of {len(all_conversations)} total")
+
+    # Synthesize today's conversations (incrementally: only what's new plus the running summary)
+    message = await create_daily_digest(all_conversations)
+    await send_to_poke(message)
+
+    marked_count = await mark_conversations_as_shared(unshared_urls)
+    print(f"Marked {marked_count} conversations as shared")
+    return True
+
+# Sends digests in response to scrape completions (see digest_scheduler.py)
+digest_scheduler = DigestScheduler(send_pending_digest)
 
 # Simple HTTP webhook server using aiohttp
 from aiohttp import web
 
+async def refresh_admission():
+    """Re-read the queue backlog when admission control needs it (see admission.py)"""
+    if admission.needs_refresh():
+        try:
+            admission.update(await get_queue_depth())
+        except Exception as e:
+            print(f"Error reading queue depth, admitting without it: {e}")
+
+async def refused_by_admission(urls: List[str]) -> List[str]:
+    """The links in urls to refuse because the queue is saturated; stored links add no work and pass"""
+    await refresh_admission()
+    if not admission.saturated:
+        return []
+    stored = await existing_urls(urls)
+    refused = [url for url in urls if url not in stored]
+    admission.refuse(len(refused), "webhook")
+    return refused
+
+def queue_saturated_response() -> web.Response:
+    """503 with Retry-After while the scrape queue is over its high watermark"""
+    return web.json_response({
+        "status": "queue_saturated",
+        "error": "Scrape queue is saturated, retry later",
+        "retry_after_seconds": admission.retry_after
+    }, status=503, headers={"Retry-After": str(admission.retry_after)})
+
 async def handle_new_link(request):
     """Handle webhook notification for new link submission"""
     try:
@@ -245,19 +394,53 @@ async def handle_new_link(request):
         url = data.get('url')
 
         if url:
-            await scrape_queue.put(url)
-            return web.json_response({"status": "queued", "url": url})
+            url = canonical_share_url(url)
+            if not url:
+                return web.json_response({"error": "Invalid ChatGPT share URL format"}, status=400)
+            # Re-arms an existing link too, so every accepted request adds a job
+            await refresh_admission()
+            if admission.saturated:
+                admission.refuse(1, "webhook")
+                return queue_saturated_response()
+            if await enqueue_scrape_job(url):
+                admission.record(1)
+                return web.json_response({"status": "queued", "url": url})
+            return web.json_response({"status": "already_scraping", "url": url})
         else:
             return web.json_response({"error": "No URL provided"}, status=400)
 
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
+async def handle_new_links(request):
+    """Queue many links in one round trip: {"urls": [...], "user_name": optional}"""
+    try:
+        data = await request.json()
+        urls = data.get('urls')
+
+        if not isinstance(urls, list) or not urls:
+            return web.json_response({"error": "No URLs provided"}, status=400)
+        if len(urls) > MAX_LINKS_PER_SUBMISSION:
+            return web.json_response({"error": f"At most {MAX_LINKS_PER_SUBMISSION} URLs per request"}, status=413)
+
+        # Only links that aren't stored yet add work, so only they count against the backlog
+        valid_urls = unique_share_urls(urls)
+        if valid_urls and await refused_by_admission(valid_urls):
+            return queue_saturated_response()
+        inserted = await insert_links(valid_urls, data.get('user_name')) if valid_urls else {}
+        admission.record(len(inserted))
+        results = submission_results(urls, inserted)
+
+        return web.json_response({"counts": count_statuses(results), "results": results})
+
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
 async def handle_trigger_digest(request):
     """Manually trigger a digest send"""
     try:
-        conversations = get_conversations_by_date()
-        message = await create_group_digest(conversations)
+        conversations = await get_conversations_by_date()
+        message = await create_daily_digest(conversations)
         await send_to_poke(message)
 
         return web.json_response({
@@ -270,34 +453,89 @@ async def handle_trigger_digest(request):
 
 async def handle_health(request):
     """Health check endpoint"""
+    try:
+        queue_depth = await get_queue_depth()
+    except Exception as e:
+        queue_depth = {"error": str(e)}
+
     return web.json_response({
         "status": "healthy",
-        "queue_size": scrape_queue.qsize()
+        "worker_id": WORKER_ID,
+        "queue_size": queue_depth.get('due'),
+        "queue": queue_depth,
+        "admission": admission.stats(),
+        "scheduler": scheduler.stats(),
+        "in_flight_scrapes": in_flight_scrapes.stats(),
+        "db_pool": get_pool_stats(),
+        "digest_cache": digest_cache.stats(),
+        "synthesis": get_synthesis_stats(),
+        "digest_scheduler": digest_scheduler.stats(),
+        "http": http.stats()
     })
 
+async def handle_metrics(request):
+    """Prometheus metrics: pipeline stages, upstream HTTP, synthesis, queue depth and DB pool"""
+    try:
+        depth = await get_queue_depth()
+        record_queue_depth(depth)
+        admission.update(depth)
+    except Exception as e:
+        print(f"Error reading queue depth for metrics: {e}")
+    record_pool_stats(get_pool_stats())
+
+    return web.Response(text=render_prometheus(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+async def handle_dead_letter(request):
+    """List dead-lettered scrape jobs with their last error"""
+    try:
+        limit = int(request.query.get('limit', 100))
+        jobs = await get_dead_letter_jobs(limit)
+
+        return web.json_response({
+            "count": len(jobs),
+            "jobs": [
+                {
+                    "url": job['chatgpt_url'],
+                    "user": job['user_name'],
+                    "attempts": job['attempts'],
+                    "last_error": job['last_error'],
+                    "created_at": job['created_at'].isoformat() if job['created_at'] else None,
+                    "failed_at": job['failed_at'].isoformat() if job['failed_at'] else None
+                }
+                for job in jobs
+            ]
+        })
+
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+async def handle_requeue_dead_letter(request):
+    """Requeue dead-lettered jobs: the given "urls", or all of them"""
+    try:
+        data = await request.json() if request.can_read_body else {}
+        count = await requeue_dead_letter_jobs(data.get('urls'))
+
+        return web.json_response({
+            "status": "requeued",
+            "count": count
+        })
+
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
 async def handle_setup_database(request):
     """Setup database table manually"""
     try:
-        create_table()
+        await create_table()
 
         # Test the connection and check if table exists
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT table_name
-                    FROM information_schema.tables
-                    WHERE table_name = 'riff' AND table_schema = 'public'
-                """)
-                table_exists = cur.fetchone()
-
-                cur.execute("SELECT COUNT(*) FROM riff")
-                row_count = cur.fetchone()['count']
+        table_info = await get_table_info()
 
         return web.json_response({
             "status": "success",
-            "table_exists": bool(table_exists),
-            "table_name": table_exists['table_name'] if table_exists else None,
-            "row_count": row_count,
+            "table_exists": bool(table_info['table_name']),
+            "table_name": table_info['table_name'],
+            "row_count": table_info['row_count'],
             "message": "Database table created successfully"
         })
 
@@ -311,29 +549,16 @@ async def handle_setup_database(request):
 async def handle_scrape_all_pending(request):
     """Scrape all pending links in the database"""
     try:
-        # Get all pending links from database
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT chatgpt_url
-                    FROM riff
-                    WHERE status = 'pending'
-                """)
-                pending_links = cur.fetchall()
-
-        if not pending_links:
+        # Pending rows already are jobs; make them all due now, at backfill priority
+        # (except links submitted in the last few minutes, which stay interactive)
+        scraped_count = await requeue_pending_jobs(SCRAPE_BACKFILL_GRACE_SECONDS)
+
+        if not scraped_count:
             return web.json_response({
                 "status": "no_pending",
                 "message": "No pending links to scrape"
             })
 
-        # Queue all pending links for scraping
-        scraped_count = 0
-        for link in pending_links:
-            url = link['chatgpt_url']
-            await scrape_queue.put(url)
-            scraped_count += 1
-
         return web.json_response({
             "status": "queued",
             "count": scraped_count,
@@ -353,57 +578,48 @@ async def handle_test_full_flow(request):
         print("Test mode activated - periodic digest sender disabled")
 
         # Step 0: Mark all conversations as unshared (for testing)
-        unshared_count = mark_all_conversations_as_unshared()
+        unshared_count = await mark_all_conversations_as_unshared()
         print(f"Marked {unshared_count} conversations as unshared for testing")
 
-        # Step 1: Get ALL unscraped entries (pending status OR no conversation content)
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT chatgpt_url, status, conversation_content
-                    FROM riff
-                    WHERE status = 'pending'
-                       OR conversation_content IS NULL
-                       OR conversation_content = ''
-                       OR conversation_content LIKE '[Error]%'
-                       OR conversation_content LIKE '[Placeholder]%'
-                """)
-                unscraped_links = cur.fetchall()
+        # Step 1: Get ALL unscraped entries (pending, retrying or dead-lettered)
+        unscraped_links = await get_unscraped_links()
 
         print(f"Found {len(unscraped_links)} unscraped entries to process")
 
-        scraped_count = 0
-        failed_count = 0
-        for link in unscraped_links:
-            url = link['chatgpt_url']
-            print(f"Scraping: {url}")
+        # Hand everything to the workers at backfill priority, like /webhook/scrape-all-pending,
+        # and wait until each link is scraped, dead-lettered, or waiting out a retry backoff
+        urls = [link['chatgpt_url'] for link in unscraped_links]
+        await requeue_dead_letter_jobs(urls)
+        await requeue_pending_jobs(SCRAPE_BACKFILL_GRACE_SECONDS)
 
-            # Scrape synchronously for testing
-            content, digest = scrape_and_digest_chatgpt_conversation(url)
+        states = await get_job_states(urls)
+        deadline = time.time() + TEST_FLOW_TIMEOUT_SECONDS
+        while 'queued' in states.values() and time.time() < deadline:
+            await asyncio.sleep(1)
+            states = await get_job_states(urls)
 
-            if "[Error]" not in content:
-                update_conversation_content(url, content, digest)
-                scraped_count += 1
-                print(f"  ✅ Successfully scraped and stored")
-            else:
-                print(f"  ❌ Scraping failed: {content[:100]}")
-                failed_count += 1
+        scraped_count = sum(1 for state in states.values() if state == 'scraped')
+        failed_count = sum(1 for state in states.values() if state in ('failed', 'retrying'))
+        in_flight_count = sum(1 for state in states.values() if state == 'queued')
+        for url, state in states.items():
+            print(f"  {'✅' if state == 'scraped' else '❌'} {url}: {state}")
 
         # Step 2: Get today's conversations and send digest (now includes previously shared ones)
-        conversations = get_conversations_by_date()
-        message = await create_group_digest(conversations)
+        conversations = await get_conversations_by_date()
+        message = await create_daily_digest(conversations)
         await send_to_poke(message)
 
         # Step 3: Mark as shared
         if conversations:
             urls = [conv['chatgpt_url'] for conv in conversations]  # All conversations since we unshared them
-            mark_conversations_as_shared(urls)
+            await mark_conversations_as_shared(urls)
 
         return web.json_response({
             "status": "complete",
             "unshared_count": unshared_count,
             "scraped_count": scraped_count,
             "failed_count": failed_count,
+            "in_flight_count": in_flight_count,
             "total_unscraped": len(unscraped_links),
             "conversation_count": len(conversations),
             "digest_sent": True,
@@ -417,17 +633,38 @@ async def handle_test_full_flow(request):
         test_mode_active = False
         print("Test mode deactivated - periodic digest sender re-enabled")
 
+async def init_database(app):
+    """Open the async database pool and make sure the schema exists"""
+    try:
+        await init_pool()
+        await create_table()
+    except Exception as e:
+        print(f"Warning: Could not create table: {e}")
+
+async def close_database(app):
+    """Close the async database pool"""
+    await close_pool()
+
+async def start_http_client(app):
+    """Open the shared keep-alive HTTP sessions"""
+    await http.start()
+
+async def close_http_client(app):
+    """Close the shared HTTP sessions"""
+    await http.close()
+
 async def start_background_tasks(app):
     """Start background workers"""
-    app['scrape_worker'] = asyncio.create_task(scrape_worker())
-    app['digest_sender'] = asyncio.create_task(periodic_digest_sender())
+    app['scrape_workers'] = [asyncio.create_task(scrape_worker()) for _ in range(SCRAPE_WORKERS)]
+    app['job_listener'] = asyncio.create_task(job_listener())
+    app['digest_sender'] = asyncio.create_task(digest_scheduler.run())
 
 async def cleanup_background_tasks(app):
     """Cleanup background tasks on shutdown"""
-    app['scrape_worker'].cancel()
-    app['digest_sender'].cancel()
-    await app['scrape_worker']
-    await app['digest_sender']
+    tasks = app['scrape_workers'] + [app['job_listener'], app['digest_sender']]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 def create_app():
     """Create the webhook application"""
@@ -435,28 +672,43 @@ def create_app():
 
     # Routes
     app.router.add_post('/webhook/new-link', handle_new_link)
+    app.router.add_post('/webhook/new-links', handle_new_links)
     app.router.add_post('/webhook/trigger-digest', handle_trigger_digest)
     app.router.add_post('/webhook/scrape-all-pending', handle_scrape_all_pending)
     app.router.add_post('/webhook/test-full-flow', handle_test_full_flow)
     app.router.add_post('/webhook/setup-database', handle_setup_database)
+    app.router.add_get('/webhook/dead-letter', handle_dead_letter)
+    app.router.add_post('/webhook/dead-letter/requeue', handle_requeue_dead_letter)
     app.router.add_get('/health', handle_health)
+    app.router.add_get('/metrics', handle_metrics)
 
-    # Background tasks
+    # Database pool and background tasks
+    app.on_startup.append(init_database)
+    app.on_startup.append(start_http_client)
     app.on_startup.append(start_background_tasks)
     app.on_cleanup.append(cleanup_background_tasks)
+    app.on_cleanup.append(close_http_client)
+    app.on_cleanup.append(close_database)
 
     return app
 
 if __name__ == "__main__":
     app = create_app()
     print(f"Starting webhook service on port {WEBHOOK_PORT}")
-    print(f"Endpoints:")
-    print(f"  POST /webhook/new-link - Queue a URL for scraping")
-    print(f"  POST /webhook/trigger-digest - Manually trigger digest")
-    print(f"  POST /webhook/scrape-all-pending - Scrape all pending links")
-    print(f"  POST /webhook/test-full-flow - TEST: Scrape all + send digest immediately")
-    print(f"  POST /webhook/setup-database - Create database table manually")
-    print(f"  GET /health - Health check")
-    print(f"\nDigest will be sent every {DIGEST_INTERVAL_MINUTES} minutes")
+    print("Endpoints:")
+    print("  POST /webhook/new-link - Queue a URL for scraping")
+    print("  POST /webhook/new-links - Queue many URLs in one request")
+    print("  POST /webhook/trigger-digest - Manually trigger digest")
+    print("  POST /webhook/scrape-all-pending - Scrape all pending links")
+    print("  POST /webhook/test-full-flow - TEST: Scrape all + send digest immediately")
+    print("  POST /webhook/setup-database - Create database table manually")
+    print("  GET /webhook/dead-letter - List scrape jobs that ran out of retries")
+    print("  POST /webhook/dead-letter/requeue - Requeue dead-lettered jobs")
+    print("  GET /health - Health check")
+    print("  GET /metrics - Prometheus metrics")
+    print(f"\nRunning {SCRAPE_WORKERS} scrape workers")
+    print(f"Digests are sent {digest_scheduler.debounce_seconds:.0f}s after scrapes go quiet "
+          f"(at most every {digest_scheduler.min_interval_seconds / 60:.0f} min, "
+          f"within {digest_scheduler.max_delay_seconds / 60:.0f} min of a new conversation)")
 
     web.run_app(app, host="0.0.0.0", port=WEBHOOK_PORT)
\ No newline at end of file
@@ -1,16 +1,21 @@
 #!/usr/bin/env python3
 """
 Quick test script to verify Firecrawl scraping functionality
+
+Goes through the same /v2/scrape REST call and shared HTTP client the
+webhook uses (src/scraper.py), so it needs no Firecrawl SDK.
 """
 
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
-from firecrawl import Firecrawl
 
-load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from http_client import http
+from scraper import scrape_chatgpt_conversation_async
 
-# Initialize Firecrawl
-firecrawl = Firecrawl(api_key=os.environ.get("FIRECRAWL_API_KEY"))
+load_dotenv()
 
 # Test URL
 url = "https://chatgpt.com/share/68c69638-63e0-8008-91d4-b88234b78a8d"
@@ -19,41 +24,29 @@ print(f"Testing Firecrawl on: {url}")
 print(f"API Key exists: {bool(os.environ.get('FIRECRAWL_API_KEY'))}")
 print("=" * 50)
 
+async def scrape():
+    try:
+        return await scrape_chatgpt_conversation_async(url)
+    finally:
+        await http.close()
+
 try:
-    # Scrape with markdown and summary formats
-    doc = firecrawl.scrape(url, formats=["markdown", "summary"])
-
-    # Access data directly from Document object attributes
-    if doc and hasattr(doc, 'markdown'):
-        print("✅ Success: True")
-        
-        # Display markdown content
-        markdown = doc.markdown
-        print(f"📄 Markdown length: {len(markdown)} chars")
-        print("📄 Markdown preview (first 500 chars):")
-        print(markdown[:500])
-        print("...")
-        
-        # Display summary
-        if hasattr(doc, 'summary') and doc.summary:
-            summary = doc.summary
-            print(f"📋 Summary length: {len(summary)} chars")
-            print("📋 Summary:")
-            print(summary)
-        
-        # Display metadata
-        if hasattr(doc, 'metadata') and doc.metadata:
-            metadata = doc.metadata
-            print("🏷️  Metadata:")
-            print(f"   Title: {getattr(metadata, 'title', 'N/A')}")
-            print(f"   URL: {getattr(metadata, 'url', 'N/A')}")
-            print(f"   Status: {getattr(metadata, 'status_code', 'N/A')}")
-    else:
-        print("❌ Success: False")
-        print(f"Document object: {doc}")
-        print(f"Document type: {type(doc)}")
+    markdown, summary = asyncio.run(scrape())
+    print("✅ Success: True")
+
+    # Display markdown content
+    print(f"📄 Markdown length: {len(markdown)} chars")
+    print("📄 Markdown preview (first 500 chars):")
+    print(markdown[:500])
+    print("...")
+
+    # Display summary
+    if summary:
+        print(f"📋 Summary length: {len(summary)} chars")
+        print("📋 Summary:")
+        print(summary)
 
 except Exception as e:
     print(f"❌ Exception occurred: {str(e)}")
     import traceback
-    traceback.print_exc()
\ No newline at end of file
+    traceback.print_exc()
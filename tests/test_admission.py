@@ -0,0 +1,68 @@
+import admission as admission_module
+from admission import AdmissionController
+
+def controller(high=10, low=5):
+    return AdmissionController(high_watermark=high, low_watermark=low, cache_seconds=1)
+
+def test_first_submission_reads_the_backlog():
+    ac = controller()
+    assert ac.needs_refresh()
+    ac.record(100)
+    assert ac.backlog is None
+    ac.update({"due": 0})
+    assert not ac.needs_refresh()
+
+def test_no_reads_below_the_high_watermark():
+    ac = controller()
+    ac.update({"due": 2})
+    for _ in range(7):
+        ac.record(1)
+        assert not ac.needs_refresh()
+    assert ac.backlog == 9
+    assert not ac.saturated
+
+def test_estimate_reaching_high_watermark_is_confirmed_first():
+    ac = controller()
+    ac.update({"due": 8})
+    ac.record(2)
+    # The estimate alone never refuses: workers may have drained the queue meanwhile
+    assert not ac.saturated
+    assert ac.needs_refresh()
+    ac.update({"due": 3})
+    assert not ac.saturated
+    assert not ac.needs_refresh()
+
+def test_saturates_at_high_watermark_and_drains_at_low(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission_module.time, "monotonic", lambda: now[0])
+    ac = controller()
+    ac.update({"due": 10})
+    assert ac.saturated
+    assert not ac.needs_refresh()
+    now[0] += 1
+    assert ac.needs_refresh()
+
+    # Between the watermarks stays saturated (no flapping)
+    ac.update({"due": 7})
+    assert ac.saturated
+    ac.update({"due": 5})
+    assert not ac.saturated
+    assert ac.stats()["times_saturated"] == 1
+
+def test_refusals_are_counted():
+    ac = controller()
+    ac.refuse(3, source="mcp")
+    ac.refuse(1)
+    assert ac.stats()["rejected"] == 4
+
+def test_backfill_is_excluded_and_scraping_included():
+    ac = controller()
+    ac.update({"due": 50, "backfill_due": 45, "scraping": 2})
+    assert ac.backlog == 7
+    assert not ac.saturated
+    ac.update({"due": None, "backfill_due": None, "scraping": None})
+    assert ac.backlog == 0
+
+def test_watermarks_are_sanitized():
+    ac = AdmissionController(high_watermark=0, low_watermark=50)
+    assert (ac.high_watermark, ac.low_watermark) == (1, 1)
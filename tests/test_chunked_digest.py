@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+import scraper
+from digest_cache import DigestCache
+from scraper import split_into_chunks
+
+def conversation(turns: int, words: int = 20) -> str:
+    return "\n\n".join(
+        f"#### {'You' if i % 2 == 0 else 'ChatGPT'} said:\n\n" + " ".join(f"w{i}_{j}" for j in range(words))
+        for i in range(turns)
+    )
+
+def test_empty_and_blank_content_has_no_chunks():
+    assert split_into_chunks("", 100) == []
+    assert split_into_chunks("  \n\n \n", 100) == []
+
+def test_short_content_is_one_chunk():
+    assert split_into_chunks("just one paragraph", 100) == ["just one paragraph"]
+
+def test_chunks_respect_the_limit_and_keep_every_turn():
+    content = conversation(12)
+    chunks = split_into_chunks(content, 400)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    # Whole turns are packed, so every word survives in order
+    assert " ".join(chunks).split() == content.split()
+
+def test_oversized_turn_falls_back_to_hard_splits():
+    content = "x" * 1050
+    chunks = split_into_chunks(content, 100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "".join(chunk.replace("\n\n", "") for chunk in chunks) == content
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fake chat completion: records each request and answers with reply(user_content)"""
+    calls = []
+
+    def install(reply):
+        async def chat_completion(system_prompt: str, user_content: str) -> str:
+            calls.append(user_content)
+            return reply(user_content)
+        monkeypatch.setattr(scraper, "_chat_completion", chat_completion)
+        monkeypatch.setattr(scraper, "digest_cache", DigestCache(use_db=False))
+        return calls
+
+    return install
+
+def test_map_reduce_calls_once_per_chunk_plus_reduce(llm):
+    calls = llm(lambda content: "short notes")
+    content = conversation(12)
+    digest = asyncio.run(scraper._map_reduce_digest(content, 400))
+    assert digest == "short notes"
+    assert len(calls) == len(split_into_chunks(content, 400)) + 1
+
+@pytest.fixture
+def map_rounds(monkeypatch):
+    """Number of map passes _map_reduce_digest makes (the first plus each collapse)"""
+    rounds = []
+    map_chunks = scraper._map_chunks
+
+    async def counting_map_chunks(chunks):
+        rounds.append(len(chunks))
+        return await map_chunks(chunks)
+
+    monkeypatch.setattr(scraper, "_map_chunks", counting_map_chunks)
+    return rounds
+
+def test_collapse_stops_when_notes_do_not_shrink(llm, map_rounds, monkeypatch):
+    monkeypatch.setattr(scraper, "DIGEST_MAX_REDUCE_ROUNDS", 10)
+    # A model whose notes are always longer than a whole request
+    calls = llm(lambda content: "n" * 500)
+    asyncio.run(scraper._map_reduce_digest(conversation(12), 400))
+    assert len(map_rounds) == 2
+    # The final reduce still fits one request
+    assert len(calls[-1]) <= 400 + len(scraper.DIGEST_REDUCE_INPUT_TEMPLATE)
+
+def test_collapse_rounds_are_capped(llm, map_rounds, monkeypatch):
+    monkeypatch.setattr(scraper, "DIGEST_MAX_REDUCE_ROUNDS", 2)
+    # Notes shrink, but too slowly to fit before the rounds run out
+    calls = llm(lambda content: "n" * (len(content) // 2))
+    asyncio.run(scraper._map_reduce_digest(conversation(40), 400))
+    assert len(map_rounds) == 3
+    assert len(calls[-1]) <= 400 + len(scraper.DIGEST_REDUCE_INPUT_TEMPLATE)
+
+def test_empty_content_skips_the_llm(llm, monkeypatch):
+    monkeypatch.setattr(scraper, "OPENROUTER_API_KEY", "key")
+    calls = llm(lambda content: "digest")
+    assert asyncio.run(scraper._generate_digest("   ")) == "   "
+    assert calls == []
+
+def test_llm_errors_raise_instead_of_truncating(llm, monkeypatch):
+    monkeypatch.setattr(scraper, "OPENROUTER_API_KEY", "key")
+
+    def fail(content):
+        raise RuntimeError("OpenRouter API error: 502")
+
+    llm(fail)
+    with scraper.digest_usage() as usage:
+        with pytest.raises(RuntimeError):
+            asyncio.run(scraper._generate_digest(conversation(4)))
+    assert usage["source"] is None
+    assert scraper.digest_cache.stats()["memory_entries"] == 0
+
+def test_missing_api_key_truncates(llm, monkeypatch):
+    monkeypatch.setattr(scraper, "OPENROUTER_API_KEY", None)
+    calls = llm(lambda content: "digest")
+    assert asyncio.run(scraper._generate_digest("x" * 600)) == "x" * 500 + "..."
+    assert calls == []
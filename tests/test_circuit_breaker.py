@@ -0,0 +1,85 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_request()
+        breaker.record_failure()
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.open_for == 10
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_request()
+    assert raised.value.retry_after == 10
+    assert breaker.rejected == 1
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    trip(breaker)
+    clock[0] += 10
+    assert breaker.state == "half_open"
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    trip(breaker)
+    clock[0] += 10
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_request()
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    trip(breaker)
+    clock[0] += 10
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.open_for == 10
+    assert breaker.times_opened == 2
+
+def test_abandoned_probe_allows_another(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    trip(breaker)
+    clock[0] += 10
+    breaker.before_request()
+    breaker.abandon()
+    breaker.before_request()
+    assert breaker.state == "half_open"
+
+def test_stats(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=5)
+    trip(breaker)
+    assert breaker.stats() == {
+        "state": "open",
+        "open_for_seconds": 5.0,
+        "consecutive_failures": 1,
+        "times_opened": 1,
+        "rejected": 0
+    }
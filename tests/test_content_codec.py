@@ -0,0 +1,34 @@
+import pytest
+
+from content_codec import CONTENT_CODEC, CONTENT_COMPRESSION_MIN_BYTES, compress_content, decompress_content
+
+def test_none_content():
+    assert compress_content(None) == (None, None, {})
+    assert decompress_content(None, None, None) is None
+
+def test_short_content_stays_plain():
+    plain_text, blob, metadata = compress_content("short")
+    assert (plain_text, blob) == ("short", None)
+    assert metadata == {"content_codec": "none", "content_bytes": 5}
+    assert decompress_content(plain_text, blob, metadata["content_codec"]) == "short"
+
+def test_threshold_counts_utf8_bytes_not_characters():
+    # Two bytes per character: under the limit in characters, over it in bytes
+    content = "é" * (CONTENT_COMPRESSION_MIN_BYTES // 2 + 1)
+    plain_text, blob, metadata = compress_content(content)
+    assert plain_text is None and blob is not None
+    assert metadata["content_bytes"] == len(content.encode("utf-8"))
+
+def test_round_trip_compressed():
+    content = "You said:\nhello 👋\n\nChatGPT said:\n" + "lorem ipsum " * 500
+    plain_text, blob, metadata = compress_content(content)
+    assert plain_text is None
+    assert metadata["content_codec"] == CONTENT_CODEC
+    assert metadata["content_stored_bytes"] == len(blob) < metadata["content_bytes"]
+    # asyncpg/psycopg2 hand BYTEA back as memoryview/bytes
+    assert decompress_content(None, memoryview(blob), CONTENT_CODEC) == content
+
+def test_unknown_codec_raises():
+    _, blob, _ = compress_content("x" * 2 * CONTENT_COMPRESSION_MIN_BYTES)
+    with pytest.raises(ValueError, match="Unknown content codec"):
+        decompress_content(None, blob, "lz4")
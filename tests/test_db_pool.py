@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from db_pool import ConnectionPool, PoolTimeout
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.conn.broken:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+def make_pool(**kwargs):
+    pool = ConnectionPool("postgresql://fake", **kwargs)
+    pool.opened = []
+
+    def connect():
+        conn = FakeConnection()
+        pool.opened.append(conn)
+        return conn
+
+    pool._connect = connect
+    return pool
+
+def test_connections_are_reused_after_release():
+    pool = make_pool(min_size=0, max_size=2)
+    conn = pool.getconn()
+    assert pool.stats()["in_use"] == 1
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(pool.opened) == 1
+
+def test_open_prefills_min_size():
+    pool = make_pool(min_size=2, max_size=4)
+    pool.open()
+    assert len(pool.opened) == 2
+    assert pool.stats()["idle"] == 2
+
+def test_context_manager_commits_or_rolls_back():
+    pool = make_pool(min_size=0, max_size=1)
+    with pool.connection() as conn:
+        pass
+    assert conn.commits == 1
+
+    with pytest.raises(KeyError):
+        with pool.connection() as conn:
+            raise KeyError("boom")
+    assert conn.rollbacks == 1
+    assert pool.stats()["in_use"] == 0
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = make_pool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+def test_closed_or_discarded_connections_are_replaced():
+    pool = make_pool(min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+    assert pool.stats()["size"] == 0
+
+    second = pool.getconn()
+    assert second is not conn
+    pool.putconn(second, discard=True)
+    assert second.closed
+    assert pool.getconn() not in (conn, second)
+
+def test_broken_idle_connection_fails_health_check_and_is_replaced():
+    pool = make_pool(min_size=0, max_size=1, health_check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["health_check_failures"] == 1
+
+def test_exhausted_pool_times_out():
+    pool = make_pool(min_size=0, max_size=1, timeout=0.05)
+    pool.getconn()
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert time.monotonic() - start >= 0.05
+    assert pool.stats()["checkout_timeouts"] == 1
+
+def test_exhausted_pool_blocks_until_a_connection_is_returned():
+    pool = make_pool(min_size=0, max_size=1, timeout=5)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    assert not got
+    assert pool.stats()["waiting"] == 1
+    pool.putconn(conn)
+    waiter.join(1)
+    assert got == [conn]
+
+def test_idle_connections_expire_down_to_min_size():
+    pool = make_pool(min_size=1, max_size=3, max_idle=0)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+    pool.getconn()
+    assert pool.stats()["size"] == 1
+    assert pool.stats()["recycled"] == 2
+
+def test_foreign_connection_is_rejected():
+    pool = make_pool(min_size=0, max_size=1)
+    with pytest.raises(ValueError):
+        pool.putconn(FakeConnection())
+
+def test_closed_pool_refuses_checkouts():
+    pool = make_pool(min_size=1, max_size=1)
+    pool.open()
+    pool.close()
+    assert pool.opened[0].closed
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        ConnectionPool("postgresql://fake", min_size=3, max_size=2)
@@ -0,0 +1,48 @@
+import asyncio
+
+from digest_cache import DigestCache, cache_key, normalize_content, prompt_version
+
+def test_normalize_ignores_cosmetic_differences():
+    assert normalize_content("  Hello  \r\nworld\t\r\n\r\n\r\n\r\nbye\n") == "Hello\nworld\n\nbye"
+    # NFC: a decomposed é matches the precomposed one
+    assert normalize_content("cafe\u0301") == normalize_content("caf\u00e9")
+
+def test_cache_key_depends_on_content_model_and_prompt():
+    key = cache_key("hello", "model-a", "v1")
+    assert key == cache_key("hello  \n\n\n", "model-a", "v1")
+    assert key != cache_key("hello!", "model-a", "v1")
+    assert key != cache_key("hello", "model-b", "v1")
+    assert key != cache_key("hello", "model-a", "v2")
+
+def test_prompt_version_separates_parts():
+    assert prompt_version("ab", "c") != prompt_version("a", "bc")
+    assert prompt_version("ab", "c") == prompt_version("ab", "c")
+
+def test_lru_evicts_least_recently_used():
+    cache = DigestCache(max_entries=2, use_db=False)
+    cache.put("a", "m", "digest a")
+    cache.put("b", "m", "digest b")
+    assert cache.get("a") == "digest a"  # a is now the most recent
+    cache.put("c", "m", "digest c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "digest a"
+    assert cache.get("c") == "digest c"
+
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2
+    assert (stats["memory_hits"], stats["misses"], stats["stores"]) == (3, 1, 3)
+    assert stats["hit_rate"] == 0.75
+
+def test_async_memory_tier():
+    cache = DigestCache(use_db=False)
+
+    async def run():
+        assert await cache.get_async("k") is None
+        await cache.put_async("k", "m", "digest")
+        return await cache.get_async("k")
+
+    assert asyncio.run(run()) == "digest"
+    assert cache.stats()["db_hits"] == 0
+
+def test_empty_stats():
+    assert DigestCache(use_db=False).stats()["hit_rate"] == 0.0
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import digest_scheduler
+from digest_scheduler import DigestScheduler, parse_quiet_hours
+
+async def never_send():
+    return False
+
+def scheduler(**kwargs):
+    kwargs.setdefault("quiet_hours", None)
+    return DigestScheduler(never_send, timezone="UTC", **kwargs)
+
+def utc(hour, minute=0, day=1):
+    return datetime(2026, 3, day, hour, minute, tzinfo=timezone.utc).timestamp()
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [utc(12)]
+    monkeypatch.setattr(digest_scheduler.time, "time", lambda: now[0])
+    return now
+
+def test_parse_quiet_hours():
+    assert parse_quiet_hours("") is None
+    assert parse_quiet_hours("  ") is None
+    assert parse_quiet_hours("23:00-08:00") == (23 * 60, 8 * 60)
+    assert parse_quiet_hours("1-6:30") == (60, 6 * 60 + 30)
+
+def test_quiet_hours_same_day():
+    s = scheduler(quiet_hours=parse_quiet_hours("01:00-06:00"))
+    assert s.quiet_hours_end(utc(0, 59)) is None
+    assert s.quiet_hours_end(utc(3)) == utc(6)
+    assert s.quiet_hours_end(utc(6)) is None
+
+def test_quiet_hours_wrapping_midnight():
+    s = scheduler(quiet_hours=parse_quiet_hours("23:00-08:00"))
+    assert s.quiet_hours_end(utc(22, 59)) is None
+    assert s.quiet_hours_end(utc(23, 30)) == utc(8, day=2)
+    assert s.quiet_hours_end(utc(2)) == utc(8)
+    assert s.quiet_hours_end(utc(8)) is None
+
+def test_nothing_pending(clock):
+    assert scheduler().next_send_at() is None
+
+def test_debounce_moves_with_each_event(clock):
+    s = scheduler(debounce_seconds=120, max_delay_seconds=3600)
+    s.notify()
+    assert s.next_send_at() == clock[0] + 120
+    clock[0] += 60
+    s.notify()
+    assert s.next_send_at() == clock[0] + 120
+
+def test_max_delay_caps_debounce(clock):
+    start = clock[0]
+    s = scheduler(debounce_seconds=120, max_delay_seconds=300)
+    for _ in range(10):
+        s.notify()
+        clock[0] += 60
+    assert s.next_send_at() == start + 300
+
+def test_min_interval_after_last_send(clock):
+    s = scheduler(debounce_seconds=10, min_interval_seconds=1800)
+    s.last_sent_at = clock[0] - 60
+    s.notify()
+    assert s.next_send_at() == s.last_sent_at + 1800
+
+def test_send_deferred_past_quiet_hours(clock):
+    clock[0] = utc(22, 59)
+    s = scheduler(debounce_seconds=120, quiet_hours=parse_quiet_hours("23:00-08:00"))
+    s.notify()
+    assert s.next_send_at() == utc(8, day=2)
+
+def test_burst_becomes_one_send():
+    sends = []
+
+    async def send():
+        sends.append(len(sends))
+        return True
+
+    async def run():
+        s = DigestScheduler(send, debounce_seconds=0.05, min_interval_seconds=0, max_delay_seconds=10, quiet_hours=None)
+        task = asyncio.create_task(s.run())
+        for _ in range(5):
+            s.notify()
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return s.stats()
+
+    stats = asyncio.run(run())
+    assert len(sends) == 1
+    assert stats["events"] == 5
+    assert stats["sends"] == 1
+    assert stats["pending"] is False
+
+def test_late_send_waits_for_quiet_hours_to_end(clock):
+    s = scheduler(debounce_seconds=120, quiet_hours=parse_quiet_hours("23:00-08:00"))
+    clock[0] = utc(22, 50)
+    s.notify()
+    assert s.next_send_at() == utc(22, 52)
+    # The tick fires late, after quiet hours began
+    clock[0] = utc(23, 5)
+    assert s.next_send_at() == utc(8, day=2)
+    clock[0] = utc(8, day=2)
+    assert s.next_send_at() == utc(22, 52)
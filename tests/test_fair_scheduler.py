@@ -0,0 +1,29 @@
+from collections import Counter
+
+from fair_scheduler import WeightedRoundRobin
+from schema import PRIORITY_BACKFILL, PRIORITY_INTERACTIVE, PRIORITY_RETRY
+
+I, R, B = PRIORITY_INTERACTIVE, PRIORITY_RETRY, PRIORITY_BACKFILL
+
+def picks(weights, n):
+    wrr = WeightedRoundRobin(weights)
+    return wrr, [wrr.next() for _ in range(n)]
+
+def test_default_weights_interleave_smoothly():
+    _, order = picks({I: 8, R: 3, B: 1}, 12)
+    assert order == [I, R, I, I, B, I, R, I, I, I, R, I]
+
+def test_every_cycle_matches_the_weights():
+    wrr, order = picks({I: 8, R: 3, B: 1}, 120)
+    for start in range(0, 120, 12):
+        assert Counter(order[start:start + 12]) == {I: 8, R: 3, B: 1}
+    assert wrr.stats() == {"weights": {"interactive": 8, "retry": 3, "backfill": 1}, "picks": {"interactive": 80, "retry": 30, "backfill": 10}}
+
+def test_zero_weight_level_is_never_asked_for():
+    wrr, order = picks({I: 2, R: 1, B: 0}, 9)
+    assert Counter(order) == {I: 6, R: 3}
+    assert wrr.stats()["picks"]["backfill"] == 0
+
+def test_all_zero_weights_fall_back_to_interactive():
+    _, order = picks({I: 0, R: 0, B: 0}, 3)
+    assert order == [I, I, I]
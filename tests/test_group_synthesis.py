@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import group_synthesis
+from group_synthesis import (
+    DIGESTS_PER_USER, collapse_near_duplicates, create_incremental_group_digest, estimate_tokens, format_raw_summaries
+)
+from prompts import NO_CONVERSATIONS_MESSAGE, RUNNING_SUMMARY_SYSTEM_PROMPT
+
+def conv(conv_id, user, digest="", near_duplicate_of=None):
+    return {
+        "id": conv_id,
+        "chatgpt_url": f"https://chatgpt.com/share/{conv_id}",
+        "user_name": user,
+        "digest": digest,
+        "near_duplicate_of": near_duplicate_of
+    }
+
+def test_estimate_tokens():
+    assert estimate_tokens("abcd" * 10, "abcd") == 11
+    assert estimate_tokens() == 0
+
+def test_collapse_keeps_the_original_and_lists_other_sharers():
+    conversations = [
+        conv("fork1", "bob", "forked", near_duplicate_of="orig"),
+        conv("orig", "alice", "original"),
+        conv("fork2", "carol", "forked", near_duplicate_of="orig"),
+        conv("fork3", "alice", "forked", near_duplicate_of="orig"),
+        conv("other", "dave", "unrelated"),
+    ]
+    collapsed = collapse_near_duplicates(conversations)
+    assert [c["id"] for c in collapsed] == ["orig", "other"]
+    # The kept conversation's own user isn't repeated, and each sharer appears once
+    assert collapsed[0]["also_shared_by"] == ["bob", "carol"]
+    assert collapsed[1]["also_shared_by"] == []
+
+def test_collapse_without_the_original_keeps_the_first_fork():
+    collapsed = collapse_near_duplicates([conv("f1", "bob", near_duplicate_of="gone"), conv("f2", "carol", near_duplicate_of="gone")])
+    assert [c["id"] for c in collapsed] == ["f1"]
+    assert collapsed[0]["also_shared_by"] == ["carol"]
+
+def test_format_raw_summaries():
+    conversations = [conv(f"a{i}", "alice", f"idea {i}") for i in range(DIGESTS_PER_USER + 1)]
+    conversations += [conv("b1", "bob", ""), conv("c1", "carol", "forked", near_duplicate_of="a0")]
+    assert format_raw_summaries(conversations) == "\n\n".join(
+        ["From alice (#1, also shared by carol): idea 0"] + [f"From alice (#{i + 1}): idea {i}" for i in range(1, DIGESTS_PER_USER)]
+    )
+
+def test_format_raw_summaries_defaults_to_anonymous():
+    assert format_raw_summaries([{"id": "x", "chatgpt_url": "u", "digest": "hi"}]) == "From Anonymous (#1): hi"
+
+@pytest.fixture
+def synthesis(monkeypatch):
+    """In-memory synthesis state and a fake LLM that records each prompt"""
+    state = {}
+    calls = []
+
+    async def get_state(date=None):
+        return dict(state) if state else None
+
+    async def save_state(running_summary, synthesized_urls, date=None):
+        state.update(running_summary=running_summary, synthesized_urls=list(synthesized_urls))
+
+    async def call(system_prompt, user_content):
+        calls.append(user_content)
+        if system_prompt.startswith(RUNNING_SUMMARY_SYSTEM_PROMPT[:20]):
+            return (f"summary of {len(calls)} calls", 10)
+        return ("hook", 10)
+
+    monkeypatch.setattr(group_synthesis, "OPENROUTER_API_KEY", "key")
+    monkeypatch.setattr(group_synthesis, "get_synthesis_state", get_state)
+    monkeypatch.setattr(group_synthesis, "save_synthesis_state", save_state)
+    monkeypatch.setattr(group_synthesis, "_synthesis_call", call)
+    return state, calls
+
+def test_incremental_sends_only_new_digests(synthesis):
+    state, calls = synthesis
+    first = [conv("a", "alice", "first idea")]
+    asyncio.run(create_incremental_group_digest(first))
+    assert state["synthesized_urls"] == [first[0]["chatgpt_url"]]
+
+    calls.clear()
+    day = first + [conv("b", "bob", "second idea")]
+    message = asyncio.run(create_incremental_group_digest(day))
+    assert message.endswith("hook")
+    assert len(calls) == 2
+    assert all("first idea" not in call and "second idea" in call for call in calls)
+    assert state["synthesized_urls"] == [c["chatgpt_url"] for c in day]
+
+def test_incremental_skips_forks_of_synthesized_conversations(synthesis):
+    state, calls = synthesis
+    asyncio.run(create_incremental_group_digest([conv("a", "alice", "idea")]))
+    calls.clear()
+    asyncio.run(create_incremental_group_digest([conv("a", "alice", "idea"), conv("f", "bob", "idea", near_duplicate_of="a")]))
+    # No new digests: one re-hook from the running summary, no summary update
+    assert len(calls) == 1
+    assert "From bob" not in calls[0]
+    assert "summary of" in calls[0]
+    assert len(state["synthesized_urls"]) == 2
+
+def test_incremental_with_nothing_to_say(synthesis):
+    assert asyncio.run(create_incremental_group_digest([])) == NO_CONVERSATIONS_MESSAGE
+    assert asyncio.run(create_incremental_group_digest([conv("a", "alice", "")])) == NO_CONVERSATIONS_MESSAGE
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import http_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_client import UPSTREAMS, HttpClient
+from rate_limit import ProviderLimiter, RateLimitedError
+
+@pytest.fixture
+def isolated(monkeypatch):
+    """Fresh limiter and breaker for each upstream, so tests don't share state"""
+    monkeypatch.setattr(http_client, "limiters", {name: ProviderLimiter(name, rate=0, burst=1, max_concurrency=4) for name in UPSTREAMS})
+    monkeypatch.setattr(http_client, "breakers", {name: CircuitBreaker(name, failure_threshold=2, reset_seconds=60) for name in UPSTREAMS})
+    monkeypatch.setattr(http_client, "RATE_LIMIT_MAX_RETRIES", 1)
+
+def serve(handler, scenario):
+    """Run scenario(client, base_url) against a local server answering every request with handler"""
+    async def run():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        server = TestServer(app)
+        await server.start_server()
+        client = HttpClient()
+        try:
+            return await scenario(client, str(server.make_url("")))
+        finally:
+            await client.close()
+            await server.close()
+
+    return asyncio.run(run())
+
+def test_start_opens_one_session_per_upstream_with_its_limit(isolated):
+    async def run():
+        client = HttpClient()
+        await client.start()
+        sessions = dict(client._sessions)
+        limits = {name: session.connector.limit for name, session in sessions.items()}
+        timeouts = {name: session.timeout.total for name, session in sessions.items()}
+        await client.start()
+        reused = all(client._sessions[name] is session for name, session in sessions.items())
+        await client.close()
+        return sessions, limits, timeouts, reused, client.stats()
+
+    sessions, limits, timeouts, reused, stats = asyncio.run(run())
+    assert limits == {name: config["max_connections"] for name, config in UPSTREAMS.items()}
+    assert timeouts == {name: config["timeout"] for name, config in UPSTREAMS.items()}
+    assert reused
+    assert all(session.closed for session in sessions.values())
+    assert stats["connections"] == {}
+
+def test_request_opens_sessions_lazily_and_reuses_them(isolated):
+    async def ok(request):
+        return web.json_response({"path": request.path})
+
+    async def scenario(client, base_url):
+        first = await client.post("poke", f"{base_url}/a", json={})
+        session = client._sessions["poke"]
+        second = await client.post("poke", f"{base_url}/b", json={})
+        return first, second, session is client._sessions["poke"], client.stats()["connections"]["poke"]
+
+    first, second, reused, connections = serve(ok, scenario)
+    assert (first.status, first.json()) == (200, {"path": "/a"})
+    assert second.json() == {"path": "/b"}
+    assert reused
+    assert connections == {"limit": UPSTREAMS["poke"]["max_connections"], "timeout_seconds": UPSTREAMS["poke"]["timeout"], "closed": False}
+
+def test_session_reopens_after_close(isolated):
+    async def ok(request):
+        return web.Response(text="ok")
+
+    async def scenario(client, base_url):
+        await client.post("poke", base_url)
+        await client.close()
+        return (await client.post("poke", base_url)).text()
+
+    assert serve(ok, scenario) == "ok"
+
+def test_429_is_retried_after_retry_after(isolated):
+    calls = []
+
+    async def throttled_once(request):
+        calls.append(1)
+        if len(calls) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return web.Response(text="ok")
+
+    async def scenario(client, base_url):
+        return (await client.post("openrouter", base_url)).text()
+
+    assert serve(throttled_once, scenario) == "ok"
+    assert len(calls) == 2
+
+def test_persistent_429_raises(isolated):
+    async def throttled(request):
+        return web.Response(status=429, headers={"Retry-After": "0"})
+
+    async def scenario(client, base_url):
+        with pytest.raises(RateLimitedError):
+            await client.post("openrouter", base_url)
+
+    serve(throttled, scenario)
+
+def test_5xx_opens_the_circuit(isolated):
+    calls = []
+
+    async def down(request):
+        calls.append(1)
+        return web.Response(status=503)
+
+    async def scenario(client, base_url):
+        for _ in range(2):
+            assert (await client.post("firecrawl", base_url)).status == 503
+        with pytest.raises(CircuitOpenError):
+            await client.post("firecrawl", base_url)
+
+    serve(down, scenario)
+    assert len(calls) == 2
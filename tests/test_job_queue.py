@@ -0,0 +1,81 @@
+"""
+Scrape job queue tests against a real Postgres.
+
+They run only when DATABASE_URL is set, and must point at a scratch database:
+requeue_pending_jobs() touches every pending row in it.
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get("DATABASE_URL"), reason="needs DATABASE_URL (a scratch Postgres database)")
+
+import async_database
+from schema import PRIORITY_INTERACTIVE, PRIORITY_BACKFILL
+
+def share_url() -> str:
+    return f"https://chatgpt.com/share/{uuid.uuid4()}"
+
+async def with_links(test, *ages):
+    """Insert one pending link per age (seconds since submission), run test(urls), then delete them"""
+    await async_database.init_pool()
+    try:
+        await async_database.create_table()
+        urls = [share_url() for _ in ages]
+        for url, age in zip(urls, ages):
+            await async_database.insert_link(url, "tester")
+        async with async_database.acquire() as conn:
+            for url, age in zip(urls, ages):
+                await conn.execute("""
+                    UPDATE riff
+                    SET created_at = NOW() - make_interval(secs => $2), next_run_at = NOW() - make_interval(secs => $2)
+                    WHERE chatgpt_url = $1
+                """, url, float(age))
+        try:
+            return await test(urls)
+        finally:
+            async with async_database.acquire() as conn:
+                await conn.execute("DELETE FROM riff WHERE chatgpt_url = ANY($1::text[])", urls)
+    finally:
+        await async_database.close_pool()
+
+async def priorities(urls):
+    async with async_database.acquire() as conn:
+        rows = await conn.fetch("SELECT chatgpt_url, priority FROM riff WHERE chatgpt_url = ANY($1::text[])", urls)
+    return {row['chatgpt_url']: row['priority'] for row in rows}
+
+def test_requeue_demotes_due_pending_jobs_to_backfill():
+    async def test(urls):
+        async with async_database.acquire() as conn:
+            before = await conn.fetch("SELECT priority, next_run_at <= NOW() AS due FROM riff WHERE chatgpt_url = ANY($1::text[])", urls)
+        assert all(row['due'] and row['priority'] == PRIORITY_INTERACTIVE for row in before)
+
+        assert await async_database.requeue_pending_jobs(keep_interactive_seconds=300) >= len(urls)
+        assert set((await priorities(urls)).values()) == {PRIORITY_BACKFILL}
+
+    asyncio.run(with_links(test, 3600, 86400))
+
+def test_requeue_leaves_recent_submissions_interactive():
+    async def test(urls):
+        old, recent = urls
+        await async_database.requeue_pending_jobs(keep_interactive_seconds=300)
+        assert await priorities(urls) == {old: PRIORITY_BACKFILL, recent: PRIORITY_INTERACTIVE}
+
+    asyncio.run(with_links(test, 3600, 10))
+
+def test_requeue_makes_scheduled_jobs_due():
+    async def test(urls):
+        async with async_database.acquire() as conn:
+            await conn.execute("UPDATE riff SET next_run_at = NOW() + INTERVAL '1 hour' WHERE chatgpt_url = ANY($1::text[])", urls)
+        assert await async_database.get_job_states(urls) == {urls[0]: "queued"}
+
+        await async_database.requeue_pending_jobs()
+        async with async_database.acquire() as conn:
+            due = await conn.fetchval("SELECT next_run_at <= NOW() FROM riff WHERE chatgpt_url = $1", urls[0])
+        assert due
+        assert await priorities(urls) == {urls[0]: PRIORITY_BACKFILL}
+
+    asyncio.run(with_links(test, 3600))
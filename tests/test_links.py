@@ -0,0 +1,63 @@
+import pytest
+
+from links import (
+    canonical_or_raw, canonical_share_url, count_statuses, is_share_url, share_id, submission_results,
+    unique_share_urls
+)
+
+UUID = "6721a2b4-1c3d-4e5f-8a9b-0c1d2e3f4a5b"
+CANONICAL = f"https://chatgpt.com/share/{UUID}"
+
+@pytest.mark.parametrize("url", [
+    CANONICAL,
+    f"{CANONICAL}/",
+    f"{CANONICAL}?utm_source=x",
+    f"{CANONICAL}#reply-3",
+    f"http://chatgpt.com/share/{UUID}",
+    f"https://www.chatgpt.com/share/{UUID}",
+    f"https://chat.openai.com/share/{UUID}",
+    f"https://chatgpt.com/share/e/{UUID}",
+    f"https://CHATGPT.com/share/{UUID.upper()}",
+    f"  {CANONICAL}\n",
+])
+def test_spellings_canonicalize_to_one_url(url):
+    assert canonical_share_url(url) == CANONICAL
+    assert share_id(url) == UUID
+
+@pytest.mark.parametrize("url", [
+    None,
+    42,
+    "",
+    "not a url",
+    f"https://example.com/share/{UUID}",
+    f"https://chatgpt.com/c/{UUID}",
+    "https://chatgpt.com/share/abc",
+    f"https://chatgpt.com/share/{UUID}0",
+    f"https://chatgpt.com/share/{UUID}-extra",
+    f"https://evilchatgpt.com/share/{UUID}",
+])
+def test_invalid_urls(url):
+    assert canonical_share_url(url) is None
+    assert not is_share_url(url)
+
+def test_canonical_or_raw_keeps_legacy_urls():
+    assert canonical_or_raw(f"{CANONICAL}/") == CANONICAL
+    assert canonical_or_raw("https://example.com/x") == "https://example.com/x"
+
+def test_unique_share_urls_keeps_order_and_drops_invalid():
+    other = "https://chatgpt.com/share/00000000-0000-4000-8000-000000000000"
+    urls = [f"{other}/", "junk", CANONICAL, other, f"{CANONICAL}?x=1"]
+    assert unique_share_urls(urls) == [other, CANONICAL]
+
+def test_submission_results_statuses():
+    existing = "https://chatgpt.com/share/00000000-0000-4000-8000-000000000000"
+    urls = [f"{CANONICAL}/", "junk", CANONICAL, existing]
+    results = submission_results(urls, {CANONICAL: "id-1"})
+
+    assert results == [
+        {"url": CANONICAL, "submitted_url": f"{CANONICAL}/", "status": "queued", "id": "id-1"},
+        {"url": "junk", "status": "invalid", "error": "Invalid ChatGPT share URL format"},
+        {"url": CANONICAL, "status": "duplicate"},
+        {"url": existing, "status": "already_exists"},
+    ]
+    assert count_statuses(results) == {"queued": 1, "invalid": 1, "duplicate": 1, "already_exists": 1}
@@ -0,0 +1,55 @@
+import pytest
+
+from metrics import REGISTRY, Counter, Gauge, Histogram, render_prometheus
+
+def test_counter_renders_sorted_series():
+    counter = Counter("test_links_total", "Links seen", ("source",))
+    counter.inc(source="webhook")
+    counter.inc(2, source="mcp")
+    assert counter.render() == [
+        "# HELP test_links_total Links seen",
+        "# TYPE test_links_total counter",
+        'test_links_total{source="mcp"} 2.0',
+        'test_links_total{source="webhook"} 1.0',
+    ]
+    assert counter.snapshot() == {"source=webhook": 1, "source=mcp": 2}
+
+def test_labels_must_match():
+    counter = Counter("test_labelled_total", "Labelled", ("source",))
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(source="mcp", user="x")
+
+def test_label_values_are_escaped():
+    gauge = Gauge("test_escaped", "Escaped", ("name",))
+    gauge.set(1, name='a"b\\c\nd')
+    assert gauge.render()[-1] == 'test_escaped{name="a\\"b\\\\c\\nd"} 1.0'
+
+def test_gauge_set_replaces_value():
+    gauge = Gauge("test_depth", "Depth")
+    gauge.set(5)
+    gauge.set(3)
+    assert gauge.render()[-1] == "test_depth 3.0"
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 6.05",
+        "test_seconds_count 4",
+    ]
+    snapshot = histogram.snapshot()["all"]
+    assert (snapshot["p50"], snapshot["p95"]) == (1, "+Inf")
+
+def test_render_prometheus_includes_every_metric():
+    counter = Counter("test_registered_total", "Registered")
+    counter.inc()
+    assert counter in REGISTRY
+    text = render_prometheus()
+    assert text.endswith("\n")
+    assert "test_registered_total 1.0\n" in text
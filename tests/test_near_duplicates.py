@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from near_duplicates import (
+    LSH_BANDS, MINHASH_PERMUTATIONS, best_near_duplicate, cluster_key, estimate_similarity, lsh_buckets,
+    minhash_signature, pack_signature, shingles, unpack_signature
+)
+
+def text(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(5000)}" for _ in range(words))
+
+def fork(content, changed_words, seed=0):
+    """content with its last changed_words words replaced"""
+    words = content.split()
+    keep = len(words) - changed_words
+    return " ".join(words[:keep] + text(seed, changed_words).split())
+
+def jaccard(a, b):
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+def test_shingles_fold_case_and_punctuation():
+    assert shingles("Hello, World! foo bar baz") == shingles("hello world foo bar baz")
+    assert shingles("") == set()
+    assert shingles("one two", words=5) == {"one two"}
+
+def test_short_content_has_no_signature():
+    assert minhash_signature("too short to compare") is None
+    assert len(minhash_signature(text(1))) == MINHASH_PERMUTATIONS
+
+def test_identical_content_is_identical():
+    assert estimate_similarity(minhash_signature(text(1)), minhash_signature(text(1))) == 1.0
+
+@pytest.mark.parametrize("changed_words", [10, 40, 120])
+def test_similarity_tracks_jaccard(changed_words):
+    original = text(1)
+    forked = fork(original, changed_words, seed=changed_words)
+    estimate = estimate_similarity(minhash_signature(original), minhash_signature(forked))
+    assert abs(estimate - jaccard(original, forked)) < 0.15
+
+def test_unrelated_content_is_dissimilar():
+    assert estimate_similarity(minhash_signature(text(1)), minhash_signature(text(2))) < 0.1
+
+def test_lsh_banding():
+    original = minhash_signature(text(1))
+    buckets = lsh_buckets(original)
+    assert [band for band, _ in buckets] == list(range(LSH_BANDS))
+    assert all(-2 ** 63 <= bucket < 2 ** 63 for _, bucket in buckets)
+
+    # A close fork shares at least one band; an unrelated conversation shares none
+    forked = lsh_buckets(minhash_signature(fork(text(1), 10)))
+    unrelated = lsh_buckets(minhash_signature(text(2)))
+    assert set(buckets) & set(forked)
+    assert not set(buckets) & set(unrelated)
+
+def test_one_changed_row_changes_only_its_band():
+    signature = minhash_signature(text(1))
+    changed = list(signature)
+    changed[0] += 1
+    before, after = lsh_buckets(signature), lsh_buckets(changed)
+    assert before[0] != after[0]
+    assert before[1:] == after[1:]
+
+def test_pack_round_trip():
+    signature = minhash_signature(text(1))
+    packed = pack_signature(signature)
+    assert unpack_signature(packed) == signature
+    assert unpack_signature(memoryview(packed)) == signature
+    assert unpack_signature(packed[:-8]) is None
+
+def test_best_near_duplicate_picks_most_similar_root():
+    original = text(1)
+    signature = minhash_signature(original)
+    candidates = [
+        {"id": "a", "minhash": pack_signature(minhash_signature(fork(original, 40, seed=3))), "near_duplicate_of": None},
+        {"id": "b", "minhash": pack_signature(minhash_signature(fork(original, 5, seed=4))), "near_duplicate_of": "root"},
+        {"id": "c", "minhash": pack_signature(minhash_signature(text(2))), "near_duplicate_of": None},
+        {"id": "d", "minhash": None, "near_duplicate_of": None},
+    ]
+    best = best_near_duplicate(signature, candidates)
+    assert best["id"] == "b"
+    assert best["root_id"] == "root"
+    assert best_near_duplicate(signature, candidates[2:]) is None
+
+def test_cluster_key():
+    assert cluster_key({"id": "b", "near_duplicate_of": "a", "chatgpt_url": "u"}) == "a"
+    assert cluster_key({"id": "a", "near_duplicate_of": None, "chatgpt_url": "u"}) == "a"
+    assert cluster_key({"chatgpt_url": "u"}) == "u"
@@ -0,0 +1,45 @@
+import base64
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from database import LIST_COLUMNS, _keyset_params, _list_select, decode_cursor, encode_cursor
+
+ROW = {"id": uuid.UUID("6721a2b4-1c3d-4e5f-8a9b-0c1d2e3f4a5b"), "created_at": datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)}
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROW)
+    assert decode_cursor(cursor) == (ROW["created_at"], str(ROW["id"]))
+    assert _keyset_params(20, cursor) == {"limit": 20, "after_created_at": ROW["created_at"], "after_id": str(ROW["id"])}
+
+def test_no_cursor_starts_at_the_top():
+    assert _keyset_params(None, None) == {"limit": None, "after_created_at": None, "after_id": None}
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    "é",
+    b64(b"\xff\xfe"),
+    b64(b"{}"),
+    b64(b'["2026-03-01T12:00:00"]'),
+    b64(b'["yesterday", "6721a2b4-1c3d-4e5f-8a9b-0c1d2e3f4a5b"]'),
+    b64(b'["2026-03-01T12:00:00", "not-a-uuid"]'),
+    b64(b'["2026-03-01T12:00:00", "6721a2b4-1c3d-4e5f-8a9b-0c1d2e3f4a5b", 3]'),
+    b64(b'[null, null]'),
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+def test_list_select_always_includes_keyset_columns():
+    assert _list_select(["chatgpt_url"]) == "r.id, r.created_at, r.chatgpt_url AS chatgpt_url"
+    assert _list_select(["created_at"]) == "r.id, r.created_at"
+    assert _list_select(None).count(" AS ") == len(LIST_COLUMNS) - 1
+
+def test_list_select_rejects_unknown_columns():
+    with pytest.raises(ValueError, match="password"):
+        _list_select(["chatgpt_url", "password"])
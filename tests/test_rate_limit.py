@@ -0,0 +1,107 @@
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rate_limit import AdaptiveConcurrency, ProviderLimiter, TokenBucket, parse_retry_after
+
+def test_parse_retry_after_seconds_and_dates():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("soon") is None
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(future) <= 30
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert parse_retry_after(past) == 0.0
+
+def test_aimd_cut_never_goes_below_min():
+    limit = AdaptiveConcurrency(max_limit=8, min_limit=2, decrease_cooldown=0)
+    for _ in range(10):
+        limit.on_congestion()
+    assert limit.limit == 2
+
+def test_aimd_increase_never_goes_above_max():
+    limit = AdaptiveConcurrency(max_limit=4)
+    for _ in range(100):
+        limit.on_success(0.1)
+    assert limit.limit == 4
+
+def test_aimd_recovers_additively():
+    limit = AdaptiveConcurrency(max_limit=8, decrease_cooldown=0)
+    limit.on_congestion()
+    assert limit.limit == 4
+    # About +1 per limit's worth of successes
+    for _ in range(4):
+        limit.on_success(0.1)
+    assert 4.8 < limit.limit < 5.1
+
+def test_aimd_cuts_once_per_cooldown():
+    limit = AdaptiveConcurrency(max_limit=8, decrease_cooldown=60)
+    limit.on_congestion()
+    limit.on_congestion()
+    assert limit.limit == 4
+
+def test_slow_response_counts_as_congestion():
+    limit = AdaptiveConcurrency(max_limit=8, target_latency=1.0)
+    limit.on_success(5.0)
+    assert limit.limit == 4
+
+def test_bounds_are_sanitized():
+    limit = AdaptiveConcurrency(max_limit=0, min_limit=5)
+    assert (limit.min_limit, limit.max_limit) == (1, 1)
+
+def test_concurrency_limit_blocks_at_limit():
+    async def run():
+        limit = AdaptiveConcurrency(max_limit=2)
+        await limit.acquire()
+        await limit.acquire()
+        third = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        await limit.release()
+        await asyncio.wait_for(third, 1)
+        return limit.in_flight
+
+    assert asyncio.run(run()) == 2
+
+def test_token_bucket_allows_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        burst_elapsed = time.monotonic() - start
+        await bucket.acquire()
+        return burst_elapsed, time.monotonic() - start
+
+    burst_elapsed, total_elapsed = asyncio.run(run())
+    assert burst_elapsed < 0.02
+    assert total_elapsed >= 0.04
+
+def test_token_bucket_pause_blocks_even_when_unlimited():
+    async def run():
+        bucket = TokenBucket(rate=0, burst=1)
+        bucket.pause_for(0.05)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.04
+
+@pytest.mark.parametrize("status, retry_after, paused, cut", [
+    (429, None, True, True),
+    (429, 1.0, True, True),
+    (503, 1.0, True, True),
+    (503, None, False, True),
+    (None, None, False, True),
+    (200, None, False, False),
+])
+def test_provider_record(status, retry_after, paused, cut):
+    limiter = ProviderLimiter("test", rate=10, burst=10, max_concurrency=8)
+    limiter.record(status, 0.1, retry_after)
+    assert (limiter.bucket.paused_for > 0) == paused
+    assert (limiter.concurrency.limit < 8) == cut
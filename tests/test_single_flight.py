@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "content"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.run("url", scrape) for _ in range(5)))
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert results == ["content"] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "started": 1, "joined": 4}
+
+def test_different_keys_run_separately():
+    async def run():
+        flights = SingleFlight()
+
+        async def scrape():
+            await asyncio.sleep(0.01)
+            return len(flights.in_flight)
+
+        return await asyncio.gather(flights.run("a", scrape), flights.run("b", scrape))
+
+    assert asyncio.run(run()) == [2, 2]
+
+def test_key_is_released_after_completion():
+    async def run():
+        flights = SingleFlight()
+
+        async def scrape():
+            return "url" in flights
+
+        during = await flights.run("url", scrape)
+        again = await flights.run("url", scrape)
+        return flights, during, again
+
+    flights, during, again = asyncio.run(run())
+    assert during and again
+    assert "url" not in flights
+    assert flights.started == 2
+
+def test_exception_reaches_every_caller():
+    async def scrape():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.run("url", scrape) for _ in range(3)), return_exceptions=True)
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert "url" not in flights
+
+def test_cancelled_joiner_does_not_cancel_the_scrape():
+    async def run():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def scrape():
+            await release.wait()
+            return "content"
+
+        starter = asyncio.create_task(flights.run("url", scrape))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(flights.run("url", scrape))
+        await asyncio.sleep(0)
+        joiner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await joiner
+        release.set()
+        return await starter
+
+    assert asyncio.run(run()) == "content"